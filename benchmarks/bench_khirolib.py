@@ -0,0 +1,234 @@
+"""
+End-to-end benchmarks of khi_telnet_lib hot paths against K-Roset, a real robot or the local emulator.
+Reports p50/p95/p99 latency and throughput per operation as JSON, and compares two reports.
+
+Usage:
+    python -m benchmarks.bench_khirolib --emulator --latency 0.002 --output new.json
+    python -m benchmarks.bench_khirolib --ip 127.0.0.1 --port 9105 --output new.json
+    python -m benchmarks.bench_khirolib --compare old.json new.json --threshold 0.1
+    python -m benchmarks.bench_khirolib --ip 10.0.0.2 --port 23 --capture robot.khiw --output robot.json
+    python -m benchmarks.bench_khirolib --replay robot.khiw --speed 1 --output replay.json
+"""
+
+import argparse
+import asyncio
+import json
+import platform
+import io
+import sys
+import threading
+import time
+
+from src.tcp_sock_client import TCPSockClient
+from src.khi_emulator import KHIEmulator
+from src.khi_telnet_lib import telnet_connect, handshake, get_rcp_status, get_pc_status, get_where, \
+                               read_variable_position, read_programs_list, upload_program, rcp_execute, \
+                               kill_rcp, rcp_hold, format_programs
+from src.program_mirror import save_programs
+from src.session_pool import TelnetSession
+from src.command_scheduler import PRIORITY_SAFETY, PRIORITY_BULK
+from src.wire_capture import WireCapture, set_capture
+from src.replay_server import ReplayServer
+
+UPLOAD_SIZES = (1024, 10 * 1024, 100 * 1024, 1024 * 1024)
+BENCH_PROGRAM = "khi_bench"
+BENCH_RUN_PROGRAM = "khi_bench_run"
+BENCH_VARIABLE = "khi_bench_p"
+RUN_DURATION = 0.1                      # Duration of a program used to measure completion detection delay, s
+DOWNLOAD_PROGRAMS = 20                  # Programs downloaded while HOLD latency is measured
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    """ Returns q-th percentile (0..100) of sorted values using nearest rank method """
+    index = max(0, min(len(sorted_values) - 1, round(q / 100 * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+
+def summarize(samples: list[float], num_bytes: int = 0) -> dict:
+    """ Returns latency statistics of samples in seconds and throughput """
+    values = sorted(samples)
+    total = sum(values)
+    result = {"n": len(values),
+              "mean": total / len(values),
+              "min": values[0],
+              "p50": percentile(values, 50),
+              "p95": percentile(values, 95),
+              "p99": percentile(values, 99),
+              "max": values[-1],
+              "ops_per_s": len(values) / total if total > 0 else 0.0}
+    if num_bytes:
+        result["bytes"] = num_bytes
+        result["bytes_per_s"] = num_bytes * len(values) / total if total > 0 else 0.0
+    return result
+
+
+def measure(operation, iterations: int, warmup: int = 1) -> list[float]:
+    """ Returns durations of operation calls in seconds """
+    for _ in range(warmup):
+        operation()
+    samples = []
+    for _ in range(iterations):
+        start_time = time.perf_counter()
+        operation()
+        samples.append(time.perf_counter() - start_time)
+    return samples
+
+
+def bench_program(size: int) -> bytes:
+    """ Returns AS program of approximately size bytes """
+    line = "  TWAIT 0 ; khirolib upload benchmark line\n"
+    header = f".PROGRAM {BENCH_PROGRAM}\n"
+    num_lines = max(1, (size - len(header) - len(".END\n")) // len(line))
+    return (header + line * num_lines + ".END\n").encode()
+
+
+def measure_hold_during_download(client: TCPSockClient, iterations: int) -> list[float]:
+    """ Returns times from HOLD request to its completion while the same session downloads programs """
+    names = [f"{BENCH_PROGRAM}_dl{idx}" for idx in range(DOWNLOAD_PROGRAMS)]
+    upload_program(client, format_programs({name: "TWAIT 0\n" * 50 for name in names}))
+    session = TelnetSession(client)
+    samples = []
+    for _ in range(iterations):
+        def download():
+            with session.scheduled(PRIORITY_BULK) as bulk_client:
+                save_programs(bulk_client, names, io.BytesIO())
+        downloader = threading.Thread(target=download)
+        downloader.start()
+        time.sleep(0.001)
+        start_time = time.perf_counter()
+        with session.scheduled(PRIORITY_SAFETY) as safety_client:
+            rcp_hold(safety_client)
+        samples.append(time.perf_counter() - start_time)
+        downloader.join()
+    return samples
+
+
+def run_benchmarks(ip: str, port: int, iterations: int, upload_sizes: list[int],
+                   emulator: KHIEmulator | None = None, concurrent: bool = True) -> dict:
+    client = TCPSockClient(ip, port)
+    telnet_connect(client)
+    results = {}
+
+    def connect():
+        new_client = TCPSockClient(ip, port)
+        telnet_connect(new_client)
+        new_client.disconnect()
+
+    results["telnet_connect"] = summarize(measure(connect, iterations))
+    results["handshake"] = summarize(measure(lambda: handshake(client), iterations))
+    results["get_rcp_status"] = summarize(measure(lambda: get_rcp_status(client), iterations))
+    results["get_pc_status"] = summarize(measure(lambda: get_pc_status(client, 31), iterations))
+    results["get_where"] = summarize(measure(lambda: get_where(client), iterations))
+
+    upload_program(client, f".TRANS\n{BENCH_VARIABLE} 1 2 3 4 5 6\n.END\n".encode())
+    results["read_variable_position"] = summarize(
+        measure(lambda: read_variable_position(client, BENCH_VARIABLE), iterations))
+    results["read_programs_list"] = summarize(measure(lambda: read_programs_list(client), iterations))
+
+    for size in upload_sizes:
+        program_bytes = bench_program(size)
+        upload_iterations = max(1, iterations // 10) if size >= 100 * 1024 else iterations
+        results[f"upload_program_{size // 1024}kb"] = summarize(
+            measure(lambda: upload_program(client, program_bytes), upload_iterations), len(program_bytes))
+
+    upload_program(client, f".PROGRAM {BENCH_RUN_PROGRAM}\nTWAIT {RUN_DURATION}\n.END\n".encode())
+    if emulator is not None:
+        emulator.program_durations[BENCH_RUN_PROGRAM] = RUN_DURATION
+
+    def execute():
+        asyncio.run(rcp_execute(client, BENCH_RUN_PROGRAM))
+    samples = measure(execute, iterations)
+    results["rcp_execute_completion_delay"] = summarize([max(0.0, sample - RUN_DURATION) for sample in samples])
+    kill_rcp(client)
+
+    if concurrent:                      # Order of commands of two threads can't be replayed
+        results["hold_during_download"] = summarize(measure_hold_during_download(client, iterations))
+
+    client.disconnect()
+    return results
+
+
+def compare(old_report: dict, new_report: dict, threshold: float) -> list[str]:
+    """ Prints comparison of two reports and returns names of operations which became slower than threshold """
+    regressions = []
+    print(f"{'operation':36} {'old p50':>10} {'new p50':>10} {'old p95':>10} {'new p95':>10} {'change':>8}")
+    for name, new in new_report["results"].items():
+        old = old_report["results"].get(name)
+        if old is None:
+            print(f"{name:36} {'-':>10} {new['p50'] * 1e3:10.3f} {'-':>10} {new['p95'] * 1e3:10.3f}")
+            continue
+        change = new["p50"] / old["p50"] - 1 if old["p50"] > 0 else 0.0
+        regressed = change > threshold or (old["p95"] > 0 and new["p95"] / old["p95"] - 1 > threshold)
+        if regressed:
+            regressions.append(name)
+        print(f"{name:36} {old['p50'] * 1e3:10.3f} {new['p50'] * 1e3:10.3f} {old['p95'] * 1e3:10.3f} "
+              f"{new['p95'] * 1e3:10.3f} {change:+8.1%}{'  REGRESSION' if regressed else ''}")
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="khirolib end-to-end benchmarks, latencies are in seconds")
+    parser.add_argument("--ip", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9105)
+    parser.add_argument("--emulator", action="store_true", help="benchmark against local KHIEmulator")
+    parser.add_argument("--latency", type=float, default=0.0, help="emulator response latency, s")
+    parser.add_argument("--jitter", type=float, default=0.0, help="emulator response jitter, s")
+    parser.add_argument("--bandwidth", type=float, default=None, help="emulator bandwidth, bytes/s")
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--upload-sizes", type=int, nargs="+", default=list(UPLOAD_SIZES), help="bytes")
+    parser.add_argument("--output", help="file for JSON report, stdout if not set")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="compare two JSON reports")
+    parser.add_argument("--threshold", type=float, default=0.1, help="relative slowdown flagged as regression")
+    parser.add_argument("--capture", help="append wire capture of the run to file, for --replay")
+    parser.add_argument("--replay", help="benchmark against a replay of a captured run instead of a robot")
+    parser.add_argument("--speed", type=float, default=1.0, help="replay speed, 0 - as fast as possible")
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0]) as old_file, open(args.compare[1]) as new_file:
+            regressions = compare(json.load(old_file), json.load(new_file), args.threshold)
+        return 1 if regressions else 0
+
+    emulator = None
+    replay = None
+    ip, port = args.ip, args.port
+    if args.emulator:
+        emulator = KHIEmulator(latency=args.latency, jitter=args.jitter, bandwidth=args.bandwidth).start()
+        ip, port = emulator.address
+    elif args.replay:
+        replay = ReplayServer(args.replay, speed=args.speed or None).start()
+        ip, port = replay.address
+    capture = WireCapture(args.capture) if args.capture else None
+    set_capture(capture)
+    try:
+        results = run_benchmarks(ip, port, args.iterations, args.upload_sizes, emulator,
+                                 concurrent=capture is None and replay is None)
+    finally:
+        set_capture(None)
+        if capture is not None:
+            capture.close()
+        if emulator is not None:
+            emulator.stop()
+        if replay is not None:
+            replay.stop()
+            if replay.mismatches:
+                print(f"Replay differs from capture in {len(replay.mismatches)} sends, "
+                      f"first: {replay.mismatches[0]}", file=sys.stderr)
+
+    target = "emulator" if args.emulator else f"replay of {args.replay}" if args.replay else f"{ip}:{port}"
+    report = {"meta": {"target": target,
+                       "latency": args.latency, "jitter": args.jitter, "bandwidth": args.bandwidth,
+                       "iterations": args.iterations, "python": platform.python_version(),
+                       "time": time.strftime("%Y-%m-%dT%H:%M:%S")},
+              "results": results}
+    report_text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(report_text)
+    else:
+        print(report_text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
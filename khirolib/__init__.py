@@ -1,14 +1,36 @@
+import asyncio
+
 from src.khi_telnet_lib import telnet_connect  #, TCPSockClient
 from src.tcp_sock_client import TCPSockClient
 
-from src.khi_telnet_lib import get_pc_status, get_rcp_status, upload_program, kill_rcp, \
+from src.khi_telnet_lib import get_pc_status, get_rcp_status, upload_program, upload_programs, format_programs, \
+                                kill_rcp, \
                                 pc_abort, pc_kill, handshake,\
                                 rcp_prepare, rcp_execute, rcp_prime, rcp_hold, rcp_continue, rcp_abort,\
                                 pc_execute, \
-                                read_programs_list, pg_delete, ereset, \
+                                read_programs_list, read_programs_directory, pg_delete, ereset, \
                                 signal_out, read_variable_position, \
                                 reset_save_load, motor_on, \
-                                get_where, check_connection
+                                get_where, check_connection, read_program, await_program_end
+from src.upload_cache import UploadCache, program_hash, normalize_program
+from src.session_pool import SessionPool, KEEPALIVE_PERIOD, ROLES, ROLE_CONTROL, ROLE_BULK, ROLE_MONITOR
+from src.status_cache import status_cache, STATUS_CACHE_TTL
+from src.khi_telnet_lib import unpack_threads
+from src.position_stream import PositionStream, deploy_posmon, stop_posmon, POSMON_PORT, POSMON_THREAD, \
+                                POSITION_BUFFER_CAPACITY
+from src.position_frames import FramePositionStream
+from src.bulk_variables import read_variables, write_variables, format_variables
+from src.as_minifier import minify_program
+from src.as_validator import validate_program
+from src.khi_exception import KHIConnError, KHIProgSyntaxError, KHIProgValidationError, KHIProgNotExistError, \
+                              KHIVarNotDefinedError
+from src.program_mirror import ProgramMirror, save_programs, save_variables, DEFAULT_MIRROR_PATH
+from src.program_progress import ProgramRun, PROGRESS_POLL_INTERVAL
+from src.program_template import ProgramTemplate, is_template_deployed, set_template_deployed, forget_template, \
+                                changed_values, set_written_values, forget_written_values, matches_listed
+
+import src.khi_async_telnet_lib as async_lib
+from src.AsyncTCPSockClient import AsyncTCPSockClient
 
 import config.robot as robot_config
 
@@ -16,21 +38,53 @@ TELNET_DEF_PORT = 23
 TELNET_SIM_PORT = 9105
 
 
+def default_port(ip: str) -> int:
+    """ Telnet port of a robot: TELNET_SIM_PORT for 127.0.0.1 (K-Roset), TELNET_DEF_PORT otherwise """
+    return TELNET_SIM_PORT if ip == '127.0.0.1' else TELNET_DEF_PORT
+
+
 class KHIRoLibLite:
-    def __init__(self, ip: str):
+    def __init__(self, ip: str, upload_cache: UploadCache | None = None, roles: tuple[str, ...] = ROLES,
+                 status_ttl: float = STATUS_CACHE_TTL, keepalive: float | None = KEEPALIVE_PERIOD,
+                 port: int | None = None):
+        """
+        Args:
+            ip (str): IP address of the robot.
+            upload_cache (UploadCache | None, optional): Registry of uploaded programs. If set, upload_program
+                skips programs which are already stored on the robot. Defaults to None.
+            roles (tuple[str, ...], optional): Roles of telnet sessions opened to the robot - control commands,
+                bulk transfers and monitoring (status, position, hold and abort). Every session has its own
+                CommandScheduler, so monitoring never waits behind an upload or a blocking program run, and hold
+                and abort go ahead of other commands waiting for the session. Roles which are not
+                listed or can't get a session share the control session. Defaults to ROLES.
+            status_ttl (float, optional): Time in seconds RCP and PC thread states are reused by pre-flight checks
+                of upload_program and delete_programs. Any state changing command drops cached states.
+                0 disables caching. Defaults to STATUS_CACHE_TTL.
+            keepalive (float | None, optional): Interval in seconds idle sessions are probed in background.
+                Sessions which stop answering are logged in again before the next command, so the command
+                doesn't wait for a timeout on a dead connection. None disables probing. Defaults to KEEPALIVE_PERIOD.
+            port (int | None, optional): Telnet port of the robot. Defaults to None - TELNET_SIM_PORT
+                for 127.0.0.1, TELNET_DEF_PORT otherwise.
+        """
         self._ip = ip
+        self._upload_cache = upload_cache
+        self._roles = roles
+        self._status_ttl = status_ttl
+        self._keepalive = keepalive
 
         self._is_real_robot = True if ip != '127.0.0.1' else False
-        self._telnet_port = TELNET_DEF_PORT if self._is_real_robot else TELNET_SIM_PORT
+        self._telnet_port = default_port(ip) if port is None else port
 
-        self._telnet_client = None
+        self._sessions = None
 
         self._connect()
 
     def _connect(self):
         """ Connection sequence to the robot."""
-        self._telnet_client = TCPSockClient(self._ip, self._telnet_port)
-        telnet_connect(self._telnet_client)
+        self._sessions = SessionPool(self._ip, self._telnet_port, self._roles)
+        self._status_cache = status_cache(self._sessions.control.client.address)
+        if self._keepalive is not None:
+            self._sessions.start_keepalive(self._keepalive)
 
         print("Connection with robot established")
 
@@ -38,121 +92,532 @@ class KHIRoLibLite:
         """ Close sequence for robot.
         Used explicitly to close all connections or when __del__ is called
         """
-        self._telnet_client.disconnect()
+        self._sessions.close()
 
     def _get_active_programs_names(self):
         pg_status_list = self.get_status_pc()
-        rcp_status = get_rcp_status(self._telnet_client)
+        rcp_status = self.status()
+
+    def _read_rcp_status(self, client, cached=False):
+        """ Reads RCP state, cached=True returns state read less than status TTL ago if any """
+        state = self._status_cache.get_rcp(self._status_ttl) if cached else None
+        if state is None:
+            generation = self._status_cache.generation
+            state = get_rcp_status(client)
+            self._status_cache.put_rcp(state, generation)
+        return state
+
+    def _read_pc_status(self, client, threads, cached=False):
+        """ Reads PC thread states, cached=True returns states read less than status TTL ago if any """
+        states = self._status_cache.get_pc(unpack_threads(threads), self._status_ttl) if cached else None
+        if states is None:
+            generation = self._status_cache.generation
+            states = get_pc_status(client, threads)
+            self._status_cache.put_pc(states, generation)
+        return states
 
     def status(self):
-        return get_rcp_status(self._telnet_client)
+        with self._sessions.monitor as client:
+            return self._read_rcp_status(client)
 
     def motor_on(self):
-        motor_on(self._telnet_client)
+        with self._sessions.control as client:
+            motor_on(client)
 
     def ereset(self):
-        ereset(self._telnet_client)
+        with self._sessions.control as client:
+            ereset(client)
 
     def get_status_pc(self, thread_num=None):
-        if thread_num is None:
-            threads_info_list = get_pc_status(self._telnet_client, 31)
-            return threads_info_list
-        else:
-            return get_pc_status(self._telnet_client, 1 << (thread_num-1))
-
-    def upload_program(self, program_name, program_text, open_program=False):
-        pg_status_list = self.get_status_pc()
-        rcp_status = get_rcp_status(self._telnet_client)
-
+        with self._sessions.monitor as client:
+            if thread_num is None:
+                threads_info_list = self._read_pc_status(client, 31)
+                return threads_info_list
+            else:
+                return self._read_pc_status(client, 1 << (thread_num-1))
+
+    def _is_cached_upload(self, program_name, program_bytes):
+        """ Checks if upload cache has the same program uploaded to the robot """
+        return self._upload_cache is not None and \
+            self._upload_cache.get(self._ip, program_name) == program_hash(program_bytes)
+
+    def _is_program_uploaded(self, client, program_name, program_bytes, program_text, verify, stored_programs):
+        """ Checks if the same program is already stored on the robot according to upload cache.
+        stored_programs are lowercase names of programs on the robot, read once per upload """
+        if not self._is_cached_upload(program_name, program_bytes):
+            return False
+        if program_name.lower() not in stored_programs:
+            return False
+        if verify:
+            robot_text = read_program(client, program_name)
+            return normalize_program(robot_text) == normalize_program(program_text)
+        return True
+
+    def _release_program(self, client, program_name, pg_status_list, rcp_status):
+        """ Stops and kills the program in PC threads and RCP, so it can be replaced """
         for element in pg_status_list:
             if element.is_exist:
                 if element.name == program_name:  # добавить регистр
                     if element.is_running:
-                        pc_abort(self._telnet_client, 1 << (element.thread_num-1))
-                    pc_kill(self._telnet_client, 1 << (element.thread_num-1))
+                        pc_abort(client, 1 << (element.thread_num-1))
+                    pc_kill(client, 1 << (element.thread_num-1))
                     break  # because we have only 1 active program with the same name
 
         if rcp_status.is_exist:
             if rcp_status.name == program_name:  # добавить регистр
                 if rcp_status.is_running:
-                    rcp_hold(self._telnet_client)
-                kill_rcp(self._telnet_client)
-
-        # Uploading program block
-        file_string = '.PROGRAM ' + program_name + '\n'
-        file_string += program_text + '\n'
-        file_string += '.END' + '\n'
-
-        program_bytes = bytes(file_string, 'utf-8')
-        upload_program(self._telnet_client, program_bytes)
-
-        if open_program:
-            rcp_prime(self._telnet_client, program_name)
+                    rcp_hold(client)
+                kill_rcp(client)
+
+    def upload_program(self, program_name, program_text, open_program=False, batch_size=None, window=1,
+                       verify=False, minify=False, drop_labels=False, validate=False):
+        """ Uploads program via bulk session, replacing loaded program with the same name.
+        If robot has upload cache and the same program was uploaded before and still exists on the robot,
+        upload is skipped. verify=True additionally compares program text stored on the robot.
+        minify=True removes comments, blank lines and extra spaces before upload (and unused labels if drop_labels),
+        line numbers of syntax errors still refer to program_text. validate=True checks syntax before anything is sent
+        and raises KHIProgValidationError, see as_validator. The check is heuristic, so it's off by default.
+        Returns UploadStats with achieved throughput and bytes saved by minifying, None if upload was skipped.
+        See khi_telnet_lib.upload_program for batch_size and window """
+        return self.upload_programs({program_name: program_text}, open_program=program_name if open_program else None,
+                                    batch_size=batch_size, window=window, verify=verify, minify=minify,
+                                    drop_labels=drop_labels, validate=validate)
+
+    def upload_programs(self, programs, positions=None, reals=None, open_program=None, batch_size=None, window=1,
+                        verify=False, minify=False, drop_labels=False, validate=False):
+        """ Uploads programs (name -> text) and variables in one LOAD transaction via bulk session,
+        replacing loaded programs with the same names. Programs found in upload cache are skipped, see upload_program.
+        positions and reals are assigned like in write_variables, open_program is a name of a program to prime.
+        Returns UploadStats with achieved throughput, None if all programs were skipped and there are no variables.
+        Raises KHIProgSyntaxError with program of every error """
+        if validate:
+            errors = [error for name, text in programs.items() for error in validate_program(text, name)]
+            if errors:
+                raise KHIProgValidationError.from_errors(errors)
+        source_sizes = {name: len(format_programs({name: text})) for name, text in programs.items()}
+        line_maps = {}
+        if minify:
+            minified = {name: minify_program(text, drop_labels) for name, text in programs.items()}
+            programs = {name: text for name, (text, _) in minified.items()}
+            line_maps = {name: line_map for name, (_, line_map) in minified.items()}
+        programs_bytes = {name: format_programs({name: text}) for name, text in programs.items()}
+
+        with self._sessions.bulk as client:
+            stored_programs = set()
+            if any(self._is_cached_upload(name, programs_bytes[name]) for name in programs):
+                stored_programs = {name.lower() for name in read_programs_list(client)}
+            programs = {name: text for name, text in programs.items()
+                        if not self._is_program_uploaded(client, name, programs_bytes[name], text, verify,
+                                                         stored_programs)}
+            data_sections = format_variables(positions, reals)
+            if data_sections:
+                forget_written_values(self._ip)         # Template variables may be among them
+            stats = None
+            if programs or data_sections:
+                if programs:
+                    pg_status_list = self._read_pc_status(client, 31, cached=True)
+                    rcp_status = self._read_rcp_status(client, cached=True)
+                    for program_name in programs:
+                        self._release_program(client, program_name, pg_status_list, rcp_status)
+                        if self._upload_cache is not None:  # Robot program is undefined if upload fails
+                            self._upload_cache.invalidate(self._ip, program_name)
+
+                try:
+                    stats = upload_programs(client, programs, data_sections, batch_size, window)
+                except KHIProgSyntaxError as e:
+                    e.remap_lines(line_maps)
+                    raise
+                stats.saved_bytes = sum(source_sizes[name] - len(programs_bytes[name]) for name in programs)
+                if self._upload_cache is not None:
+                    for program_name in programs:
+                        self._upload_cache.put(self._ip, program_name, program_hash(programs_bytes[program_name]))
+
+            if open_program is not None:
+                rcp_prime(client, open_program)
+            return stats
+
+    def invalidate_upload_cache(self, program_name=None):
+        """ Forgets uploaded program (all programs if None), so it will be uploaded again """
+        if self._upload_cache is not None:
+            self._upload_cache.invalidate(self._ip, program_name)
 
     def prepare_rcp(self, program_name):
-        rcp_prepare(self._telnet_client, program_name)
+        with self._sessions.control as client:
+            rcp_prepare(client, program_name)
 
     def hold_rcp(self):
-        rcp_hold(self._telnet_client)
+        with self._sessions.safety as client:
+            rcp_hold(client)
 
-    async def continue_rcp(self):
-        await rcp_continue(self._telnet_client)
+    async def continue_rcp(self, blocking=True, timeout=None):
+        async with self._sessions.control as client:
+            return await rcp_continue(client, blocking, timeout)
 
     def abort_rcp(self):
-        rcp_abort(self._telnet_client)
+        with self._sessions.safety as client:
+            rcp_abort(client)
 
     def abort_kill_rcp(self):
-        rcp_abort(self._telnet_client)
-        kill_rcp(self._telnet_client)
-
-    async def execute_rcp(self, program_name=None, blocking=True):
+        with self._sessions.safety as client:
+            rcp_abort(client)
+            kill_rcp(client)
+
+    async def execute_rcp(self, program_name=None, blocking=True, timeout=None, progress=False,
+                          poll_interval=PROGRESS_POLL_INTERVAL):
+        """ Executes RCP program. If blocking, returns ProgramResult with the program run time.
+        Control session stays busy until the program ends, use monitor commands (hold_rcp, abort_rcp) meanwhile.
+        Blocking control commands called meanwhile from the thread of the same event loop raise KHISessionBusyError.
+        progress=True returns ProgramRun as soon as the program started: async iterator of step, cycle, held, error
+        and completed events with await run.done() returning ProgramResult, see program_progress.
+        Raises KHIProgTimeoutError if program isn't completed in timeout seconds """
         if program_name is None:
             program_name = ''
-        await rcp_execute(self._telnet_client, program_name, blocking)
-
-    def execute_pc(self, program_name, thread_num):
-        pc_execute(self._telnet_client, program_name, thread_num)
+        if progress:
+            return await self._start_rcp_run(program_name, timeout, poll_interval)
+        async with self._sessions.control as client:
+            return await rcp_execute(client, program_name, blocking, timeout)
+
+    async def _start_rcp_run(self, program_name, timeout, poll_interval):
+        async def wait_end(started):
+            async with self._sessions.control as client:
+                await rcp_execute(client, program_name, blocking=False)
+                started.set_result(None)
+                return await await_program_end(client, program_name, timeout)
+
+        # Status can't be polled while the control session waits for the end if monitor shares it
+        read_state = self.status if self._sessions.is_dedicated(ROLE_MONITOR) else None
+        run = ProgramRun(program_name, read_state, wait_end, poll_interval)
+        await run.started()
+        return run
+
+    def deploy_template(self, template, force=False):
+        """ Uploads ProgramTemplate under its name unless the same body was uploaded to the robot before.
+        Returns UploadStats, None if upload was skipped """
+        if not force and is_template_deployed(self._ip, template):
+            return None
+        stats = self.upload_program(template.name, template.body)
+        set_template_deployed(self._ip, template)
+        return stats
+
+    def write_template_values(self, template, values, force=False):
+        """ Writes parameter values of ProgramTemplate to their variables in one LOAD transmission.
+        Values equal to the last written ones are read back in one round trip and skipped if the robot still has
+        them, unless force. Returns UploadStats, None if nothing changed """
+        template.variables(values)                      # Checks parameter names before anything is written
+        changed = dict(values) if force else changed_values(self._ip, template, values)
+        unchanged = {parameter: value for parameter, value in values.items() if parameter not in changed}
+        if unchanged:
+            changed.update(self._changed_on_robot(template, unchanged))
+        if not changed:
+            return None
+        positions, reals = template.variables(changed)
+        with self._sessions.bulk as client:
+            stats = write_variables(client, positions, reals)
+        set_written_values(self._ip, template, values)  # Changed ones are written, others are read back
+        return stats
+
+    def _changed_on_robot(self, template, values):
+        """ Returns parameter values which differ from the values of their variables on the robot """
+        positions, reals = template.variables(values)
+        try:
+            listed = self.read_variables(list(positions), list(reals))
+        except KHIVarNotDefinedError:
+            return dict(values)
+        return {parameter: value for parameter, value in values.items()
+                if not matches_listed(value, listed.get(template.parameters[parameter]))}
+
+    async def execute_template(self, template, values=None, blocking=True, timeout=None):
+        """ Executes ProgramTemplate as RCP program with parameter values: the template is uploaded only if its body
+        changed and only changed values are written. See execute_rcp """
+        await asyncio.to_thread(self.deploy_template, template)
+        await asyncio.to_thread(self.write_template_values, template, values or {})
+        try:
+            return await self.execute_rcp(template.name, blocking, timeout)
+        except KHIProgNotExistError:                    # Deleted on the robot after the upload
+            forget_template(self._ip, template.name)
+            await asyncio.to_thread(self.deploy_template, template)
+            await asyncio.to_thread(self.write_template_values, template, values or {}, True)
+            return await self.execute_rcp(template.name, blocking, timeout)
+        except KHIVarNotDefinedError:
+            set_written_values(self._ip, template, None)    # Write all values next time
+            raise
+
+    def execute_pc(self, program_name, thread_num, progress=False, poll_interval=PROGRESS_POLL_INTERVAL):
+        """ Executes PC program in thread. progress=True returns ProgramRun, see execute_rcp. PC program doesn't
+        report its end, so it's found by polling PCSTATUS """
+        with self._sessions.control as client:
+            pc_execute(client, program_name, thread_num)
+        if progress:
+            return ProgramRun(program_name, lambda: self.get_status_pc(thread_num)[0], poll_interval=poll_interval)
 
     def stop_and_kill_pc(self, thread_num):
-        pc_abort(self._telnet_client, 1 << (thread_num - 1))
-        pc_kill(self._telnet_client, 1 << (thread_num - 1))
+        with self._sessions.safety as client:
+            pc_abort(client, 1 << (thread_num - 1))
+            pc_kill(client, 1 << (thread_num - 1))
 
     def read_all_programs(self):
-        programs_list = read_programs_list(self._telnet_client)
-        return programs_list
+        with self._sessions.bulk as client:
+            programs_list = read_programs_list(client)
+            return programs_list
 
     def delete_programs(self, pg_list: list, force=False):
         # DEV удалить из списка pg_list имена, которые упоминаются в robot_config.protected_pg_list
         if len(pg_list) == 0:
             return
 
-        if force:
-            rcp_status = get_rcp_status(self._telnet_client)
-            if rcp_status.is_exist:
-                if rcp_status.name in pg_list:  # добавить регистр
-                    if rcp_status.is_running:
-                        rcp_hold(self._telnet_client)
-                    kill_rcp(self._telnet_client)
+        with self._sessions.control as client:
+            if force:
+                rcp_status = self._read_rcp_status(client, cached=True)
+                if rcp_status.is_exist:
+                    if rcp_status.name in pg_list:  # добавить регистр
+                        if rcp_status.is_running:
+                            rcp_hold(client)
+                        kill_rcp(client)
 
-            # DEV Add pc programs
+                # DEV Add pc programs
 
-        for pg_name in pg_list:
-            pg_delete(self._telnet_client, pg_name)
+            for pg_name in pg_list:
+                self.invalidate_upload_cache(pg_name)
+                pg_delete(client, pg_name)
 
     def signal_on(self, signal_num: int):
-        signal_out(self._telnet_client, signal_num)
+        with self._sessions.control as client:
+            signal_out(client, signal_num)
 
     def signal_off(self, signal_num: int):
-        signal_out(self._telnet_client, -signal_num)
+        with self._sessions.control as client:
+            signal_out(client, -signal_num)
 
     def read_variable(self, variable_name):
-        return read_variable_position(self._telnet_client, variable_name)
+        with self._sessions.monitor as client:
+            return read_variable_position(client, variable_name)
+
+    def read_variables(self, positions=(), reals=()):
+        """ Reads location, joint (#name) and real variables in one round trip, "name[]" reads a whole array """
+        with self._sessions.monitor as client:
+            return read_variables(client, positions, reals)
+
+    def write_variables(self, positions=None, reals=None):
+        """ Assigns location, joint (#name) and real variables in one LOAD transmission """
+        forget_written_values(self._ip)                 # Template variables may be among them
+        with self._sessions.bulk as client:
+            return write_variables(client, positions, reals)
+
+    def download_programs(self, path, program_names=None, variables=True):
+        """ Streams programs (all by default) and variables to an AS file, which can be uploaded back.
+        Returns number of received bytes """
+        with self._sessions.bulk as client:
+            if program_names is None:
+                program_names = list(read_programs_directory(client))
+            with open(path, "wb") as file:
+                num_bytes = save_programs(client, program_names, file)
+                if variables:
+                    num_bytes += save_variables(client, file)
+            return num_bytes
+
+    def sync_mirror(self, program_names=None, variables=True, full=False, root=DEFAULT_MIRROR_PATH):
+        """ Updates local mirror of robot programs in root/<ip>, fetching only new and changed programs.
+        Returns SyncResult """
+        with self._sessions.bulk as client:
+            return ProgramMirror(self._ip, root).sync(client, program_names, variables, full)
 
     def end_message(self):
-        reset_save_load(self._telnet_client)
+        with self._sessions.bulk as client:
+            reset_save_load(client)
 
     def get_current_position(self):
-        return get_where(self._telnet_client)
+        with self._sessions.monitor as client:
+            return get_where(client)
+
+    def start_position_stream(self, thread_num=POSMON_THREAD, buffer_capacity=POSITION_BUFFER_CAPACITY,
+                              port=POSMON_PORT, frames=False):
+        """ Deploys and starts posmon in PC thread (get_position.pc takes PC thread 2).
+        Returns PositionStream to be connected with 'async with'.
+        frames=True uses posmon_fw with fixed-width frames and returns FramePositionStream yielding NumPy arrays """
+        with self._sessions.control as client:
+            deploy_posmon(client, thread_num, frames)
+        if frames:
+            return FramePositionStream(self._ip, port, buffer_capacity)
+        return PositionStream(self._ip, port, buffer_capacity)
+
+    def stop_position_stream(self, thread_num=POSMON_THREAD):
+        with self._sessions.control as client:
+            stop_posmon(client, thread_num)
+
+    def command_latency(self):
+        """ Returns CommandScheduler of every role with waiting times from request to grant per priority class.
+        Time from grant to the command on the wire (e.g. logging in again a dead session) isn't included """
+        return {role: self._sessions.session(role).scheduler for role in ROLES}
+
+    def check_connection(self):
+        """ Probes the monitor session, logging it in again if it's dead. Returns False if the robot is unreachable """
+        try:
+            with self._sessions.monitor as client:
+                return check_connection(client)
+        except KHIConnError:
+            return False
+
+
+class AsyncKHIRoLib:
+    """ Asyncio counterpart of KHIRoLibLite. Never blocks the event loop, so one process can drive many robots.
+    Commands issued concurrently to the same robot are serialized. Stop commands (hold, abort, PC abort) go over
+    a separate safety connection, so they aren't queued behind a blocking execute_rcp.
+
+    Usage:
+        async with AsyncKHIRoLib(ip) as robot:
+            await robot.execute_rcp("test_pg")
+    """
+    def __init__(self, ip: str, port: int | None = None):
+        """
+        Args:
+            ip (str): IP address of the robot.
+            port (int | None, optional): Telnet port of the robot, see KHIRoLibLite. Defaults to None.
+        """
+        self._ip = ip
+
+        self._is_real_robot = True if ip != '127.0.0.1' else False
+        self._telnet_port = default_port(ip) if port is None else port
+
+        self._telnet_client = AsyncTCPSockClient(self._ip, self._telnet_port)
+        self._lock = asyncio.Lock()
+        self._safety_client = AsyncTCPSockClient(self._ip, self._telnet_port)     # Stop commands only
+        self._safety_lock = asyncio.Lock()
+
+    async def connect(self):
+        """ Connection sequence to the robot."""
+        async with self._lock, self._safety_lock:
+            await async_lib.telnet_connect(self._telnet_client)
+            await async_lib.telnet_connect(self._safety_client)
+
+    async def close(self):
+        await self._safety_client.disconnect()
+        await self._telnet_client.disconnect()
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def status(self):
+        async with self._lock:
+            return await async_lib.get_rcp_status(self._telnet_client)
+
+    async def motor_on(self):
+        async with self._lock:
+            await async_lib.motor_on(self._telnet_client)
+
+    async def ereset(self):
+        async with self._lock:
+            await async_lib.ereset(self._telnet_client)
+
+    async def get_status_pc(self, thread_num=None):
+        async with self._lock:
+            if thread_num is None:
+                return await async_lib.get_pc_status(self._telnet_client, 31)
+            else:
+                return await async_lib.get_pc_status(self._telnet_client, 1 << (thread_num-1))
+
+    async def upload_program(self, program_name, program_text, open_program=False, batch_size=None, window=1):
+        async with self._lock:
+            pg_status_list = await async_lib.get_pc_status(self._telnet_client, 31)
+            rcp_status = await async_lib.get_rcp_status(self._telnet_client)
+
+            for element in pg_status_list:
+                if element.is_exist and element.name == program_name:
+                    if element.is_running:
+                        await async_lib.pc_abort(self._telnet_client, 1 << (element.thread_num-1))
+                    await async_lib.pc_kill(self._telnet_client, 1 << (element.thread_num-1))
+                    break  # because we have only 1 active program with the same name
+
+            if rcp_status.is_exist and rcp_status.name == program_name:
+                if rcp_status.is_running:
+                    await async_lib.rcp_hold(self._telnet_client)
+                await async_lib.kill_rcp(self._telnet_client)
+
+            file_string = '.PROGRAM ' + program_name + '\n' + program_text + '\n' + '.END' + '\n'
+            stats = await async_lib.upload_program(self._telnet_client, bytes(file_string, 'utf-8'),
+                                                   batch_size, window)
+
+            if open_program:
+                await async_lib.rcp_prime(self._telnet_client, program_name)
+            return stats
+
+    async def prepare_rcp(self, program_name):
+        async with self._lock:
+            await async_lib.rcp_prepare(self._telnet_client, program_name)
+
+    async def hold_rcp(self):
+        async with self._safety_lock:
+            await async_lib.rcp_hold(self._safety_client)
+
+    async def continue_rcp(self, blocking=True, timeout=None):
+        async with self._lock:
+            return await async_lib.rcp_continue(self._telnet_client, blocking, timeout)
+
+    async def abort_rcp(self):
+        async with self._safety_lock:
+            await async_lib.rcp_abort(self._safety_client)
+
+    async def abort_kill_rcp(self):
+        async with self._safety_lock:
+            await async_lib.rcp_abort(self._safety_client)
+            await async_lib.kill_rcp(self._safety_client)
+
+    async def execute_rcp(self, program_name=None, blocking=True, timeout=None):
+        if program_name is None:
+            program_name = ''
+        async with self._lock:
+            return await async_lib.rcp_execute(self._telnet_client, program_name, blocking, timeout)
+
+    async def execute_pc(self, program_name, thread_num):
+        async with self._lock:
+            await async_lib.pc_execute(self._telnet_client, program_name, thread_num)
+
+    async def stop_and_kill_pc(self, thread_num):
+        async with self._safety_lock:
+            await async_lib.pc_abort(self._safety_client, 1 << (thread_num - 1))
+            await async_lib.pc_kill(self._safety_client, 1 << (thread_num - 1))
+
+    async def read_all_programs(self):
+        async with self._lock:
+            return await async_lib.read_programs_list(self._telnet_client)
+
+    async def delete_programs(self, pg_list: list, force=False):
+        if len(pg_list) == 0:
+            return
+
+        async with self._lock:
+            if force:
+                rcp_status = await async_lib.get_rcp_status(self._telnet_client)
+                if rcp_status.is_exist and rcp_status.name in pg_list:
+                    if rcp_status.is_running:
+                        await async_lib.rcp_hold(self._telnet_client)
+                    await async_lib.kill_rcp(self._telnet_client)
+
+            for pg_name in pg_list:
+                await async_lib.pg_delete(self._telnet_client, pg_name)
+
+    async def signal_on(self, signal_num: int):
+        async with self._lock:
+            await async_lib.signal_out(self._telnet_client, signal_num)
+
+    async def signal_off(self, signal_num: int):
+        async with self._lock:
+            await async_lib.signal_out(self._telnet_client, -signal_num)
+
+    async def read_variable(self, variable_name):
+        async with self._lock:
+            return await async_lib.read_variable_position(self._telnet_client, variable_name)
+
+    async def end_message(self):
+        async with self._lock:
+            await async_lib.reset_save_load(self._telnet_client)
+
+    async def get_current_position(self):
+        async with self._lock:
+            return await async_lib.get_where(self._telnet_client)
 
     def check_connection(self):
-        return check_connection(self._telnet_client)
+        return async_lib.check_connection(self._telnet_client)
@@ -0,0 +1,167 @@
+"""
+A module for a KHIFleet class - concurrent control of many Kawasaki robots.
+Every operation runs on all robots in a thread pool with bounded parallelism, so it takes about as long
+as the slowest robot. An error of one robot is recorded in its result and doesn't affect others.
+Robots are identified by (ip, port) address, so several robots or emulators can share one IP.
+Stop commands (hold, abort) run in a separate pool with a worker per robot, so they aren't queued
+behind blocking program runs.
+
+Constants:
+    FLEET_MAX_WORKERS (int): Default number of robots served at the same time.
+"""
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+from khirolib import KHIRoLibLite, default_port
+from src.upload_cache import UploadCache
+from src.session_pool import ROLES
+from src.khi_exception import KHIConnError
+from utils.fleet_result import RobotResult, FleetResult
+
+FLEET_MAX_WORKERS = 16
+
+Address = tuple[str, int]
+
+
+class KHIFleet:
+    """ Usage:
+        with KHIFleet(["192.168.0.2", "192.168.0.3", ("127.0.0.1", 9105)]) as fleet:
+            print(fleet.upload_programs({"test_pg": program_text}))
+            print(fleet.execute_rcp("test_pg"))
+            print(fleet.status()["192.168.0.2"])
+    """
+    def __init__(self, ips: list[str | Address], max_workers: int = FLEET_MAX_WORKERS,
+                 upload_cache: UploadCache | None = None, roles: tuple[str, ...] = ROLES,
+                 ports: dict[str, int] | None = None):
+        """
+        Args:
+            ips (list[str | tuple[str, int]]): IP addresses or (ip, port) addresses of the robots.
+            max_workers (int, optional): Max number of robots served at the same time. Defaults to FLEET_MAX_WORKERS.
+            upload_cache (UploadCache | None, optional): Registry of uploaded programs shared by the robots.
+                Defaults to None.
+            roles (tuple[str, ...], optional): Roles of telnet sessions of every robot, see KHIRoLibLite.
+                Defaults to ROLES.
+            ports (dict[str, int] | None, optional): Telnet ports of robots given by IP only.
+                Defaults to None - default port of KHIRoLibLite.
+        """
+        self._ports = ports or {}
+        self._addresses: list[Address] = list(dict.fromkeys(self._address(ip) for ip in ips))
+        self._upload_cache = upload_cache
+        self._roles = roles
+        self._robots: dict[Address, KHIRoLibLite] = {}              # Connected robots
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="khi_fleet")
+        self._stop_executor = ThreadPoolExecutor(max_workers=max(len(self._addresses), 1),
+                                                 thread_name_prefix="khi_fleet_stop")
+
+    def _address(self, robot: str | Address) -> Address:
+        """ (ip, port) address of a robot given by IP or address """
+        if isinstance(robot, str):
+            return robot, self._ports.get(robot, default_port(robot))
+        ip, port = robot
+        return ip, port
+
+    @property
+    def robots(self) -> dict[Address, KHIRoLibLite]:
+        """ Connected robots by (ip, port) address """
+        return dict(self._robots)
+
+    def _map(self, operation_name: str, addresses: list[Address], operation: Callable[[Address], Any],
+             executor: ThreadPoolExecutor | None = None) -> FleetResult:
+        def run(address: Address) -> RobotResult:
+            start_time = time.perf_counter()
+            try:
+                value = operation(address)
+                return RobotResult(address, value, None, time.perf_counter() - start_time)
+            except Exception as e:
+                return RobotResult(address, None, e, time.perf_counter() - start_time)
+
+        start_time = time.perf_counter()
+        results = list((executor or self._executor).map(run, addresses))
+        return FleetResult(operation_name, {result.address: result for result in results},
+                           time.perf_counter() - start_time)
+
+    def connect(self) -> FleetResult:
+        """ Connects to all robots which are not connected yet. Failed robots can be connected by next call """
+        def connect_robot(address: Address) -> None:
+            ip, port = address
+            self._robots[address] = KHIRoLibLite(ip, self._upload_cache, self._roles, port=port)
+
+        return self._map("connect", [address for address in self._addresses if address not in self._robots],
+                         connect_robot)
+
+    def run(self, operation: Callable[[KHIRoLibLite], Any], ips: list[str | Address] | None = None,
+            operation_name: str | None = None, stop: bool = False) -> FleetResult:
+        """ Runs operation on connected robots.
+        Args:
+            operation (Callable[[KHIRoLibLite], Any]): Function called with a robot, its return value is
+                stored in the robot result. Coroutine functions are run to completion in the worker thread.
+            ips (list[str | tuple[str, int]] | None, optional): IP addresses or (ip, port) addresses of robots
+                to run on. Defaults to None - all connected robots.
+            operation_name (str | None, optional): Name of the operation in the result. Defaults to function name.
+            stop (bool, optional): Operation stops programs and runs in the stop pool, so it doesn't wait for
+                workers busy with other operations. Defaults to False.
+
+        Returns:
+            FleetResult: Result of every robot, robots which are not connected are failed with KHIConnError.
+        """
+        def run_robot(address: Address) -> Any:
+            robot = self._robots.get(address)
+            if robot is None:
+                raise KHIConnError()
+            value = operation(robot)
+            if asyncio.iscoroutine(value):
+                value = asyncio.run(value)
+            return value
+
+        if operation_name is None:
+            operation_name = getattr(operation, "__name__", "run")
+        if ips is None:
+            addresses = [address for address in self._addresses if address in self._robots]
+        else:
+            addresses = [self._address(ip) for ip in ips]
+        return self._map(operation_name, addresses, run_robot, self._stop_executor if stop else None)
+
+    def upload_programs(self, programs: dict[str, str], open_program: bool = False,
+                        ips: list[str | Address] | None = None) -> FleetResult:
+        """ Uploads programs (name -> text) to robots in one LOAD transaction per robot, open_program primes
+        the last program. Values of results are UploadStats (None if all programs are skipped by upload cache) """
+        last_program = list(programs)[-1] if open_program and programs else None
+        return self.run(lambda robot: robot.upload_programs(programs, open_program=last_program), ips,
+                        "upload_programs")
+
+    def status(self, ips: list[str | Address] | None = None) -> FleetResult:
+        """ Reads RCP status of robots, values of results are ThreadState """
+        return self.run(KHIRoLibLite.status, ips, "status")
+
+    def get_status_pc(self, ips: list[str | Address] | None = None) -> FleetResult:
+        """ Reads status of all PC threads of robots, values of results are lists of ThreadState """
+        return self.run(KHIRoLibLite.get_status_pc, ips, "get_status_pc")
+
+    def execute_rcp(self, program_name: str | None = None, blocking: bool = True, timeout: float | None = None,
+                    ips: list[str | Address] | None = None) -> FleetResult:
+        """ Executes RCP program on robots, values of results are ProgramResult if blocking """
+        return self.run(lambda robot: robot.execute_rcp(program_name, blocking, timeout), ips, "execute_rcp")
+
+    def hold_rcp(self, ips: list[str | Address] | None = None) -> FleetResult:
+        return self.run(KHIRoLibLite.hold_rcp, ips, "hold_rcp", stop=True)
+
+    def abort_rcp(self, ips: list[str | Address] | None = None) -> FleetResult:
+        return self.run(KHIRoLibLite.abort_rcp, ips, "abort_rcp", stop=True)
+
+    def close(self) -> None:
+        """ Closes connections to all robots """
+        for robot in self._robots.values():
+            robot.close()
+        self._robots.clear()
+        self._executor.shutdown()
+        self._stop_executor.shutdown()
+
+    def __enter__(self):
+        self.connect()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -8,5 +8,8 @@ setup(name='khirolib',
             'khirolib.*'
         ]),
         python_requires=">=3.8",
-        install_requires=[]
+        install_requires=[],
+        extras_require={
+            'stream': ['numpy']
+        }
 )
@@ -1,30 +1,60 @@
+"""
+A module for an AsyncTCPSockClient class - asyncio counterpart of TCPSockClient.
+All I/O is done through asyncio streams, so waiting for the robot never blocks the event loop.
+"""
+
 import asyncio
+import math
+import socket
+
+from src.tcp_sock_client import SERVER_TIMEOUT, RECV_CHUNK_SIZE, find_end
+
 
-class TCPSockClient:
-    def __init__(self, ip: str, port: int):
-        """ Initialize AsyncTCPSockClient instance.
+class AsyncTCPSockClient:
+    def __init__(self, ip: str, port: int, timeout: float | None = None):
+        """ Initialize AsyncTCPSockClient instance. Connection is established with connect().
 
         Args:
             ip (str): IP address of the robot.
             port (int): Port number of the robot.
+            timeout (float | None, optional): Default timeout of connect and receive operations in seconds.
+                Defaults to SERVER_TIMEOUT.
         """
-        self._ip = ip
-        self._port = port
-        self._reader = None
-        self._writer = None
+        self._ip: str = ip
+        self._port: int = port
+        self._timeout: float | None = SERVER_TIMEOUT if timeout is None else timeout
+
+        self._reader: asyncio.StreamReader | None = None
+        self._writer: asyncio.StreamWriter | None = None
+        self._buffer: bytearray = bytearray()                          # Received, but not yet consumed data
 
-    async def connect(self):
+        self.connected = False
+
+    async def connect(self) -> None:
         """ Establish connection to the robot. """
         try:
-            self._reader, self._writer = await asyncio.open_connection(self._ip, self._port)
-        except Exception as e:
-            print(f"Failed to connect: {e}")
+            self._reader, self._writer = await asyncio.wait_for(asyncio.open_connection(self._ip, self._port),
+                                                                self._timeout)
+            sock = self._writer.get_extra_info("socket")
+            if sock is not None:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+            self.connected = True
+        except (asyncio.TimeoutError, OSError):
             self._reader = None
             self._writer = None
+            self.connected = False
+
+    @property
+    def address(self) -> tuple[str, int]:
+        """ IP address and port of the robot """
+        return self._ip, self._port
+
+    def set_timeout(self, timeout: float | None) -> None:
+        """ Set default timeout for receive operations. None means wait forever. """
+        self._timeout = timeout
 
-    def set_timeout(self, timeout: int) -> None:
-        """ Set timeout for the connection (not applicable in asyncio). """
-        pass  # Timeout handling is different in asyncio
+    def reset_timeout(self) -> None:
+        self._timeout = SERVER_TIMEOUT
 
     async def send_msg(self, msg: str, end: bytes = b'\n') -> None:
         """ Send a message to the robot.
@@ -33,41 +63,100 @@ class TCPSockClient:
             msg (str): Message to be sent.
             end (bytes, optional): End marker for the message. Defaults to b'\n'.
         """
+        await self.send_bytes(msg.encode() + end)
+
+    async def send_bytes(self, msg: bytes) -> None:
+        """ Send bytes to the robot.
+
+        Args:
+            msg (bytes): Bytes to be sent.
+        """
         if self._writer is None:
             raise ConnectionError("Connection not established.")
-        self._writer.write(msg.encode() + end)
+        self._writer.write(msg)
         await self._writer.drain()  # Ensure the message is sent
 
-    async def wait_recv(self, *ends: bytes) -> bytes:
+    async def _read_chunk(self, timeout: float | None) -> None:
+        """ Append next chunk of data from the stream to the internal buffer """
+        chunk = await asyncio.wait_for(self._reader.read(RECV_CHUNK_SIZE), timeout)
+        if not chunk:
+            self.connected = False
+            raise ConnectionError("Connection closed by robot")
+        self._buffer += chunk
+
+    async def is_data_available(self, timeout: float = 0.1) -> bool:
+        """ Check if data is available to read, waiting for it not longer than timeout. """
+        if self._buffer:
+            return True
+        try:
+            await self._read_chunk(timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    async def wait_recv(self, *ends: bytes, timeout: float | None = None) -> bytes:
         """ Wait to receive data from the robot until one of the specified end markers is encountered.
+        Data after the end marker is kept in the internal buffer for the next call.
 
         Args:
-            *ends (bytes): End markers to wait for.
+            *ends (bytes): End markers to wait for. If none specified, returns all data of the first
+                non-empty read.
+            timeout (float | None, optional): Time limit for the whole call in seconds.
+                Defaults to client timeout, math.inf waits forever.
 
         Returns:
-            bytes: Received data.
+            bytes: Received data up to and including the first end marker.
 
         Raises:
             TimeoutError: If receive operation times out.
+            ConnectionError: If connection is not established or closed by the robot.
         """
         if self._reader is None:
             raise ConnectionError("Connection not established.")
 
-        incoming = b""
+        if timeout is None:
+            timeout = self._timeout
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None or math.isinf(timeout) else loop.time() + timeout
+
+        max_end_len = max((len(eom) for eom in ends), default=0)
+        scanned = 0                                 # Part of a buffer which doesn't contain end markers
         try:
             while True:
-                data = await self._reader.read(1)  # Read one byte
-                if not data:
-                    break  # Connection closed
-                incoming += data
-                for eom in ends:
-                    if incoming.endswith(eom):  # Check for end markers
+                if ends:
+                    end_pos = find_end(self._buffer, ends, max(0, scanned - max_end_len + 1))
+                    if end_pos > -1:
+                        incoming = bytes(self._buffer[:end_pos])
+                        del self._buffer[:end_pos]
                         return incoming
+                elif self._buffer:
+                    incoming = bytes(self._buffer)
+                    self._buffer.clear()
+                    return incoming
+                scanned = len(self._buffer)
+
+                await self._read_chunk(None if deadline is None else max(0.0, deadline - loop.time()))
         except asyncio.TimeoutError:
             raise TimeoutError("Receive operation timed out")
 
-    def disconnect(self) -> None:
+    async def flush_input_buffer(self) -> None:
+        """ Clear any data currently in the input buffer. """
+        self._buffer.clear()
+        while await self.is_data_available():
+            self._buffer.clear()
+
+    def is_connected(self) -> bool:
+        """ Check connection """
+        return self.connected and self._writer is not None and not self._writer.is_closing()
+
+    async def disconnect(self) -> None:
         """ Closes connection. """
         if self._writer:
             self._writer.close()
-            asyncio.run(self._writer.wait_closed())
+            try:
+                await self._writer.wait_closed()
+            except OSError:
+                pass
+        self._reader = None
+        self._writer = None
+        self.connected = False
@@ -0,0 +1,70 @@
+"""
+AS program minifier, used before upload to send fewer bytes.
+Comments, indentation, blank lines and extra spaces outside string literals are removed, optionally together
+with labels no statement refers to. The line map of the result is kept, so syntax errors reported by the robot
+for the uploaded program can be pointed at the source lines.
+
+Usage:
+    text, line_map = minify_program(source)
+    source_line = line_map[robot_line - 1]
+"""
+
+import re
+
+LABEL_RE = re.compile(r"^([A-Za-z_][\w.]*):$")
+WORD_RE = re.compile(r"[A-Za-z_][\w.]*")
+
+
+def strip_line(line: str) -> str:
+    """ Returns line without comment and with single spaces outside string literals """
+    result = []
+    in_string = False
+    space = False
+    for char in line.strip():
+        if char == '"':
+            in_string = not in_string
+        elif not in_string:
+            if char == ";":
+                break
+            if char in " \t":
+                space = True
+                continue
+        if space and result:
+            result.append(" ")
+        space = False
+        result.append(char)
+    return "".join(result)
+
+
+def _code_words(line: str) -> set[str]:
+    """ Returns identifiers of the line outside string literals """
+    return set(WORD_RE.findall(re.sub(r'"[^"]*"', " ", line)))
+
+
+def minify_program(program_text: str, drop_labels: bool = False) -> tuple[str, list[int]]:
+    """ Removes comments, blank lines and extra spaces of a program.
+    Args:
+        program_text (str): Program without .PROGRAM and .END lines.
+        drop_labels (bool, optional): Remove labels not used by any statement. Defaults to False.
+
+    Returns:
+        tuple[str, list[int]]: Minified program and source line number (from 1) of every line of it.
+    """
+    lines = []
+    line_map = []
+    for line_num, line in enumerate(program_text.splitlines(), start=1):
+        stripped = strip_line(line)
+        if stripped:
+            lines.append(stripped)
+            line_map.append(line_num)
+
+    if drop_labels:
+        used = set()
+        for line in lines:
+            if not LABEL_RE.match(line):
+                used |= {word.lower() for word in _code_words(line)}
+        kept = [idx for idx, line in enumerate(lines)
+                if (label := LABEL_RE.match(line)) is None or label.group(1).lower() in used]
+        lines = [lines[idx] for idx in kept]
+        line_map = [line_map[idx] for idx in kept]
+    return "\n".join(lines), line_map
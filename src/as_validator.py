@@ -0,0 +1,227 @@
+"""
+Offline syntax check of AS programs, used before upload so a bad line doesn't cost a loading session.
+Lines are split into tokens and checked for unbalanced quotes and brackets, incomplete expressions and
+assignments, block structure (IF/ELSE/END, WHILE/DO/END, FOR/END, DO/UNTIL, CASE/VALUE/ANY/END) and
+GOTO targets. Errors have the shape of errors reported by the robot (KHISyntaxError).
+Instructions aren't checked against the AS instruction set unless strict=True, because it depends on
+the controller model and options.
+
+Constants:
+    SYNTAX_ERROR_CODE (str): Code of errors found by the validator.
+    INSTRUCTIONS (frozenset[str]): AS instructions known in strict mode.
+"""
+
+import re
+
+from src.as_minifier import strip_line
+from src.khi_exception import KHISyntaxError
+
+SYNTAX_ERROR_CODE = "E0001"
+
+TOKEN_RE = re.compile(r'\s*(?:(?P<string>"[^"]*")|(?P<number>(?:\d+\.?\d*|\.\d+)(?:E[+-]?\d+)?(?![\w.]))'
+                      r'|(?P<name>[$#.]?[A-Za-z_][\w.]*)|(?P<op><>|<=|>=|==|!=|[-+*/^=<>(),:\[\]&|!@#\\]))',
+                      re.I)
+LABEL_RE = re.compile(r"^([A-Za-z_][\w.]*):$")
+
+BINARY_OPERATORS = frozenset({"+", "-", "*", "/", "^", "=", "==", "<>", "!=", "<", ">", "<=", ">=", ",", "(", "[",
+                              "&", "|", "AND", "OR", "XOR", "NOT", "MOD", "BAND", "BOR", "BXOR", "BNOT"})
+INSTRUCTIONS = frozenset({
+    # Program control
+    "IF", "ELSE", "END", "WHILE", "DO", "UNTIL", "FOR", "CASE", "VALUE", "ANY", "GOTO", "CALL",
+    "RETURN", "STOP", "HALT", "PAUSE", "WAIT", "TWAIT", "TIMER", "PCEXECUTE", "PCABORT", "PCEND", "PCKILL",
+    "EXECUTE", "ABORT", "HOLD", "CONTINUE", "ON", "ONI", "IGNORE", "SCASE", "SVALUE", "PRINT", "TYPE", "PROMPT",
+    "MC", "NOEXIST_SET_R", "UTIMER", "LOCK",
+    # Motion
+    "JMOVE", "LMOVE", "JAPPRO", "LAPPRO", "JDEPART", "LDEPART", "HOME", "DRIVE", "DRAW", "TDRAW", "C1MOVE",
+    "C2MOVE", "HMOVE", "XMOVE", "DELAY", "STABLE", "JOINT", "BREAK", "BRAKE", "SPEED", "ACCURACY", "ACCEL",
+    "DECEL", "ALWAYS", "FINE", "COARSE", "CP", "OX", "WX", "CLAMP", "OPEN", "OPENI", "CLOSE", "CLOSEI", "RELAX",
+    "RELAXI", "TOOL", "BASE", "LAYER", "SINGLE", "MULTIPLE", "OVERLAP",
+    # Data and signals
+    "POINT", "HERE", "DECOMPOSE", "DEFSIG", "SIGNAL", "PULSE", "DLYSIG", "RUNMASK", "BITS", "SWAIT", "ZERO",
+    "TCP_LISTEN", "TCP_ACCEPT", "TCP_SEND", "TCP_RECV", "TCP_CLOSE", "TCP_END_LISTEN", "TCP_CONNECT", "TCP_STATUS",
+    "UDP_SENDTO", "UDP_RECVFROM", "ARCON", "ARCOFF", "SWITCH", "MVWAIT",
+})
+
+_BLOCK_ENDS = {"IF": "END", "WHILE": "END", "FOR": "END", "CASE": "END", "DO": "UNTIL"}
+
+
+class _Block:
+    def __init__(self, keyword: str, line: int, text: str):
+        self.keyword = keyword
+        self.line = line
+        self.text = text
+        self.has_else = False
+
+
+def tokenize(line: str) -> tuple[list[tuple[str, str, int]], int | None]:
+    """ Splits a stripped line into (kind, text, position) tokens.
+    Returns:
+        tuple[list[tuple[str, str, int]], int | None]: Tokens and position of the first character
+            which isn't a token, None if the whole line is split.
+    """
+    tokens = []
+    position = 0
+    while position < len(line):
+        match = TOKEN_RE.match(line, position)
+        if match is None or match.end() == position:
+            return tokens, len(line) - len(line[position:].lstrip())
+        kind = match.lastgroup
+        tokens.append((kind, match.group(kind), match.start(kind)))
+        position = match.end()
+    return tokens, None
+
+
+def _check_brackets(tokens: list) -> tuple[str, int] | None:
+    """ Returns description and position of unbalanced bracket """
+    stack = []
+    pairs = {")": "(", "]": "["}
+    for kind, text, position in tokens:
+        if kind != "op":
+            continue
+        if text in "([":
+            stack.append((text, position))
+        elif text in pairs:
+            if not stack or stack[-1][0] != pairs[text]:
+                return f"Unmatched '{text}'.", position
+            stack.pop()
+    if stack:
+        return f"Unclosed '{stack[-1][0]}'.", stack[-1][1]
+    return None
+
+
+def _check_expression_end(tokens: list) -> tuple[str, int] | None:
+    """ Returns description and position of incomplete expression at the end of line """
+    kind, text, position = tokens[-1]
+    if kind in ("op", "name") and text.upper() in BINARY_OPERATORS:
+        return "Expression is not complete.", position
+    return None
+
+
+def validate_program(program_text: str, program_name: str | None = None, strict: bool = False) \
+        -> list[KHISyntaxError]:
+    """ Checks program syntax without the robot.
+    Args:
+        program_text (str): Program without .PROGRAM and .END lines.
+        program_name (str | None, optional): Program set to errors. Defaults to None.
+        strict (bool, optional): Report statements not starting with a known instruction or an assignment.
+            Defaults to False.
+
+    Returns:
+        list[KHISyntaxError]: Errors in the order of lines, line numbers refer to program_text.
+    """
+    errors = []
+    blocks: list[_Block] = []
+    labels: dict[str, int] = {}
+    gotos: list[tuple[str, int, str, int]] = []            # (label, line, text, position)
+
+    def error(line_num: int, text: str, descr: str, position: int = 0) -> None:
+        errors.append(KHISyntaxError.from_fields(line_num, text, SYNTAX_ERROR_CODE, descr, position, program_name))
+
+    for line_num, line in enumerate(program_text.splitlines(), start=1):
+        text = strip_line(line)
+        if not text:
+            continue
+        if text.count('"') % 2:
+            error(line_num, text, "String is not terminated.", text.rfind('"'))
+            continue
+        label = LABEL_RE.match(text)
+        if label is not None:
+            name = label.group(1).lower()
+            if name in labels:
+                error(line_num, text, f"Label {label.group(1)} is already defined at line {labels[name]}.")
+            labels.setdefault(name, line_num)
+            continue
+
+        tokens, bad_position = tokenize(text)
+        if bad_position is not None:
+            error(line_num, text, f"Unexpected character '{text[bad_position]}'.", bad_position)
+            continue
+        problem = _check_brackets(tokens) or _check_expression_end(tokens)
+        if problem is not None:
+            error(line_num, text, *problem)
+            continue
+
+        kind, first, _ = tokens[0]
+        if kind == "name" and len(tokens) > 2 and tokens[1][1] == ":" and first.upper() not in INSTRUCTIONS:
+            labels.setdefault(first.lower(), line_num)        # Label before a statement
+            tokens = tokens[2:]
+            kind, first, _ = tokens[0]
+        keyword = first.upper() if kind == "name" else ""
+        words = [token_text.upper() for token_kind, token_text, _ in tokens if token_kind == "name"]
+        if "GOTO" in words:
+            goto_idx = next(idx for idx, token in enumerate(tokens) if token[1].upper() == "GOTO")
+            if goto_idx + 1 >= len(tokens) or tokens[goto_idx + 1][0] not in ("name", "number"):
+                error(line_num, text, "Label is missing after GOTO.", tokens[goto_idx][2])
+                continue
+            gotos.append((tokens[goto_idx + 1][1].lower(), line_num, text, tokens[goto_idx + 1][2]))
+
+        if keyword == "IF":
+            if words[-1] == "THEN":
+                blocks.append(_Block("IF", line_num, text))
+            elif "GOTO" not in words:
+                error(line_num, text, "IF without THEN or GOTO.")
+            if len(tokens) < 3:
+                error(line_num, text, "Condition is missing.", tokens[0][2])
+        elif keyword == "ELSE":
+            if not blocks or blocks[-1].keyword != "IF" or blocks[-1].has_else:
+                error(line_num, text, "ELSE without IF.")
+            else:
+                blocks[-1].has_else = True
+        elif keyword in ("WHILE", "CASE"):
+            expected = "DO" if keyword == "WHILE" else "OF"
+            if words[-1] != expected or len(tokens) < 3:
+                error(line_num, text, f"{keyword} without {expected}.")
+            else:
+                blocks.append(_Block(keyword, line_num, text))
+        elif keyword == "FOR":
+            if "TO" not in words or "=" not in (token[1] for token in tokens):
+                error(line_num, text, "FOR without = or TO.")
+            else:
+                blocks.append(_Block("FOR", line_num, text))
+        elif keyword == "DO" and len(tokens) == 1:
+            blocks.append(_Block("DO", line_num, text))
+        elif keyword in ("VALUE", "ANY"):
+            if not blocks or blocks[-1].keyword != "CASE":
+                error(line_num, text, f"{keyword} without CASE.")
+        elif keyword in ("END", "UNTIL"):
+            if not blocks:
+                error(line_num, text, f"{keyword} without block.")
+            elif _BLOCK_ENDS[blocks[-1].keyword] != keyword:
+                block = blocks.pop()
+                error(line_num, text, f"{keyword} closes {block.keyword} of line {block.line}.")
+            else:
+                blocks.pop()
+            if keyword == "UNTIL" and len(tokens) < 2:
+                error(line_num, text, "Condition is missing.", tokens[0][2])
+        elif keyword not in INSTRUCTIONS:
+            target_end = _assignment_target_end(tokens)
+            if target_end is not None:
+                if target_end + 1 >= len(tokens):
+                    error(line_num, text, "Value is missing.", tokens[target_end][2])
+            elif strict:
+                error(line_num, text, f"Unknown instruction {first}.", tokens[0][2])
+
+    for block in blocks:
+        error(block.line, block.text, f"{block.keyword} without {_BLOCK_ENDS[block.keyword]}.")
+    for label, line_num, text, position in gotos:
+        if label not in labels and not label.isdigit():
+            error(line_num, text, f"Label {label} is not defined.", position)
+    errors.sort(key=lambda found: found.line)
+    return errors
+
+
+def _assignment_target_end(tokens: list) -> int | None:
+    """ Returns index of "=" if statement assigns a variable (name or array element), otherwise None """
+    if tokens[0][0] != "name":
+        return None
+    idx = 1
+    if idx < len(tokens) and tokens[idx][1] == "[":
+        depth = 0
+        while idx < len(tokens):
+            depth += {"[": 1, "]": -1}.get(tokens[idx][1], 0)
+            idx += 1
+            if depth == 0:
+                break
+    if idx < len(tokens) and tokens[idx][1] == "=":
+        return idx
+    return None
@@ -0,0 +1,141 @@
+"""
+Bulk reading and writing of robot variables.
+Reads send LIST commands of all requested variables in one package, so any number of variables takes
+one round trip. Whole arrays ("name[]") are taken from a single listing of all variables of the type.
+Writes upload .TRANS, .JOINTS and .REALS sections of an AS file in one LOAD transmission.
+
+Constants:
+    SECTION_TYPES (dict[str, str]): Variable types of AS file sections.
+"""
+
+try:
+    import numpy as np
+except ImportError:         # Only read_positions_array needs numpy, install khirolib[stream]
+    np = None
+
+from utils.upload_stats import UploadStats
+from src.tcp_sock_client import TCPSockClient
+from src.khi_telnet_lib import execute_pipelined, upload_program, VARIABLE_NOT_DEFINED
+from src.khi_tracing import traced
+from src.khi_exception import KHIVarNotDefinedError
+
+SECTION_TYPES = {".TRANS": "location", ".JOINTS": "joint", ".REALS": "real"}
+
+
+def parse_variable_listing(robot_msg: str) -> dict:
+    """ Parses output of LIST /L and LIST /R commands.
+    Returns:
+        dict[str, list[float] | float]: Values of locations (X, Y, Z, O, A, T), joints (#name) and reals.
+    """
+    variables = {}
+    section = None
+    for line in robot_msg.split("\r\n"):
+        line = line.strip()
+        if line in SECTION_TYPES:
+            section = SECTION_TYPES[line]
+            continue
+        if section is None or not line or line.startswith(".") or line.startswith(">"):
+            section = None if line.startswith(".END") else section
+            continue
+        try:
+            if section == "real":
+                name, _, value = line.partition("=")
+                variables[name.strip()] = float(value)
+            else:
+                name, *values = line.split()
+                variables[name] = [float(value) for value in values]
+        except ValueError:
+            continue                            # Echo of the command or other text
+    return variables
+
+
+def _array_name(name: str) -> str | None:
+    """ Returns array name without brackets for "name[]" and None for other names """
+    return name[:-2] if name.endswith("[]") else None
+
+
+def _select(listing: dict, name: str) -> dict:
+    """ Returns all elements of array "name[]" from the listing """
+    prefix = _array_name(name) + "["
+    return {key: value for key, value in listing.items() if key.startswith(prefix)}
+
+
+@traced
+def read_variables(client: TCPSockClient, positions: list[str] = (), reals: list[str] = ()) -> dict:
+    """ Reads location, joint (#name) and real variables in one round trip.
+    Args:
+        client(TCPSockClient): Object representing open client socket
+        positions (list[str], optional): Location and joint variables. "name[]" reads all elements of an array.
+        reals (list[str], optional): Real variables. "name[]" reads all elements of an array.
+
+    Returns:
+        dict[str, list[float] | float]: Values by variable name, arrays are expanded to their elements.
+
+    Raises:
+        KHIVarNotDefinedError: If any of variables (except arrays) is not defined, with the name of the first one.
+    """
+    single_positions = [name for name in positions if _array_name(name) is None]
+    single_reals = [name for name in reals if _array_name(name) is None]
+    commands = [f"LIST /L {name}" for name in single_positions] + [f"LIST /R {name}" for name in single_reals]
+    list_all_positions = any(_array_name(name) is not None for name in positions)
+    list_all_reals = any(_array_name(name) is not None for name in reals)
+    commands += ["LIST /L"] * list_all_positions + ["LIST /R"] * list_all_reals
+
+    responses = execute_pipelined(client, commands)
+    for name, response in zip(single_positions + single_reals, responses):
+        if VARIABLE_NOT_DEFINED in response:
+            raise KHIVarNotDefinedError(name)
+
+    variables = {}
+    num_single = len(commands) - list_all_positions - list_all_reals
+    for response in responses[:num_single]:
+        variables.update(parse_variable_listing(response.decode()))
+    listings = [parse_variable_listing(response.decode()) for response in responses[num_single:]]
+    all_positions = listings.pop(0) if list_all_positions else {}
+    all_reals = listings.pop(0) if list_all_reals else {}
+    for name in positions:
+        if _array_name(name) is not None:
+            variables.update(_select(all_positions, name))
+    for name in reals:
+        if _array_name(name) is not None:
+            variables.update(_select(all_reals, name))
+    return variables
+
+
+def read_positions_array(client: TCPSockClient, names: list[str]):
+    """ Reads location or joint variables in one round trip.
+    Returns:
+        np.ndarray: Array of shape (len(names), number of values) in the order of names.
+    """
+    if np is None:
+        raise ImportError("read_positions_array requires numpy, install khirolib[stream]")
+    variables = read_variables(client, positions=names)
+    return np.array([variables[name] for name in names], dtype=np.float64)
+
+
+def format_variables(positions: dict | None = None, reals: dict | None = None) -> bytes:
+    """ Returns AS file with .TRANS, .JOINTS and .REALS sections assigning the variables.
+    Args:
+        positions (dict[str, list[float]] | None, optional): Location values (X, Y, Z, O, A, T) and joint values
+            of #name variables.
+        reals (dict[str, float] | None, optional): Real values.
+    """
+    positions = positions or {}
+    sections = [(".TRANS", [f"{name} " + " ".join(f"{value:.3f}" for value in values)
+                            for name, values in positions.items() if not name.startswith("#")]),
+                (".JOINTS", [f"{name} " + " ".join(f"{value:.3f}" for value in values)
+                             for name, values in positions.items() if name.startswith("#")]),
+                (".REALS", [f"{name} = {value:.9g}" for name, value in (reals or {}).items()])]
+    return "".join(f"{section}\n" + "".join(line + "\n" for line in lines) + ".END\n"
+                   for section, lines in sections if lines).encode()
+
+
+@traced
+def write_variables(client: TCPSockClient, positions: dict | None = None, reals: dict | None = None,
+                    batch_size: int | None = None, window: int = 1) -> UploadStats | None:
+    """ Assigns location, joint (#name) and real variables in one LOAD transmission, see format_variables.
+    Returns UploadStats of the transmission or None if there is nothing to write """
+    file_bytes = format_variables(positions, reals)
+    if not file_bytes:
+        return None
+    return upload_program(client, file_bytes, batch_size, window)
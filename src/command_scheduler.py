@@ -0,0 +1,118 @@
+"""
+A module for a CommandScheduler class - priority lock of a telnet session. Commands waiting for a session
+are granted it by priority class and in the order of requests within a class, so a HOLD requested during
+a status poll or a long transfer goes before every queued query or upload.
+A long operation calls checkpoint() between its commands, where it hands the session over to more urgent
+waiters and queues again. A LOAD transaction has no checkpoints, as the terminal doesn't take commands
+until it's finished. Waiting time from request to grant is measured per class. It doesn't include the time
+from grant to the command being sent, e.g. logging in again a dead session, nor waits of keepalive probes.
+
+Constants:
+    PRIORITY_SAFETY (int): HOLD, ABORT and PCABORT commands.
+    PRIORITY_CONTROL (int): Program start, continue and other state changing commands.
+    PRIORITY_QUERY (int): Status polling, position and variable reading.
+    PRIORITY_BULK (int): Program uploads, downloads and other long transfers.
+    PRIORITIES (tuple[int, ...]): All priority classes, most urgent first.
+"""
+
+import contextvars
+import heapq
+import itertools
+import threading
+import time
+
+from utils.latency_stats import LatencyStats
+
+PRIORITY_SAFETY = 0
+PRIORITY_CONTROL = 1
+PRIORITY_QUERY = 2
+PRIORITY_BULK = 3
+PRIORITIES = (PRIORITY_SAFETY, PRIORITY_CONTROL, PRIORITY_QUERY, PRIORITY_BULK)
+
+_current_scheduler: contextvars.ContextVar["CommandScheduler | None"] = \
+    contextvars.ContextVar("khi_current_scheduler", default=None)
+
+
+class CommandScheduler:
+    def __init__(self):
+        """ Initialize CommandScheduler instance, a free session without waiters """
+        self._condition = threading.Condition()
+        self._owner: int | None = None                      # Priority of the current holder, None if free
+        self._waiting: list[tuple[int, int]] = []           # Heap of (priority, ticket) of waiting requests
+        self._tickets = itertools.count()
+        self.latency: dict[int, LatencyStats] = {priority: LatencyStats() for priority in PRIORITIES}
+
+    def acquire(self, priority: int = PRIORITY_CONTROL, blocking: bool = True, record: bool = True) -> bool:
+        """ Takes the session when no more urgent or earlier request of the same class waits for it.
+        Args:
+            priority (int, optional): Priority class of the request. Defaults to PRIORITY_CONTROL.
+            blocking (bool, optional): Wait for the session. Defaults to True.
+            record (bool, optional): Add waiting time to latency of the class, internal requests like
+                keepalive probes don't. Defaults to True.
+
+        Returns:
+            bool: True if the session was taken, False if it's busy and blocking=False.
+        """
+        requested = time.monotonic()
+        with self._condition:
+            if self._owner is not None or self._waiting:
+                if not blocking:
+                    return False
+                request = (priority, next(self._tickets))
+                heapq.heappush(self._waiting, request)
+                while self._owner is not None or self._waiting[0] != request:
+                    self._condition.wait()
+                heapq.heappop(self._waiting)
+            self._owner = priority
+            if record:
+                self.latency[priority].add(time.monotonic() - requested)
+        return True
+
+    def release(self) -> None:
+        with self._condition:
+            self._owner = None
+            self._condition.notify_all()
+
+    def locked(self) -> bool:
+        return self._owner is not None
+
+    def has_urgent_waiters(self) -> bool:
+        """ Checks if a request of a more urgent class than the holder waits for the session """
+        with self._condition:
+            return self._owner is not None and bool(self._waiting) and self._waiting[0][0] < self._owner
+
+    def checkpoint(self) -> None:
+        """ Lets more urgent waiters use the session and takes it back. Must be called by the holder """
+        if not self.has_urgent_waiters():
+            return
+        priority = self._owner
+        with self._condition:
+            request = (priority, next(self._tickets))
+            heapq.heappush(self._waiting, request)              # Queue before releasing, nobody jumps in
+            self._owner = None
+            self._condition.notify_all()
+            while self._owner is not None or self._waiting[0] != request:
+                self._condition.wait()
+            heapq.heappop(self._waiting)
+            self._owner = priority
+
+    def __str__(self):
+        names = {PRIORITY_SAFETY: "safety", PRIORITY_CONTROL: "control", PRIORITY_QUERY: "query",
+                 PRIORITY_BULK: "bulk"}
+        return "\n".join(f"{names[priority]}: {self.latency[priority]}" for priority in PRIORITIES)
+
+
+def set_current_scheduler(scheduler: CommandScheduler | None) -> contextvars.Token:
+    """ Sets scheduler of the session taken by the current thread or task """
+    return _current_scheduler.set(scheduler)
+
+
+def reset_current_scheduler(token: contextvars.Token) -> None:
+    _current_scheduler.reset(token)
+
+
+def checkpoint() -> None:
+    """ Lets more urgent commands use the session of the current thread or task between two commands """
+    scheduler = _current_scheduler.get()
+    if scheduler is not None:
+        scheduler.checkpoint()
@@ -0,0 +1,466 @@
+"""
+Asyncio variant of khi_telnet_lib. Every function mirrors the blocking one with the same name,
+but works with AsyncTCPSockClient and has to be awaited. Protocol constants and parsers are shared.
+"""
+import asyncio
+import math
+
+from utils.thread_state import ThreadState
+from utils.rcp_state import RCPState
+from utils.program_result import ProgramResult
+from utils.upload_stats import UploadStats
+from src.AsyncTCPSockClient import AsyncTCPSockClient
+from src.status_cache import invalidates_status, invalidates_programs_status
+from src.upload_cache import program_lines
+from src.khi_telnet_lib import UPLOAD_BATCH_SIZES, PROBE_TIMEOUT, NEWLINE_MSG, START_LOADING, SAVE_LOAD_ERROR, \
+                               START_UPLOAD_SEQ, END_UPLOAD_SEQ, CANCEL_LOADING, PKG_RECV, \
+                               CONFIRM_TRANSMISSION, NAME_CONFIRMATION, CONFIRMATION_REQUEST, \
+                               PROGRAM_COMPLETED, PROGRAM_STOPPED, PROGRAM_HELD, SYNTAX_ERROR, PROGRAM_IN_USE, \
+                               PROG_IS_LOADED, THREAD_IS_BUSY, PROG_NOT_EXIST, PROG_IS_ACTIVE, RCP_IS_RUNNING, \
+                               NO_WORK_DETECTED_ERROR, parse_program_thread, parse_program_rcp, unpack_threads, \
+                               check_start_response, check_stop_response, get_upload_batch_size, \
+                               set_upload_batch_size, parse_program_listing
+from src.khi_exception import *
+
+
+async def telnet_connect(client: AsyncTCPSockClient) -> None:
+    await client.connect()
+    if not client.connected:
+        raise KHIConnError()
+    try:
+        await client.wait_recv(b"login")        # Send 'as' as login for kawasaki telnet terminal
+        await client.send_msg("as")             # Confirm with carriage return and line feed control symbols
+        await client.wait_recv(NEWLINE_MSG)     # wait for '>' symbol of a kawasaki terminal new line
+    except (TimeoutError, ConnectionError):
+        raise KHIConnError()
+
+
+async def wait_for_data(client: AsyncTCPSockClient, timeout: float = 1.0) -> bytes | None:
+    """ Wait for data to become available within the specified timeout.
+    Returns:
+        bytes | None: The received data if available, or None if no data is received within the timeout.
+    """
+    try:
+        return await client.wait_recv(timeout=timeout)
+    except TimeoutError:
+        return None
+
+
+async def handshake(client: AsyncTCPSockClient) -> None:
+    """ Performs a handshake with the robot and raises an exception if something fails """
+    await client.send_msg("")
+    if not await client.wait_recv(NEWLINE_MSG):
+        raise KHIConnError()
+
+
+@invalidates_status
+async def ereset(client: AsyncTCPSockClient) -> None:
+    await client.send_msg("ERESET")
+    await client.wait_recv(NEWLINE_MSG)
+
+
+@invalidates_status
+async def motor_on(client: AsyncTCPSockClient) -> None:
+    await client.send_msg("ZPOW ON")
+    await client.wait_recv(NEWLINE_MSG)
+
+
+async def disconnect(client: AsyncTCPSockClient) -> None:
+    await client.disconnect()
+
+
+async def get_sys_switch(client: AsyncTCPSockClient, switch_name: str) -> bool:
+    """ Sets robot system switch state """
+    await client.send_msg("SWITCH " + switch_name)
+    return (await client.wait_recv(NEWLINE_MSG)).split()[-2].decode() == "ON"
+
+
+async def set_sys_switch(client: AsyncTCPSockClient, switch_name: str, value: bool) -> None:
+    """ Sets robot system switch. Note that switch might be read-only,
+        in that case switch value won't be changed """
+    await client.send_msg(switch_name + "ON" if value else "OFF")
+    await client.wait_recv(NEWLINE_MSG)
+
+
+async def get_error_descr(client: AsyncTCPSockClient) -> str:
+    """ Returns robot error state description, empty string if no error """
+    await client.send_msg("type $ERROR(ERROR)")
+    res = (await client.wait_recv(NEWLINE_MSG)).decode()
+    if "Value is out of range." not in res:
+        return ' '.join(res.split('\r\n')[1:-1])
+    return ""
+
+
+async def execute_pipelined(client: AsyncTCPSockClient, commands: list[str], confirm: bool = False) -> list[bytes]:
+    """ Sends several terminal commands in one package and splits the responses by terminal prompts.
+    See khi_telnet_lib.execute_pipelined for more info """
+    if not commands:
+        return []
+    answer = "\n1" if confirm else ""
+    await client.send_bytes("".join(command + answer + "\n" for command in commands).encode())
+
+    responses = []
+    for _ in commands:
+        res = await client.wait_recv(CONFIRMATION_REQUEST) if confirm else b""
+        responses.append(res + await client.wait_recv(NEWLINE_MSG))
+    return responses
+
+
+async def get_pc_status(client: AsyncTCPSockClient, threads: int) -> [ThreadState]:
+    """ Checks the status of a list of PC programs based on a packed integer representing threads to check.
+    See khi_telnet_lib.get_pc_status for more info """
+    pc_thread_states = [ThreadState() for _ in range(5)]
+    thread_nums = unpack_threads(threads)
+    responses = await execute_pipelined(client, [f"PCSTATUS {thread_num}:" for thread_num in thread_nums])
+    for thread_num, response in zip(thread_nums, responses):
+        pc_thread_states[thread_num - 1] = parse_program_thread(response.decode(), thread_num=thread_num)
+    return pc_thread_states
+
+
+async def get_rcp_status(client: AsyncTCPSockClient) -> RCPState:
+    """ Checks the status of current active RCP program. """
+    await client.send_msg("STATUS")
+    return parse_program_rcp((await client.wait_recv(NEWLINE_MSG)).decode())
+
+
+async def init_loading(client: AsyncTCPSockClient) -> None:
+    await client.send_bytes(START_LOADING)
+    res = await client.wait_recv(b'Loading...(using.rcc)\r\n', SAVE_LOAD_ERROR)
+    if SAVE_LOAD_ERROR in res:
+        raise KHIProgTransmissionError("SAVE/LOAD in progress")
+
+
+async def process_response(client: AsyncTCPSockClient, answer_errors: bool = True) -> bytes:
+    """ Waits for acknowledgement of a package. See khi_telnet_lib.process_response for more info """
+    errors = b""
+    res = await client.wait_recv(SYNTAX_ERROR, PROGRAM_IN_USE, PKG_RECV, NAME_CONFIRMATION, CONFIRM_TRANSMISSION)
+    if NAME_CONFIRMATION in res:
+        res = await client.wait_recv(PKG_RECV, SYNTAX_ERROR, PROGRAM_IN_USE, CONFIRM_TRANSMISSION)
+    if SYNTAX_ERROR in res and not answer_errors:
+        return res
+
+    while SYNTAX_ERROR in res:
+        errors += res
+        await client.send_msg("0")
+        await client.wait_recv(b"0\r\n")
+        res = await client.wait_recv(PKG_RECV, SYNTAX_ERROR, CONFIRM_TRANSMISSION)
+
+    if PROGRAM_IN_USE in res:
+        raise KHIProgRunningError("")
+    return errors
+
+
+async def _abort_loading(client: AsyncTCPSockClient, in_flight: int) -> None:
+    """ Ends loading session broken by a syntax error while next packages were in flight.
+    See khi_telnet_lib._abort_loading for more info """
+    await client.send_msg("0")
+    try:
+        while in_flight > 0:
+            res = await client.wait_recv(PKG_RECV, SYNTAX_ERROR, CONFIRM_TRANSMISSION, timeout=PROBE_TIMEOUT)
+            if SYNTAX_ERROR in res:
+                await client.send_msg("0")
+            elif CONFIRM_TRANSMISSION in res:
+                break
+            else:
+                in_flight -= 1
+    except TimeoutError:            # Package cut by the answer is never acknowledged
+        pass
+
+    await client.send_bytes(START_UPLOAD_SEQ + CANCEL_LOADING + END_UPLOAD_SEQ)
+    try:
+        while SYNTAX_ERROR in await client.wait_recv(SYNTAX_ERROR, CONFIRM_TRANSMISSION, timeout=PROBE_TIMEOUT):
+            await client.send_msg("0")
+    except TimeoutError:
+        try:
+            await reset_save_load(client)
+        except TimeoutError:
+            pass
+    await client.flush_input_buffer()
+    await handshake(client)
+
+
+async def _upload_batches(client: AsyncTCPSockClient, program_bytes: bytes, batch_size: int, window: int,
+                          probe: bool) -> UploadStats:
+    """ Sends program in packages of batch_size bytes keeping up to window packages not acknowledged """
+    start_time = asyncio.get_running_loop().time()
+    num_packages = math.ceil(len(program_bytes) / batch_size)
+    file_packages = [START_UPLOAD_SEQ + program_bytes[idx * batch_size: (idx + 1) * batch_size] + END_UPLOAD_SEQ
+                     for idx in range(num_packages)]
+
+    await init_loading(client)
+
+    errors = b""
+    sent = acked = 0
+    while acked < num_packages:
+        while sent < num_packages and sent - acked < window:
+            await client.send_bytes(file_packages[sent])
+            sent += 1
+        try:
+            package_errors = await process_response(client, answer_errors=sent - acked == 1)
+        except TimeoutError:
+            if probe and acked == 0 and num_packages > 1:   # First full package isn't acknowledged
+                raise KHIBatchSizeError(batch_size)
+            raise
+        if package_errors and sent - acked > 1:     # Packages in flight were taken as the answer to the error
+            await _abort_loading(client, sent - acked - 1)
+            return await _upload_batches(client, program_bytes, batch_size, 1, probe)
+        errors += package_errors
+        acked += 1
+
+    await client.send_bytes(START_UPLOAD_SEQ + CANCEL_LOADING + END_UPLOAD_SEQ)
+    errors += await process_response(client)
+
+    if errors:
+        raise KHIProgSyntaxError(errors.split(SYNTAX_ERROR), program_lines(program_bytes))
+    return UploadStats(len(program_bytes), num_packages, batch_size, window,
+                       asyncio.get_running_loop().time() - start_time)
+
+
+@invalidates_programs_status
+async def upload_program(client: AsyncTCPSockClient, program_bytes: bytes, batch_size: int | None = None,
+                         window: int = 1) -> UploadStats:
+    """ Uploads a program to the robot. Package size is shared with khi_telnet_lib.upload_program: the size
+    remembered for this controller, probed from UPLOAD_BATCH_SIZES on the first upload.
+    On a syntax error with packages in flight the program is uploaded again with window=1.
+    See khi_telnet_lib.upload_program for more info """
+    if batch_size is not None:
+        return await _upload_batches(client, program_bytes, batch_size, window, probe=False)
+
+    batch_size = get_upload_batch_size(client)
+    if batch_size is not None:
+        return await _upload_batches(client, program_bytes, batch_size, window, probe=False)
+
+    for batch_size in UPLOAD_BATCH_SIZES:
+        try:
+            stats = await _upload_batches(client, program_bytes, batch_size, window, probe=True)
+        except KHIBatchSizeError:
+            try:
+                await reset_save_load(client)   # Close loading session before trying smaller packages
+            except TimeoutError:
+                pass
+            await client.flush_input_buffer()
+            continue
+        if stats.num_packages > 1:       # At least one package of full size is accepted
+            set_upload_batch_size(client, batch_size)
+        return stats
+    raise KHIProgTransmissionError("Robot doesn't acknowledge program packages")
+
+
+@invalidates_status
+async def delete_program(client: AsyncTCPSockClient, program_name: str) -> None:
+    await client.send_msg("DELETE/P/D " + program_name)
+    await client.wait_recv(CONFIRMATION_REQUEST)
+    await client.send_msg("1")
+    res = await client.wait_recv(b"1" + NEWLINE_MSG)
+    if PROGRAM_IN_USE in res:
+        raise KHIProgRunningError(program_name)
+    elif PROG_IS_LOADED in res:
+        raise KHIProgLoadedError(program_name)
+
+
+@invalidates_status
+async def pc_execute(client: AsyncTCPSockClient, program_name: str, thread_num: int) -> None:
+    """ Executes PC program on selected thread """
+    await client.send_msg(f"PCEXE {str(thread_num)}: {program_name}")
+    res = await client.wait_recv(NEWLINE_MSG)
+
+    if PROG_NOT_EXIST in res:
+        raise KHIProgNotExistError(program_name)
+    elif PROGRAM_IN_USE in res:
+        raise KHIProgRunningError(program_name)
+    elif THREAD_IS_BUSY in res:
+        raise KHIThreadBusyError(thread_num)
+
+
+@invalidates_status
+async def pc_abort(client: AsyncTCPSockClient, threads: int) -> None:
+    """ Aborts running PC programs on selected threads. """
+    await execute_pipelined(client, [f"PCABORT {thread_num}:" for thread_num in unpack_threads(threads)])
+
+
+@invalidates_status
+async def pc_end(client: AsyncTCPSockClient, threads: int) -> None:
+    """ Softly ends selected program(s) waiting for the current cycle to be completed """
+    await execute_pipelined(client, [f"PCEND {thread_num}:" for thread_num in unpack_threads(threads)])
+
+
+@invalidates_status
+async def pc_kill(client: AsyncTCPSockClient, threads: int) -> None:
+    """ Unloads aborted programs from selected pc threads """
+    thread_nums = unpack_threads(threads)
+    responses = await execute_pipelined(client, [f"PCKILL {thread_num}:" for thread_num in thread_nums],
+                                        confirm=True)
+    for thread_num, res in zip(thread_nums, responses):
+        if PROG_IS_ACTIVE in res:
+            raise KHIProgActiveError(thread_num)
+
+
+@invalidates_status
+async def rcp_prepare(client: AsyncTCPSockClient, program_name: str):
+    """ Prepare RCP program for execution (open on Teach pendant) """
+    await client.send_msg("PRIME " + program_name)
+    res = await client.wait_recv(NEWLINE_MSG)
+
+    if PROG_NOT_EXIST in res:
+        raise KHIProgNotExistError(program_name)
+
+
+@invalidates_status
+async def wait_program_end(client: AsyncTCPSockClient, program_name: str, timeout: float | None = None,
+                           check_held_error: bool = True) -> ProgramResult:
+    """ Waits for the message about stopped RCP program without blocking the event loop.
+    See khi_telnet_lib.wait_program_end for more info """
+    loop = asyncio.get_running_loop()
+    start_time = loop.time()
+    deadline = None if timeout is None else start_time + timeout
+    while True:
+        remaining = math.inf if deadline is None else deadline - loop.time()
+        try:
+            if remaining <= 0:
+                raise TimeoutError
+            res = await client.wait_recv(PROGRAM_STOPPED, timeout=remaining)
+        except TimeoutError:
+            raise KHIProgTimeoutError(program_name, timeout)
+
+        check_stop_response(res)
+        if PROGRAM_HELD in res:
+            if check_held_error:
+                any_result = await wait_for_data(client, timeout=2.0)
+                if any_result and NO_WORK_DETECTED_ERROR in any_result:
+                    raise KHINoWorkDetectedError
+            raise KHIProgramHeldError(' '.join(res.decode('utf-8').split()))
+
+        if PROGRAM_COMPLETED in res:
+            return ProgramResult(program_name, completed=True, elapsed=loop.time() - start_time,
+                                 message=' '.join(res.decode('utf-8').split()))
+
+        return ProgramResult(program_name, completed=False, elapsed=loop.time() - start_time,
+                             message=' '.join(res.decode('utf-8').split()))
+
+
+@invalidates_status
+async def rcp_execute(client: AsyncTCPSockClient, program_name: str, blocking=True,
+                      timeout: float | None = None) -> ProgramResult | None:
+    """ Executes RCP program of set name. See khi_telnet_lib.rcp_execute for more info """
+    await client.send_msg("EXECUTE " + program_name)
+    res = await client.wait_recv(NEWLINE_MSG)
+
+    if PROG_NOT_EXIST in res:
+        raise KHIProgNotExistError(program_name)
+    check_start_response(res)
+
+    if blocking:
+        return await wait_program_end(client, program_name, timeout, check_held_error=True)
+
+
+@invalidates_status
+async def rcp_prime(client: AsyncTCPSockClient, program_name: str, blocking=True):
+    await client.send_msg("PRIME " + program_name)
+    res = await client.wait_recv(NEWLINE_MSG)
+
+    if PROG_NOT_EXIST in res:
+        raise KHIProgNotExistError(program_name)
+
+
+@invalidates_status
+async def rcp_abort(client: AsyncTCPSockClient) -> None:
+    """ Aborts current RCP program """
+    await client.send_msg("ABORT")
+    await client.wait_recv(NEWLINE_MSG)
+
+
+@invalidates_status
+async def rcp_hold(client: AsyncTCPSockClient) -> None:
+    """ Holds current RCP program """
+    await client.send_msg("HOLD")
+    await client.wait_recv(NEWLINE_MSG)
+
+
+@invalidates_status
+async def rcp_continue(client: AsyncTCPSockClient, blocking=True,
+                       timeout: float | None = None) -> ProgramResult | None:
+    """ Continue current RCP program """
+    await client.send_msg("CONTINUE")
+    res = await client.wait_recv(NEWLINE_MSG)
+    check_start_response(res)
+
+    if blocking:
+        return await wait_program_end(client, "", timeout, check_held_error=False)
+
+
+@invalidates_status
+async def kill_rcp(client: AsyncTCPSockClient) -> None:
+    """ Kills current RCP program """
+    await client.send_msg("KILL")
+    await client.wait_recv(CONFIRMATION_REQUEST)
+    await client.send_msg("1")
+    await client.wait_recv(NEWLINE_MSG)
+
+
+async def read_variable_real(client: AsyncTCPSockClient, variable_name: str) -> float:
+    await handshake(client)
+    await client.send_msg(f"list /r {variable_name}")
+    tmp_string = await client.wait_recv(NEWLINE_MSG)
+    return float(tmp_string.split()[-2])
+
+
+async def read_variable_position(client: AsyncTCPSockClient, variable_name: str) -> list:
+    await handshake(client)
+    await client.send_msg(f"list /l {variable_name}")
+    tmp_string = await client.wait_recv(NEWLINE_MSG)
+    return [float(element) for element in tmp_string.split()[5:-1]]
+
+
+async def read_programs_list(client: AsyncTCPSockClient) -> [str]:
+    await handshake(client)
+    await client.send_msg("DIRECTORY/P")
+    res = (await client.wait_recv(NEWLINE_MSG)).decode().split("\r\n")
+    if len(res) > 3:
+        return [item.strip() for item in res[2].split() if item.strip() != ""]
+    else:
+        return []
+
+
+async def read_program(client: AsyncTCPSockClient, program_name: str) -> str:
+    """ Reads text of the program stored on the robot """
+    await handshake(client)
+    await client.send_msg(f"LIST /P {program_name}")
+    res = await client.wait_recv(NEWLINE_MSG)
+
+    if PROG_NOT_EXIST in res:
+        raise KHIProgNotExistError(program_name)
+    return parse_program_listing(res.decode())
+
+
+@invalidates_status
+async def pg_delete(client: AsyncTCPSockClient, program_name):
+    await client.send_msg(f"DELETE/D {program_name}")
+    await client.wait_recv(CONFIRMATION_REQUEST)
+    await client.send_msg("1")
+    res = await client.wait_recv(NEWLINE_MSG)
+
+    if RCP_IS_RUNNING in res:
+        raise KHIProgRunningError(program_name)
+    elif PROG_IS_LOADED in res:
+        raise KHIProgLoadedError(program_name)
+
+
+async def reset_save_load(client: AsyncTCPSockClient):
+    await client.send_bytes(START_UPLOAD_SEQ + "END.".encode() + END_UPLOAD_SEQ)
+    await client.send_bytes(CANCEL_LOADING)
+    await client.wait_recv(CONFIRM_TRANSMISSION)
+
+
+async def signal_out(client: AsyncTCPSockClient, signal):
+    await client.send_msg(f"SOUT {signal}")
+
+
+async def get_where(client: AsyncTCPSockClient):
+    await client.flush_input_buffer()
+    await client.send_msg("WHERE")
+    res = (await client.wait_recv(NEWLINE_MSG)).decode().split("\r\n")
+    return [float(element) for element in res[4].split()]
+
+
+def check_connection(client: AsyncTCPSockClient):
+    return client.is_connected()
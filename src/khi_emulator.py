@@ -0,0 +1,760 @@
+"""
+A module for a KHIEmulator class - local stand-in for a Kawasaki controller telnet terminal.
+It speaks the subset of the terminal protocol used by khi_telnet_lib, so the library can be tested
+and benchmarked without a robot or K-Roset. Network latency, jitter and bandwidth are configurable
+and pseudo-random delays are seeded, so measurements are reproducible.
+
+Usage:
+    with KHIEmulator(latency=0.002) as emulator:
+        client = TCPSockClient(*emulator.address)
+        telnet_connect(client)
+
+Run as a script to serve on a fixed port:
+    python -m src.khi_emulator --port 9105 --latency 0.002
+"""
+
+import collections
+import math
+import queue
+import random
+import socket
+import threading
+import time
+
+from src.khi_telnet_lib import NEWLINE_MSG, PKG_RECV, SYNTAX_ERROR
+from src.position_frames import encode_frame
+
+LOGIN_MSG = b"login: "
+LOADING_MSG = b"Loading...(using.rcc)\r\n"
+SAVE_LOAD_ERROR_MSG = b"(P2076)SAVE/LOAD in progress.\r\n>"
+TRANSMISSION_MSG = b"\r\nTransmission completed. (transmission(s)\r\n>"
+CONFIRMATION_MSG = b"\r\nAre you sure ? (Yes:1, No:0) "
+
+FRAME_HEADER_LEN = 7            # STX, frame type and "    0"
+STX, ETB, EOF = 0x02, 0x17, 0x1a
+
+SECTIONS = (".TRANS", ".JOINTS", ".REALS", ".STRINGS")
+STREAM_PROGRAM = "posmon"       # PC program streaming position while running
+FRAME_STREAM_PROGRAM = "posmon_fw"      # Variant streaming fixed-width frames
+
+
+class _Run:
+    """ Simulated run of a program in RCP or PC thread """
+    def __init__(self, name: str, steps: int, duration: float):
+        self.name = name
+        self.steps = max(steps, 1)
+        self.duration = duration
+        self.remaining = duration     # Time left to completion when held
+        self.started = 0.0
+        self.running = False
+        self.completed_cycles = 0
+        self.timer: threading.Timer | None = None
+        self.owner: "_Session | None" = None
+
+    @property
+    def step_num(self) -> int:
+        if math.isinf(self.duration):
+            return 1
+        done = self.duration - self.remaining
+        if self.running:
+            done += time.monotonic() - self.started
+        return min(self.steps, 1 + int(done / self.duration * self.steps)) if self.duration > 0 else self.steps
+
+
+def terminal_response(echo: str, body: list[str] | None = None) -> bytes:
+    """ Returns terminal response: echo of the command, output lines and a new prompt """
+    return "\r\n".join([echo] + (body or [])).encode() + NEWLINE_MSG
+
+
+class _Session:
+    """ One telnet connection to the emulator """
+    def __init__(self, emulator: "KHIEmulator", sock: socket.socket):
+        self.emulator = emulator
+        self.sock = sock
+        self.send_lock = threading.Lock()
+        self.outgoing: queue.Queue = queue.Queue()     # Responses with their delivery time
+        self.link_free = 0.0                            # Time when previous response is delivered
+        self.buffer = bytearray()
+        self.mode = "login"              # login, terminal, confirm, load, syntax
+        self.confirm_action = None       # Action executed when command is confirmed
+        self.load_text = b""             # Received, but not complete line of loaded file
+        self.load_lines: list[str] = []  # Complete lines of loaded file waiting for processing
+        self.load_section = None         # Program name or data section being loaded
+        self.load_step = 0
+        self.load_ack = False            # Package acknowledge is postponed until syntax error is answered
+        self.load_eof = False
+
+    def send(self, data: bytes) -> None:
+        """ Queues data to be delivered after simulated network delay. Order of messages is kept """
+        with self.send_lock:
+            self.link_free = self.emulator.delivery_time(len(data), self.link_free)
+            self.outgoing.put((self.link_free, data))
+
+    def _deliver(self) -> None:
+        while True:
+            due, data = self.outgoing.get()
+            if data is None:
+                return
+            delay = due - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            try:
+                self.sock.sendall(data)
+            except OSError:
+                return
+
+    def serve(self) -> None:
+        threading.Thread(target=self._deliver, daemon=True).start()
+        self.send(LOGIN_MSG)
+        try:
+            while True:
+                data = self.sock.recv(65536)
+                if not data:
+                    break
+                self.buffer += data
+                self.process()
+        except OSError:
+            pass
+        finally:
+            self.outgoing.put((0.0, None))
+            self.sock.close()
+            with self.emulator._lock:
+                self.emulator._sessions.remove(self)
+
+    def _pop_line(self) -> str | None:
+        end = self.buffer.find(b"\n")
+        if end < 0:
+            return None
+        line = bytes(self.buffer[:end]).rstrip(b"\r").decode(errors="replace")
+        del self.buffer[:end + 1]
+        return line
+
+    def process(self) -> None:
+        while self.buffer:
+            if self.mode == "load":
+                if not self._process_frame():
+                    return
+                continue
+            line = self._pop_line()
+            if line is None:
+                return
+            if self.mode == "login":
+                if line.strip() == "as":
+                    self.mode = "terminal"
+                    self.send(b"as" + NEWLINE_MSG)
+                else:
+                    self.send(LOGIN_MSG)
+            elif self.mode == "confirm":
+                self.mode = "terminal"
+                self.emulator.confirm(self, line)
+            elif self.mode == "syntax":
+                if line.strip() == "1":          # Delete program and abort loading
+                    self.emulator.programs.pop(self.load_section, None)
+                    self.mode = "terminal"
+                    self.buffer.clear()
+                    self.send(terminal_response(line))
+                    return
+                self.send(line.encode() + b"\r\n")
+                self.mode = "load"
+                self._process_load_lines()
+            else:
+                self.emulator.execute(self, line)
+
+    # Loading of AS files via LOAD using.rcc
+
+    def start_loading(self, echo: str) -> bytes:
+        if self.emulator.save_load_errors > 0:
+            self.emulator.save_load_errors -= 1
+            return echo.encode() + b"\r\n" + SAVE_LOAD_ERROR_MSG
+        self.mode = "load"
+        self.load_text, self.load_lines, self.load_section = b"", [], None
+        self.load_ack, self.load_eof = False, False
+        return echo.encode() + b"\r\n" + LOADING_MSG
+
+    def _process_frame(self) -> bool:
+        """ Processes one frame of loading protocol. Returns False if more data is needed """
+        if self.buffer[0] != STX:                   # Data outside of frames, only EOF matters
+            next_frame = self.buffer.find(bytes([STX]))
+            if next_frame < 0:
+                next_frame = len(self.buffer)
+            if EOF in self.buffer[:next_frame]:
+                self.load_eof = True
+            del self.buffer[:next_frame]
+            return bool(self.buffer)
+        if len(self.buffer) < FRAME_HEADER_LEN:
+            return False
+
+        frame_type = chr(self.buffer[1])
+        if frame_type == "C":
+            end = self.buffer.find(bytes([ETB]), FRAME_HEADER_LEN)
+            if end < 0:
+                return False
+            payload = bytes(self.buffer[FRAME_HEADER_LEN:end])
+            del self.buffer[:end + 1]
+            max_batch_size = self.emulator.max_batch_size
+            if max_batch_size is not None and len(payload) > max_batch_size:
+                return True                             # Too large package is ignored
+            if EOF in payload:
+                payload = payload[:payload.index(EOF)]
+                self.load_eof = True
+            self.load_text += payload
+            *lines, self.load_text = self.load_text.split(b"\n")
+            self.load_lines += [line.rstrip(b"\r").decode(errors="replace") for line in lines]
+            if not self.load_eof:
+                self.load_ack = True
+                self._process_load_lines()
+            return True
+
+        del self.buffer[:FRAME_HEADER_LEN]
+        if self.buffer[:1] == bytes([ETB]):
+            del self.buffer[:1]
+        if frame_type == "E":
+            if self.load_text:
+                self.load_lines.append(self.load_text.decode(errors="replace"))
+                self.load_text = b""
+            self.load_eof = True
+            self._process_load_lines()
+        return True
+
+    def _process_load_lines(self) -> None:
+        """ Stores loaded lines, stops at a line with syntax error and waits for the answer """
+        while self.load_lines:
+            error = self.emulator.load_line(self, self.load_lines.pop(0))
+            if error is not None:
+                if self.mode == "terminal":      # Loading is rejected
+                    self.buffer.clear()
+                else:
+                    self.mode = "syntax"
+                    error += SYNTAX_ERROR
+                self.send(error)
+                return
+        if self.load_eof:
+            self.mode = "terminal"
+            self.load_ack = False
+            self.send(TRANSMISSION_MSG)
+        elif self.load_ack:
+            self.load_ack = False
+            self.send(PKG_RECV)
+
+
+class KHIEmulator:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0, jitter: float = 0.0,
+                 bandwidth: float | None = None, seed: int | None = 0, program_duration: float = 0.5,
+                 stream_port: int | None = None, stream_rate: float = 250.0):
+        """
+        Initialize KHIEmulator instance. Server is started with start() or by entering the context.
+
+        Args:
+            host (str, optional): Address to listen on. Defaults to "127.0.0.1".
+            port (int, optional): Port to listen on. Defaults to 0 - any free port, see address.
+            latency (float, optional): Delay before every response in seconds. Defaults to 0.
+            jitter (float, optional): Max random delay added to latency in seconds. Defaults to 0.
+            bandwidth (float | None, optional): Response transfer speed in bytes per second. Defaults to None - unlimited.
+            seed (int | None, optional): Seed of jitter generator. Defaults to 0.
+            program_duration (float, optional): Duration of a simulated program run in seconds. Defaults to 0.5.
+            stream_port (int | None, optional): Port of posmon position stream, 0 - any free port, see stream_address.
+                Defaults to None - no stream.
+            stream_rate (float, optional): Position samples per second sent by posmon. Defaults to 250.
+        """
+        self._host = host
+        self._port = port
+        self.latency = latency
+        self.jitter = jitter
+        self.bandwidth = bandwidth
+        self.program_duration = program_duration
+        self.program_durations: dict[str, float] = {      # Duration of particular programs
+            STREAM_PROGRAM: math.inf, "get_position.pc": math.inf,
+            FRAME_STREAM_PROGRAM: math.inf, "get_position_fw.pc": math.inf}
+        self._stream_port = stream_port
+        self.stream_rate = stream_rate
+        self.stream_drop = 0.0                      # Probability of losing a posmon_fw frame
+        self._stream_server: socket.socket | None = None
+
+        self._random = random.Random(seed)
+        self._lock = threading.RLock()
+        self._server: socket.socket | None = None
+        self._sessions: list[_Session] = []
+
+        # Controller state
+        self.programs: dict[str, list[str]] = {}
+        self.locations: dict[str, list[float]] = {}
+        self.joints: dict[str, list[float]] = {}
+        self.reals: dict[str, float] = {}
+        self.strings: dict[str, str] = {}
+        self.joint_position = [0.0, 30.0, -60.0, 0.0, -30.0, 0.0]
+        self.cartesian_position = [500.0, 0.0, 800.0, 0.0, 180.0, 0.0]
+        self.motor_power = True
+        self.teach_mode = False
+        self.error_now = False
+        self.monitor_speed = 10.0
+        self.switches: dict[str, bool] = {}
+        self.signals: set[int] = set()
+        self.rcp: _Run | None = None
+        self.pc_threads: list[_Run | None] = [None] * 5
+        self._notifications: list[tuple[_Session, bytes]] = []
+        self.command_counts: collections.Counter = collections.Counter()   # Terminal commands received by name
+
+        # Injected errors
+        self.syntax_errors: set[str] = set()      # Loaded lines containing any of these strings are rejected
+        self.save_load_errors = 0                  # Number of next LOAD commands failing with P2076
+        self.max_batch_size: int | None = None     # Larger loading packages are not acknowledged
+        self.max_sessions: int | None = None       # Further telnet connections are closed at once
+
+    # Server
+
+    @property
+    def address(self) -> tuple[str, int]:
+        return self._host, self._port
+
+    def start(self) -> "KHIEmulator":
+        self._server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._server.bind((self._host, self._port))
+        self._port = self._server.getsockname()[1]
+        self._server.listen()
+        threading.Thread(target=self._accept, daemon=True).start()
+        if self._stream_port is not None:
+            self._stream_server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self._stream_server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self._stream_server.bind((self._host, self._stream_port))
+            self._stream_port = self._stream_server.getsockname()[1]
+            self._stream_server.listen()
+            threading.Thread(target=self._accept_stream, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        for server in (self._server, self._stream_server):
+            if server is not None:
+                try:
+                    server.shutdown(socket.SHUT_RDWR)   # Wakes up accept, so the port is free for a restart
+                except OSError:
+                    pass
+                server.close()
+        self._server = self._stream_server = None
+        with self._lock:
+            for session in self._sessions:
+                try:
+                    session.sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+            for run in [self.rcp] + self.pc_threads:
+                if run is not None and run.timer is not None:
+                    run.timer.cancel()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def _accept(self) -> None:
+        while self._server is not None:
+            try:
+                sock, _ = self._server.accept()
+            except OSError:
+                return
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            session = _Session(self, sock)
+            with self._lock:
+                if self.max_sessions is not None and len(self._sessions) >= self.max_sessions:
+                    sock.close()
+                    continue
+                self._sessions.append(session)
+            threading.Thread(target=session.serve, daemon=True).start()
+
+    @property
+    def stream_address(self) -> tuple[str, int | None]:
+        return self._host, self._stream_port
+
+    def _stream_run(self) -> _Run | None:
+        with self._lock:
+            return next((run for run in self.pc_threads if run is not None and run.running
+                         and run.name in (STREAM_PROGRAM, FRAME_STREAM_PROGRAM)), None)
+
+    def _accept_stream(self) -> None:
+        while self._stream_server is not None:
+            try:
+                sock, _ = self._stream_server.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._serve_stream, args=(sock,), daemon=True).start()
+
+    def _serve_stream(self, sock: socket.socket) -> None:
+        """ Sends position samples like posmon or frames like posmon_fw while it's running """
+        seq = 0
+        try:
+            while self._stream_server is not None:
+                run = self._stream_run()
+                if run is None:
+                    break
+                controller_time = time.monotonic() - run.started
+                if run.name == STREAM_PROGRAM:
+                    sock.sendall(self.position_sample(controller_time))
+                else:
+                    seq += 1
+                    if self._random.random() >= self.stream_drop:
+                        with self._lock:
+                            joints = list(self.joint_position)
+                        sock.sendall(encode_frame(seq, controller_time, joints))
+                time.sleep(1 / self.stream_rate)
+        except OSError:
+            pass
+        finally:
+            sock.close()
+
+    def position_sample(self, controller_time: float) -> bytes:
+        """ Returns position sample in the format of get_position.pc """
+        with self._lock:
+            values = [f"{controller_time:.4f}"] + [f"{value:.4f}" for value in self.joint_position] + \
+                     [f"{value:.3f}" for value in self.cartesian_position]
+        return " ".join(values).encode() + b"\n"
+
+    def delivery_time(self, num_bytes: int, link_free: float) -> float:
+        """ Returns time when response sent now is delivered, simulating network latency, jitter and bandwidth.
+        Responses sent one after another are not delayed by latency of each other, but share bandwidth """
+        delay = self.latency
+        if self.jitter:
+            with self._lock:
+                delay += self._random.uniform(0, self.jitter)
+        due = time.monotonic() + delay
+        if self.bandwidth:
+            due = max(due, link_free) + num_bytes / self.bandwidth
+        return max(due, link_free)
+
+    # Terminal commands
+
+    def execute(self, session: _Session, line: str) -> None:
+        """ Executes terminal command and sends the response with all notifications it caused """
+        with self._lock:
+            response = self._command(session, line)
+            notifications, self._notifications = self._notifications, []
+        session.send(response)
+        for target, data in notifications:
+            target.send(data)
+
+    def confirm(self, session: _Session, line: str) -> None:
+        """ Executes confirmed command if the answer is "1" """
+        with self._lock:
+            action, session.confirm_action = session.confirm_action, None
+            response = terminal_response(line, action() if line.strip() == "1" else None)
+        session.send(response)
+
+    def _notify(self, session: _Session | None, data: bytes) -> None:
+        """ Schedules asynchronous message to the session, sent after the response to current command """
+        if session is not None:
+            self._notifications.append((session, data))
+
+    def _command(self, session: _Session, line: str) -> bytes:
+        command, _, args = line.strip().partition(" ")
+        command = command.upper()
+        args = args.strip()
+        self.command_counts[command] += 1
+        if command == "":
+            return terminal_response(line)
+        elif command == "LOAD":
+            return session.start_loading(line)
+        elif command == "STATUS":
+            return terminal_response(line, self._status())
+        elif command == "PCSTATUS":
+            return terminal_response(line, self._pc_status(self._thread_num(args)))
+        elif command == "WHERE":
+            return terminal_response(line, self._where())
+        elif command == "LIST":
+            return terminal_response(line, self._list(args))
+        elif command == "DIRECTORY/P":
+            return terminal_response(line, ["Program list:"] + (["  ".join(self.programs)] if self.programs else []))
+        elif command == "EXECUTE":
+            return terminal_response(line, self._execute(session, args))
+        elif command in ("PCEXE", "PCEXECUTE"):
+            return terminal_response(line, self._pc_execute(args))
+        elif command == "PRIME":
+            return terminal_response(line, self._prime(args))
+        elif command == "HOLD":
+            return terminal_response(line, self._hold())
+        elif command == "CONTINUE":
+            return terminal_response(line, self._continue(session))
+        elif command == "ABORT":
+            return terminal_response(line, self._abort())
+        elif command in ("PCABORT", "PCEND"):
+            return terminal_response(line, self._pc_abort(self._thread_num(args)))
+        elif command == "KILL":
+            return self._confirm(session, line, self._kill)
+        elif command == "PCKILL":
+            thread_num = self._thread_num(args)
+            return self._confirm(session, line, lambda: self._pc_kill(thread_num))
+        elif command in ("DELETE/D", "DELETE/P/D"):
+            return self._confirm(session, line, lambda: self._delete(args))
+        elif command == "ERESET":
+            self.error_now = False
+            return terminal_response(line)
+        elif command == "ZPOW":
+            self.motor_power = args.upper() == "ON"
+            return terminal_response(line)
+        elif command == "SOUT":
+            signal = int(args)
+            if signal > 0:
+                self.signals.add(signal)
+            else:
+                self.signals.discard(-signal)
+            return terminal_response(line)
+        elif command == "SWITCH":
+            return terminal_response(line, [f"{args}  {'ON' if self.switches.get(args.upper()) else 'OFF'}"])
+        elif command == "TYPE":
+            return terminal_response(line, ["Robot error"] if self.error_now else ["(P1002)Value is out of range."])
+        return terminal_response(line, ["(P0001)Unknown command."])
+
+    @staticmethod
+    def _thread_num(args: str) -> int:
+        return int(args.rstrip(":").split(":")[0] or 1)
+
+    @staticmethod
+    def _confirm(session: _Session, line: str, action) -> bytes:
+        session.mode = "confirm"
+        session.confirm_action = action
+        return line.encode() + CONFIRMATION_MSG
+
+    def _status(self) -> list[str]:
+        run = self.rcp
+        running = run is not None and run.running
+        lines = ["Robot status:  " + ("Error" if self.error_now else "Normal")]
+        if not self.motor_power:
+            lines.append("  Motor power  OFF")
+        lines.append("  TEACH mode" if self.teach_mode else
+                     "  REPEAT mode  CYCLE START " + ("ON" if running else "OFF"))
+        lines += [f"  Monitor speed(%) = {self.monitor_speed:.1f}",
+                  "  Program speed(%) ALWAYS = 100.0  100.0",
+                  "  ALWAYS Accu.[mm] = 1.0"]
+        return lines + self._run_lines(run)
+
+    def _pc_status(self, thread_num: int) -> list[str]:
+        return self._run_lines(self.pc_threads[thread_num - 1])
+
+    @staticmethod
+    def _run_lines(run: _Run | None) -> list[str]:
+        if run is None:
+            return ["  Stepper status:  Program is not running.", "  No program is running."]
+        return ["  Stepper status:  " + ("Program is running." if run.running else "Program is not running."),
+                "  Execution cycles",
+                f"   Completed cycles: {run.completed_cycles}",
+                f"   Remaining cycles: {0 if run.completed_cycles else 1}",
+                "  Program name      Priority   Step No.",
+                f"  {run.name}  0  {run.step_num}"]
+
+    def _where(self) -> list[str]:
+        return ["     JT1       JT2       JT3       JT4       JT5       JT6",
+                " ".join(f"{value:9.3f}" for value in self.joint_position),
+                "     X[mm]     Y[mm]     Z[mm]     O[deg]    A[deg]    T[deg]",
+                " ".join(f"{value:9.3f}" for value in self.cartesian_position)]
+
+    def _list(self, args: str) -> list[str]:
+        option, _, names = args.partition(" ")
+        option = option.upper()
+        body = []
+        names = [name.strip() for name in names.split(",") if name.strip()]
+        if not names and option == "/L":            # Without names all variables of the type are listed
+            names = list(self.locations) + list(self.joints)
+        elif not names and option == "/R":
+            names = list(self.reals)
+        for name in names:
+            if option == "/L" and name.startswith("#"):
+                if name not in self.joints:
+                    return ["(E0102) Variable is not defined."]
+                body += [".JOINTS", name + " " + " ".join(f"{value:.3f}" for value in self.joints[name])]
+            elif option == "/L":
+                if name not in self.locations:
+                    return ["(E0102) Variable is not defined."]
+                body += [".TRANS", name + " " + " ".join(f"{value:.3f}" for value in self.locations[name])]
+            elif option == "/R":
+                if name not in self.reals:
+                    return ["(E0102) Variable is not defined."]
+                body += [".REALS", f"{name} = {self.reals[name]:g}"]
+            elif option == "/P":
+                if name not in self.programs:
+                    return ["Program does not exist."]
+                body += [f".PROGRAM {name}()"] + self.programs[name] + [".END"]
+        return body
+
+    def _start(self, run: _Run, session: _Session | None) -> None:
+        run.running = True
+        run.owner = session
+        run.started = time.monotonic()
+        if math.isinf(run.remaining):       # Endless program
+            return
+        run.timer = threading.Timer(run.remaining, self._complete, args=(run,))
+        run.timer.daemon = True
+        run.timer.start()
+
+    def _stop(self, run: _Run) -> None:
+        if run.timer is not None:
+            run.timer.cancel()
+        run.remaining = max(0.0, run.remaining - (time.monotonic() - run.started))
+        run.running = False
+
+    def _complete(self, run: _Run) -> None:
+        with self._lock:
+            if not run.running:
+                return
+            run.running = False
+            run.remaining = 0.0
+            run.completed_cycles += 1
+        if run is self.rcp and run.owner is not None:
+            run.owner.send(b"\r\nProgram completed.No = 1\r\n")
+
+    def _new_run(self, name: str) -> _Run:
+        return _Run(name, len(self.programs[name]), self.program_durations.get(name, self.program_duration))
+
+    def _execute(self, session: _Session, name: str) -> list[str]:
+        name = name.split(",")[0].strip() or (self.rcp.name if self.rcp is not None else "")
+        if name not in self.programs:
+            return ["(P1002)Program does not exist."]
+        if self.error_now:
+            return ["(P1013)Cannot execute because in error now. Reset error."]
+        if self.teach_mode:
+            return ["(P1009)Cannot execute program in TEACH mode."]
+        if not self.motor_power:
+            return ["(P1001)Cannot execute because motor power is OFF."]
+        if self.rcp is not None and self.rcp.running:
+            return ["(P1005)Robot control program is already running."]
+        self.rcp = self._new_run(name)
+        self._start(self.rcp, session)
+        return []
+
+    def _pc_execute(self, args: str) -> list[str]:
+        thread, _, name = args.partition(":")
+        thread_num = int(thread or 1)
+        name = name.split(",")[0].strip()
+        if name not in self.programs:
+            return ["(P1002)Program does not exist."]
+        current = self.pc_threads[thread_num - 1]
+        if current is not None and current.running:
+            return ["(P1010)PC program is running."]
+        if any(run is not None and run.running and run.name == name for run in [self.rcp] + self.pc_threads):
+            return ["(P1012)program already in use."]
+        self.pc_threads[thread_num - 1] = self._new_run(name)
+        self._start(self.pc_threads[thread_num - 1], None)
+        return []
+
+    def _prime(self, name: str) -> list[str]:
+        name = name.split(",")[0].strip()
+        if name not in self.programs:
+            return ["(P1002)Program does not exist."]
+        if self.rcp is None or not self.rcp.running:
+            self.rcp = self._new_run(name)
+        return []
+
+    def _hold(self) -> list[str]:
+        run = self.rcp
+        if run is not None and run.running:
+            self._stop(run)
+            self._notify(run.owner, b"\r\nProgram held.No = 1\r\n")
+        return []
+
+    def _continue(self, session: _Session) -> list[str]:
+        if self.rcp is None or self.rcp.remaining <= 0:
+            return ["(P1003)Program is not held."]
+        if not self.rcp.running:
+            self._start(self.rcp, session)
+        return []
+
+    def _abort(self) -> list[str]:
+        run = self.rcp
+        if run is not None and run.running:
+            self._stop(run)
+            self._notify(run.owner, b"\r\nProgram aborted.No = 1\r\n")
+        return []
+
+    def _pc_abort(self, thread_num: int) -> list[str]:
+        run = self.pc_threads[thread_num - 1]
+        if run is not None and run.running:
+            self._stop(run)
+        return []
+
+    def _kill(self) -> list[str]:
+        if self.rcp is not None and self.rcp.running:
+            return ["Cannot KILL program that is running."]
+        self.rcp = None
+        return []
+
+    def _pc_kill(self, thread_num: int) -> list[str]:
+        run = self.pc_threads[thread_num - 1]
+        if run is not None and run.running:
+            return ["Cannot KILL program that is running."]
+        self.pc_threads[thread_num - 1] = None
+        return []
+
+    def _delete(self, name: str) -> list[str]:
+        if self.rcp is not None and self.rcp.name == name and self.rcp.running:
+            return ["(P1005)Robot control program is already running."]
+        if any(run is not None and run.name == name for run in self.pc_threads):
+            return ["(P1011)Use KILL or PCKILL to delete program."]
+        if self.rcp is not None and self.rcp.name == name:
+            return ["(P1011)Use KILL or PCKILL to delete program."]
+        self.programs.pop(name, None)
+        return []
+
+    # Loaded file content
+
+    def load_line(self, session: _Session, line: str) -> bytes | None:
+        """ Stores line of a loaded file. Returns syntax error message if line is rejected """
+        with self._lock:
+            stripped = line.strip()
+            section = session.load_section
+            if stripped.upper().startswith(".PROGRAM"):
+                name = stripped[len(".PROGRAM"):].strip().split("(")[0].strip()
+                if any(run is not None and run.running and run.name == name for run in [self.rcp] + self.pc_threads):
+                    session.mode = "terminal"
+                    return b"\r\n(P1012)program already in use.\r\n>"
+                session.load_section = name
+                session.load_step = 0
+                self.programs[name] = []
+                return None
+            if stripped.upper() in SECTIONS:
+                session.load_section = stripped.upper()
+                return None
+            if stripped.upper() == ".END":
+                session.load_section = None
+                return None
+            if section is None or not stripped:
+                return None
+
+            if section in SECTIONS:
+                name, *values = stripped.replace("=", " ").split()
+                if section == ".TRANS":
+                    self.locations[name] = [float(value) for value in values]
+                elif section == ".JOINTS":
+                    self.joints[name] = [float(value) for value in values]
+                elif section == ".REALS":
+                    self.reals[name] = float(values[0])
+                else:
+                    self.strings[name] = " ".join(values)
+                return None
+
+            session.load_step += 1
+            if any(error in line for error in self.syntax_errors):
+                self.programs[section].append(";" + line)      # Error line is changed to comment
+                return f"\n{session.load_step} {stripped}\r\n  ^(E0001)Syntax error.   ".encode()
+            self.programs[section].append(line)
+            return None
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Local Kawasaki controller telnet terminal emulator")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9105)
+    parser.add_argument("--latency", type=float, default=0.0, help="delay before every response, s")
+    parser.add_argument("--jitter", type=float, default=0.0, help="max random delay added to latency, s")
+    parser.add_argument("--bandwidth", type=float, default=None, help="response transfer speed, bytes/s")
+    parser.add_argument("--duration", type=float, default=0.5, help="duration of a program run, s")
+    parser.add_argument("--stream-port", type=int, default=None, help="posmon position stream port")
+    cli_args = parser.parse_args()
+
+    with KHIEmulator(cli_args.host, cli_args.port, cli_args.latency, cli_args.jitter, cli_args.bandwidth,
+                     program_duration=cli_args.duration, stream_port=cli_args.stream_port) as cli_emulator:
+        print("Emulator is listening on {}:{}".format(*cli_emulator.address))
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
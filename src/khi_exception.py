@@ -12,6 +12,7 @@ class KHISyntaxError:
         position (int): Position where the error occurred.
         code (str): Code associated with the error.
         descr (str): Description of the error.
+        program (str | None): Program containing the line, None if unknown.
     """
 
     line: int
@@ -19,17 +20,48 @@ class KHISyntaxError:
     position: int
     code: str
     descr: str
+    program: str | None
 
-    def __init__(self, descr: bytes):
+    def __init__(self, descr: bytes, program: str | None = None):
 
         error_line, error_descr = descr.decode().split("\r\n")
         self.line = int((error_line_split := error_line.split())[0])
         self.text = " ".join(error_line_split[1:])
         self.code = error_descr[(code_pos := error_descr.find("^") + 2): code_pos + 5]
         self.descr = error_descr[code_pos + 6:]
+        self.program = program
+
+    @classmethod
+    def from_fields(cls, line: int, text: str, code: str, descr: str, position: int = 0,
+                    program: str | None = None) -> "KHISyntaxError":
+        """ Creates an error found without the robot, e.g. by as_validator """
+        error = cls.__new__(cls)
+        error.line, error.text, error.position, error.code, error.descr = line, text, position, code, descr
+        error.program = program
+        return error
 
     def __str__(self):
-        return f"Error '{self.descr}' ({self.code}) at line {self.line} ({self.text})"
+        program = f" in {self.program}" if self.program is not None else ""
+        return f"Error '{self.descr}' ({self.code}){program} at line {self.line} ({self.text})"
+
+
+def _attribute_errors(errors: list[KHISyntaxError], programs: list[tuple[str, list[str]]]) -> None:
+    """ Sets program of errors by their line text. Errors come in the order of the file, so a program is searched
+    from the program of the previous error, the one with the text at the reported line number first """
+    steps = [[" ".join(step.split()).upper() for step in program_steps] for _, program_steps in programs]
+    first = 0
+    attributed = set()                      # (program index, line) of previous errors
+    for error in errors:
+        text = error.text.upper()
+        candidates = [idx for idx in range(first, len(programs)) if (idx, error.line) not in attributed]
+        found = next((idx for idx in candidates if 0 < error.line <= len(steps[idx])
+                      and steps[idx][error.line - 1] == text), None)
+        if found is None:
+            found = next((idx for idx in candidates if text in steps[idx]), None)
+        if found is not None:
+            error.program = programs[found][0]
+            attributed.add((found, error.line))
+            first = found
 
 
 class KHIConnError(ConnectionError):
@@ -42,11 +74,46 @@ class KHIProgSyntaxError(Exception):
     errors: list[KHISyntaxError]
     num_errors: int
 
-    def __init__(self, errors_string: list[bytes]):
+    def __init__(self, errors_string: list[bytes], programs: list[tuple[str, list[str]]] | None = None):
+        """
+        Args:
+            errors_string (list[bytes]): Robot responses split by syntax error messages.
+            programs (list[tuple[str, list[str]]] | None, optional): Names and lines of uploaded programs
+                to find the program of every error. Defaults to None.
+        """
         self.errors = [KHISyntaxError(error[1:-3]) for error in errors_string[:-1]]
         self.num_errors = len(self.errors)
+        if programs:
+            _attribute_errors(self.errors, programs)
+        super().__init__(self._message())
+
+    @classmethod
+    def from_errors(cls, errors: list[KHISyntaxError]) -> "KHIProgSyntaxError":
+        """ Creates the exception for errors found without the robot, see KHIProgValidationError """
+        exception = cls([])
+        exception.errors = list(errors)
+        exception.num_errors = len(exception.errors)
+        exception.args = (exception._message(),)
+        return exception
+
+    def _message(self) -> str:
         error_text = "\n".join([str(error) for error in self.errors])
-        super().__init__(f"File transmission not complete - {self.num_errors} errors found:\n" + error_text)
+        return f"File transmission not complete - {self.num_errors} errors found:\n" + error_text
+
+    def remap_lines(self, line_maps: dict[str, list[int]]) -> None:
+        """ Changes line numbers of errors to source lines of minified programs (name -> line map) """
+        for error in self.errors:
+            line_map = line_maps.get(error.program) if error.program is not None else None
+            if line_map is not None and 0 < error.line <= len(line_map):
+                error.line = line_map[error.line - 1]
+        self.args = (self._message(),)
+
+
+class KHIProgValidationError(KHIProgSyntaxError):
+    """ Raised when AS program is rejected by offline validation, before anything is sent to the robot """
+    def _message(self) -> str:
+        error_text = "\n".join([str(error) for error in self.errors])
+        return f"Program rejected locally, nothing was sent - {self.num_errors} errors found:\n" + error_text
 
 
 class KHIProgNotExistError(ValueError):
@@ -57,8 +124,12 @@ class KHIProgNotExistError(ValueError):
 
 class KHIVarNotDefinedError(ValueError):
     """ Raised when variable in program is not defined """
-    def __init__(self):
-        super().__init__(f"Variable is not defined")
+    def __init__(self, variable_name: str | None = None):
+        self.variable_name = variable_name
+        if variable_name is None:
+            super().__init__("Variable is not defined")
+        else:
+            super().__init__(f"Variable {variable_name} is not defined")
 
 
 class KHIProgRunningError(ValueError):
@@ -97,6 +168,28 @@ class KHIProgTransmissionError(Exception):
         super().__init__(description)
 
 
+class KHIBatchSizeError(KHIProgTransmissionError):
+    """ Raised when robot doesn't acknowledge program package of the given size """
+    def __init__(self, batch_size: int):
+        self.batch_size = batch_size
+        super().__init__(f"Program package of {batch_size} bytes isn't acknowledged")
+
+
+class KHISessionBusyError(RuntimeError):
+    """ Raised when a blocking command is called from the event loop thread while a task of the same loop
+    holds the session, e.g. signal_on during await execute_rcp. Waiting would block the loop forever.
+    Also raised by stop commands sharing the busy control session, when the robot refused a session of their own """
+    def __init__(self, description: str = "Session is held by a task of the running event loop, "
+                                          "await it or use another thread"):
+        super().__init__(description)
+
+
+class KHIProgTimeoutError(TimeoutError):
+    """ Raised when program doesn't stop before the deadline. Program keeps running on the controller """
+    def __init__(self, program_name: str, timeout: float):
+        super().__init__(f"Program {program_name} is still running after {timeout} s")
+
+
 class KHITeachModeError(Exception):
     """ Raised when executing motion command with teach mode set on the controller """
     def __init__(self):
@@ -1,16 +1,32 @@
 import math
 import time
 import asyncio
+import contextvars
+import threading
 
 from utils.thread_state import ThreadState
 from utils.rcp_state import RCPState
+from utils.program_result import ProgramResult
+from utils.upload_stats import UploadStats
 from src.tcp_sock_client import TCPSockClient
-# from src.AsyncTCPSockClient import TCPSockClient
+from src.khi_tracing import traced
+from src.status_cache import invalidates_status, invalidates_programs_status
+from src.upload_cache import program_lines
+from src.command_scheduler import checkpoint
 from src.khi_exception import *
 
 # One package size in bytes for splitting large programs. Slightly faster at higher values
 # It's 2962 bytes in KIDE and robot is responding for up to 3064 bytes
 UPLOAD_BATCH_SIZE = 1000
+# Package sizes probed from the largest one on the first upload to a controller
+UPLOAD_BATCH_SIZES = (3064, 2962, 2048, UPLOAD_BATCH_SIZE)
+
+_upload_batch_sizes: dict[tuple[str, int], int] = {}   # Largest accepted package size per controller address
+
+
+PROBE_TIMEOUT = 0.5                                 # Time limit of a liveness probe, seconds
+
+WAIT_STOP_INTERVAL = 0.2                            # How often a stoppable wait for program end checks its stop event
 
 
 NEWLINE_MSG = b"\x0d\x0a\x3e"                      # "\r\n>" - Message when clearing terminal
@@ -52,6 +68,7 @@ NO_WORK_DETECTED_ERROR = b'(E6509) No work detected.'                    # No wo
 
 
 
+@traced
 def telnet_connect(client: TCPSockClient) -> None:
     try:
         client.wait_recv(b"login")              # Send 'as' as login for kawasaki telnet terminal
@@ -72,14 +89,13 @@ def wait_for_data(client: TCPSockClient, timeout: float = 1.0) -> bytes | None:
     Returns:
         bytes | None: The received data if available, or None if no data is received within the timeout.
     """
-    start_time = time.time()
-    while time.time() - start_time < timeout:
-        if client.is_data_available():
-            return client.wait_recv()  # Return data as soon as it's available
-        time.sleep(0.1)  # Wait briefly before checking again
-    return None
+    try:
+        return client.wait_recv(timeout=timeout)  # Return data as soon as it's available
+    except TimeoutError:
+        return None
 
 
+@traced
 def handshake(client: TCPSockClient) -> None:
     """ Performs a handshake with the robot and raises an exception if something fails """
     client.send_msg("")                         # Send empty command
@@ -87,11 +103,15 @@ def handshake(client: TCPSockClient) -> None:
         raise KHIConnError()
 
 
+@traced
+@invalidates_status
 def ereset(client: TCPSockClient) -> None:
     client.send_msg("ERESET")
     client.wait_recv(NEWLINE_MSG)
 
 
+@traced
+@invalidates_status
 def motor_on(client: TCPSockClient) -> None:
     client.send_msg("ZPOW ON")
     client.wait_recv(NEWLINE_MSG)
@@ -101,12 +121,14 @@ def disconnect(client: TCPSockClient) -> None:
     client.disconnect()
 
 
+@traced
 def get_sys_switch(client: TCPSockClient, switch_name: str) -> bool:
     """ Sets robot system switch state """
     client.send_msg("SWITCH " + switch_name)
     return client.wait_recv(NEWLINE_MSG).split()[-2].decode() == "ON"
 
 
+@traced
 def set_sys_switch(client: TCPSockClient, switch_name: str, value: bool) -> None:
     """ Sets robot system switch. Note that switch might be read-only,
         in that case switch value won't be changed """
@@ -114,6 +136,7 @@ def set_sys_switch(client: TCPSockClient, switch_name: str, value: bool) -> None
     client.wait_recv(NEWLINE_MSG)
 
 
+@traced
 def get_error_descr(client: TCPSockClient) -> str:
     """ Returns robot error state description, empty string if no error """
     client.send_msg("type $ERROR(ERROR)")
@@ -123,13 +146,44 @@ def get_error_descr(client: TCPSockClient) -> str:
     return ""
 
 
+def unpack_threads(threads: int) -> list[int]:
+    """ Returns numbers of pc threads packed into 5-bit integer. Reverse of pack_threads """
+    return [thread_num + 1 for thread_num in range(5) if threads & (1 << thread_num)]
+
+
+def execute_pipelined(client: TCPSockClient, commands: list[str], confirm: bool = False) -> list[bytes]:
+    """ Sends several terminal commands in one package and splits the responses by terminal prompts.
+    Takes one round trip instead of one per command.
+    Args:
+        client(TCPSockClient): Object representing open client socket
+        commands (list[str]): Terminal commands, each of them is expected to end with a new prompt.
+        confirm (bool, optional): Every command asks for confirmation and is answered with "1". Defaults to False.
+    Returns:
+        list[bytes]: Responses in the order of commands.
+    """
+    if not commands:
+        return []
+    answer = "\n1" if confirm else ""
+    client.send_bytes("".join(command + answer + "\n" for command in commands).encode())
+
+    responses = []
+    for _ in commands:
+        res = client.wait_recv(CONFIRMATION_REQUEST) if confirm else b""
+        responses.append(res + client.wait_recv(NEWLINE_MSG))
+    return responses
+
+
+def _step_num(row: str) -> int:
+    """ Step number from the program row of a status response: name, priority and step number """
+    step = row.split()[2]
+    return int(step) if step.isdigit() else -1
+
+
 def parse_program_thread(robot_msg: str, thread_num: int) -> ThreadState:
-    res = ThreadState()
+    res = ThreadState(thread_num, running=True)
     lines = robot_msg.split("\r\n")[1:-1]
-    res.thread_num = thread_num
-    res.running = True
     res.name = lines[-1].split()[0]
-    res.step_num = lines[-1].split()[2]
+    res.step_num = _step_num(lines[-1])
     for line in lines:
         if "Program is not running." in line:
             res.running = False
@@ -145,14 +199,11 @@ def parse_program_thread(robot_msg: str, thread_num: int) -> ThreadState:
     return res
 
 
-def parse_program_rcp(robot_msg: str) -> ThreadState:
-    res = RCPState()
+def parse_program_rcp(robot_msg: str) -> RCPState:
+    res = RCPState(0)
     lines = robot_msg.split("\r\n")[1:-1]
-    res.thread_num = 0
-    res.running = False
     res.name = lines[-1].split()[0]
-    res.step_num = lines[-1].split()[2]
-
+    res.step_num = _step_num(lines[-1])
     for line in lines:
         if "Motor power " in line:
             # because if motor is ON - STATUS message isn't consist this state - default True
@@ -182,6 +233,7 @@ def parse_program_rcp(robot_msg: str) -> ThreadState:
     return res
 
 
+@traced
 def get_pc_status(client: TCPSockClient, threads: int) -> [ThreadState]:
     """ Checks the status of a list of PC programs based on a packed integer representing threads to check.
 
@@ -200,18 +252,18 @@ def get_pc_status(client: TCPSockClient, threads: int) -> [ThreadState]:
         with help of utility function "pack_threads(*args)" provided in this module
     """
     pc_thread_states = [ThreadState() for _ in range(5)]
-    for thread_num in range(5):
-        if threads & (1 << thread_num):  # Unpack threads from 5-bit integer representation
-            client.send_msg(f"PCSTATUS {thread_num + 1}:")
-            response = client.wait_recv(NEWLINE_MSG).decode()
-            pc_thread_states[thread_num] = parse_program_thread(response, thread_num=thread_num+1)
+    thread_nums = unpack_threads(threads)    # Unpack threads from 5-bit integer representation
+    responses = execute_pipelined(client, [f"PCSTATUS {thread_num}:" for thread_num in thread_nums])
+    for thread_num, response in zip(thread_nums, responses):
+        pc_thread_states[thread_num - 1] = parse_program_thread(response.decode(), thread_num=thread_num)
     return pc_thread_states
 
 
-def get_rcp_status(client: TCPSockClient) -> ThreadState:
+@traced
+def get_rcp_status(client: TCPSockClient) -> RCPState:
     """ Checks the status of current active RCP program.
     Returns:
-        ThreadState: data object, representing the status of an active RCP program."""
+        RCPState: data object, representing the status of an active RCP program."""
     client.send_msg("STATUS")
     return parse_program_rcp(client.wait_recv(NEWLINE_MSG).decode())
 
@@ -223,11 +275,15 @@ def init_loading(client: TCPSockClient) -> None:
         raise KHIProgTransmissionError("SAVE/LOAD in progress")  # TODO: Try to reset error
 
 
-def process_response(client: TCPSockClient) -> bytes:
+def process_response(client: TCPSockClient, answer_errors: bool = True) -> bytes:
+    """ Waits for acknowledgement of a package. Syntax errors are answered with "0" unless answer_errors is False,
+    then the first error is returned unanswered """
     errors = b""
     res = client.wait_recv(SYNTAX_ERROR, PROGRAM_IN_USE, PKG_RECV, NAME_CONFIRMATION, CONFIRM_TRANSMISSION)
     if NAME_CONFIRMATION in res:
         res = client.wait_recv(PKG_RECV, SYNTAX_ERROR, PROGRAM_IN_USE, CONFIRM_TRANSMISSION)
+    if SYNTAX_ERROR in res and not answer_errors:
+        return res
 
     while SYNTAX_ERROR in res:
         errors += res
@@ -240,32 +296,157 @@ def process_response(client: TCPSockClient) -> bytes:
     return errors
 
 
-def upload_program(client: TCPSockClient, program_bytes: bytes) -> None:
+def _abort_loading(client: TCPSockClient, in_flight: int) -> None:
+    """ Ends loading session broken by a syntax error while next packages were in flight.
+    Answers the error and every following one with "0", drains acknowledgements of the packages in flight,
+    cancels loading and brings the terminal back to the prompt """
+    client.send_msg("0")
+    try:
+        while in_flight > 0:
+            res = client.wait_recv(PKG_RECV, SYNTAX_ERROR, CONFIRM_TRANSMISSION, timeout=PROBE_TIMEOUT)
+            if SYNTAX_ERROR in res:
+                client.send_msg("0")
+            elif CONFIRM_TRANSMISSION in res:
+                break
+            else:
+                in_flight -= 1
+    except TimeoutError:            # Package cut by the answer is never acknowledged
+        pass
+
+    client.send_bytes(START_UPLOAD_SEQ + CANCEL_LOADING + END_UPLOAD_SEQ)
+    try:
+        while SYNTAX_ERROR in client.wait_recv(SYNTAX_ERROR, CONFIRM_TRANSMISSION, timeout=PROBE_TIMEOUT):
+            client.send_msg("0")
+    except TimeoutError:
+        try:
+            reset_save_load(client)
+        except TimeoutError:
+            pass
+    client.flush_input_buffer()
+    handshake(client)
+
+
+def get_upload_batch_size(client: TCPSockClient) -> int | None:
+    """ Returns package size found for the controller by previous uploads or None if it wasn't probed yet """
+    return _upload_batch_sizes.get(client.address)
+
+
+def set_upload_batch_size(client: TCPSockClient, batch_size: int | None) -> None:
+    """ Sets package size used for uploads to the controller. None forgets it, so it will be probed again """
+    if batch_size is None:
+        _upload_batch_sizes.pop(client.address, None)
+    else:
+        _upload_batch_sizes[client.address] = batch_size
+
+
+def _upload_batches(client: TCPSockClient, program_bytes: bytes, batch_size: int, window: int,
+                    probe: bool) -> UploadStats:
+    """ Sends program in packages of batch_size bytes keeping up to window packages not acknowledged """
+    start_time = time.monotonic()
+    num_packages = math.ceil(len(program_bytes) / batch_size)
+    file_packages = [START_UPLOAD_SEQ + program_bytes[idx * batch_size: (idx + 1) * batch_size] + END_UPLOAD_SEQ
+                     for idx in range(num_packages)]
+
+    checkpoint()                    # Terminal takes no commands until the transaction ends
+    init_loading(client)
+
+    errors = b""
+    sent = acked = 0
+    while acked < num_packages:
+        while sent < num_packages and sent - acked < window:
+            client.send_bytes(file_packages[sent])
+            sent += 1
+        try:
+            package_errors = process_response(client, answer_errors=sent - acked == 1)
+        except TimeoutError:
+            if probe and acked == 0 and num_packages > 1:   # First full package isn't acknowledged
+                raise KHIBatchSizeError(batch_size)
+            raise
+        if package_errors and sent - acked > 1:     # Packages in flight were taken as the answer to the error
+            _abort_loading(client, sent - acked - 1)
+            return _upload_batches(client, program_bytes, batch_size, 1, probe)
+        errors += package_errors
+        acked += 1
+
+    client.send_bytes(START_UPLOAD_SEQ + CANCEL_LOADING + END_UPLOAD_SEQ)
+    errors += process_response(client)
+
+    if errors:
+        raise KHIProgSyntaxError(errors.split(SYNTAX_ERROR), program_lines(program_bytes))
+    return UploadStats(len(program_bytes), num_packages, batch_size, window, time.monotonic() - start_time)
+
+
+@traced
+@invalidates_programs_status
+def upload_program(client: TCPSockClient, program_bytes: bytes, batch_size: int | None = None,
+                   window: int = 1) -> UploadStats:
     """ Uploads a program to the robot.
+    On the first upload to a controller the package size is probed starting from the largest of UPLOAD_BATCH_SIZES,
+    the largest accepted size is remembered for next uploads.
     Args:
         client(TCPSockClient): Object representing open client socket
         program_bytes (bytes): Binary representation of program to upload.
+        batch_size (int | None, optional): Package size in bytes. Defaults to None - remembered or probed size.
+        window (int, optional): Number of packages sent before waiting for the acknowledgement of the first one.
+            Robot answers syntax errors interactively, so on a syntax error with packages in flight the loading
+            is cancelled and the program is uploaded again with window=1 to report the errors.
+            Defaults to 1.
     Raises:
         KawaProgSyntaxError: If there are syntax errors in the uploaded program.
         KawaProgRunningError: If program you're trying to upload is in use and not killed
     Returns:
-        None
+        UploadStats: Sizes and achieved throughput of the upload.
     """
-    num_packages = math.ceil(len(program_bytes) / UPLOAD_BATCH_SIZE)
-    file_packages = [program_bytes[idx * UPLOAD_BATCH_SIZE: (idx + 1) * UPLOAD_BATCH_SIZE]
-                     for idx in range(num_packages)] + [CANCEL_LOADING]
-
-    init_loading(client)
-
-    errors = b""
-    for byte_package in file_packages:
-        client.send_bytes(START_UPLOAD_SEQ + byte_package + END_UPLOAD_SEQ)
-        errors += process_response(client)
-
-    if errors:
-        raise KHIProgSyntaxError(errors.split(SYNTAX_ERROR))
+    if batch_size is not None:
+        return _upload_batches(client, program_bytes, batch_size, window, probe=False)
+
+    batch_size = get_upload_batch_size(client)
+    if batch_size is not None:
+        return _upload_batches(client, program_bytes, batch_size, window, probe=False)
+
+    for batch_size in UPLOAD_BATCH_SIZES:
+        try:
+            stats = _upload_batches(client, program_bytes, batch_size, window, probe=True)
+        except KHIBatchSizeError:
+            try:
+                reset_save_load(client)         # Close loading session before trying smaller packages
+            except TimeoutError:
+                pass
+            client.flush_input_buffer()
+            continue
+        if stats.num_packages > 1:       # At least one package of full size is accepted
+            set_upload_batch_size(client, batch_size)
+        return stats
+    raise KHIProgTransmissionError("Robot doesn't acknowledge program packages")
+
+
+def format_programs(programs: dict[str, str]) -> bytes:
+    """ Returns AS file with the programs (name -> text) ready for upload """
+    return "".join(f".PROGRAM {name}\n{text}\n.END\n" for name, text in programs.items()).encode()
+
+
+@traced
+def upload_programs(client: TCPSockClient, programs: dict[str, str], data_sections: bytes = b"",
+                    batch_size: int | None = None, window: int = 1) -> UploadStats:
+    """ Uploads many programs and data sections in one LOAD transaction instead of a loading session per program.
+    Args:
+        client(TCPSockClient): Object representing open client socket
+        programs (dict[str, str]): Program texts by program names.
+        data_sections (bytes, optional): .TRANS, .JOINTS and .REALS sections loaded after the programs,
+            see bulk_variables.format_variables. Defaults to b"".
+        batch_size (int | None, optional): See upload_program.
+        window (int, optional): See upload_program.
+    Raises:
+        KHIProgSyntaxError: If there are syntax errors, program of every error is in its program attribute.
+            Programs are loaded anyway, error lines are changed to comments.
+    Returns:
+        UploadStats: Sizes and achieved throughput of the upload.
+    """
+    return upload_program(client, format_programs(programs) + data_sections, batch_size, window)
 
 
+@traced
+@invalidates_status
 def delete_program(client: TCPSockClient, program_name: str) -> None:
     client.send_msg("DELETE/P/D " + program_name)
     client.wait_recv(CONFIRMATION_REQUEST)
@@ -277,6 +458,8 @@ def delete_program(client: TCPSockClient, program_name: str) -> None:
         raise KHIProgLoadedError(program_name)
 
 
+@traced
+@invalidates_status
 def pc_execute(client: TCPSockClient, program_name: str, thread_num: int) -> None:
     """ Executes PC program on selected thread
     Args:
@@ -298,37 +481,36 @@ def pc_execute(client: TCPSockClient, program_name: str, thread_num: int) -> Non
         raise KHIThreadBusyError(thread_num)
 
 
+@traced
+@invalidates_status
 def pc_abort(client: TCPSockClient, threads: int) -> None:
     """ Aborts running PC programs on selected threads.
     Args: threads (int): An integer representing the threads to be checked for status.
                          See "status_pc" for more info
     """
-    for thread_num in range(5):
-        if threads & (1 << thread_num):
-            client.send_msg(f"PCABORT {thread_num + 1}:")
-            client.wait_recv(NEWLINE_MSG)
+    execute_pipelined(client, [f"PCABORT {thread_num}:" for thread_num in unpack_threads(threads)])
 
 
+@traced
+@invalidates_status
 def pc_end(client: TCPSockClient, threads: int) -> None:
     """ Softly ends selected program(s) waiting for the current cycle to be completed """
-    for thread_num in range(5):
-        if threads & (1 << thread_num):
-            client.send_msg(f"PCEND {thread_num + 1}:")
-            client.wait_recv(NEWLINE_MSG)
+    execute_pipelined(client, [f"PCEND {thread_num}:" for thread_num in unpack_threads(threads)])
 
 
+@traced
+@invalidates_status
 def pc_kill(client: TCPSockClient, threads: int) -> None:
     """ Unloads aborted programs from selected pc threads """
-    for thread_num in range(5):
-        if threads & (1 << thread_num):
-            client.send_msg(f"PCKILL {thread_num + 1}:")
-            client.wait_recv(CONFIRMATION_REQUEST)
-            client.send_msg("1\n")
-            res = client.wait_recv(NEWLINE_MSG)
-            if PROG_IS_ACTIVE in res:
-                raise KHIProgActiveError(thread_num + 1)
+    thread_nums = unpack_threads(threads)
+    responses = execute_pipelined(client, [f"PCKILL {thread_num}:" for thread_num in thread_nums], confirm=True)
+    for thread_num, res in zip(thread_nums, responses):
+        if PROG_IS_ACTIVE in res:
+            raise KHIProgActiveError(thread_num)
 
 
+@traced
+@invalidates_status
 def rcp_prepare(client: TCPSockClient, program_name: str):
     """ Prepare RCP program for execution (open on Teach pendant) """
     client.send_msg("PRIME " + program_name)
@@ -338,14 +520,9 @@ def rcp_prepare(client: TCPSockClient, program_name: str):
         raise KHIProgNotExistError(program_name)
 
 
-async def rcp_execute(client: TCPSockClient, program_name: str, blocking=True):
-    """ Executes RCP program of set name """
-    client.send_msg("EXECUTE " + program_name)
-    res = client.wait_recv(NEWLINE_MSG)
-
-    if PROG_NOT_EXIST in res:
-        raise KHIProgNotExistError(program_name)
-    elif TEACH_MODE_ON in res:
+def check_start_response(res: bytes) -> None:
+    """ Raises an exception if EXECUTE or CONTINUE command was rejected by the robot """
+    if TEACH_MODE_ON in res:
         raise KHITeachModeError
     elif TEACH_LOCK_ON in res:
         raise KHITeachLockError
@@ -356,43 +533,114 @@ async def rcp_execute(client: TCPSockClient, program_name: str, blocking=True):
     elif ERROR_NOW in res:
         raise KHIEResetError
 
-    if blocking:
-        for i in range(1000):
-            await asyncio.sleep(0.5)
-
-            if client.is_data_available():
-                res = client.wait_recv(PROGRAM_STOPPED)
-                if VARIABLE_NOT_DEFINED in res:
-                    client.reset_timeout()
-                    raise KHIVarNotDefinedError
-                elif WELDER_ERROR_1 in res:
-                    client.reset_timeout()
-                    raise KHIWelder1Error
-                elif WELDER_ERROR_2 in res:
-                    client.reset_timeout()
-                    raise KHIWelder2Error
-                elif NO_WORK_DETECTED_ERROR in res:
-                    client.reset_timeout()
+
+def check_stop_response(res: bytes) -> None:
+    """ Raises an exception if RCP program was stopped because of an error """
+    if VARIABLE_NOT_DEFINED in res:
+        raise KHIVarNotDefinedError
+    elif WELDER_ERROR_1 in res:
+        raise KHIWelder1Error
+    elif WELDER_ERROR_2 in res:
+        raise KHIWelder2Error
+    elif NO_WORK_DETECTED_ERROR in res:
+        raise KHINoWorkDetectedError
+
+
+@traced
+@invalidates_status
+def wait_program_end(client: TCPSockClient, program_name: str, timeout: float | None = None,
+                     check_held_error: bool = True, stop: threading.Event | None = None) -> ProgramResult | None:
+    """ Blocks until the robot reports that the RCP program stopped.
+    Wakes up as soon as the message arrives instead of polling the socket.
+    Args:
+        client(TCPSockClient): Object representing open client socket
+        program_name (str): Name of a running program, used in result and errors
+        timeout (float | None, optional): Overall deadline in seconds. Defaults to None - wait forever.
+        check_held_error (bool, optional): Look for an error reported right after the program was held.
+        stop (threading.Event | None, optional): Stops waiting when set, checked every WAIT_STOP_INTERVAL.
+    Raises:
+        KHIProgTimeoutError: If program is still running after timeout.
+        KHIProgramHeldError: If program was held.
+    Returns:
+        ProgramResult | None: Result of the program run, None if stopped before the program ended.
+    """
+    start_time = time.monotonic()
+    deadline = None if timeout is None else start_time + timeout
+    while True:
+        remaining = math.inf if deadline is None else deadline - time.monotonic()
+        try:
+            if remaining <= 0:
+                raise TimeoutError
+            res = client.wait_recv(PROGRAM_STOPPED, timeout=remaining if stop is None else
+                                   min(remaining, WAIT_STOP_INTERVAL))
+        except TimeoutError:
+            if stop is None or deadline is not None and time.monotonic() >= deadline:
+                raise KHIProgTimeoutError(program_name, timeout)
+            if stop.is_set():
+                return None
+            continue
+
+        check_stop_response(res)
+        if PROGRAM_HELD in res:
+            if check_held_error:
+                any_result = wait_for_data(client, timeout=2.0)
+                if any_result and NO_WORK_DETECTED_ERROR in any_result:
                     raise KHINoWorkDetectedError
-                elif PROGRAM_HELD in res:
-                    any_result = wait_for_data(client, timeout=2.0)
-                    if any_result:
-                        if NO_WORK_DETECTED_ERROR in any_result:
-                            client.reset_timeout()
-                            raise KHINoWorkDetectedError
-                        else:
-                            print("Valid response received, processing...")
+            raise KHIProgramHeldError(' '.join(res.decode('utf-8').split()))
 
-                    client.reset_timeout()
-                    raise KHIProgramHeldError(' '.join(res.decode('utf-8').split()))
+        if PROGRAM_COMPLETED in res:
+            return ProgramResult(program_name, completed=True, elapsed=time.monotonic() - start_time,
+                                 message=' '.join(res.decode('utf-8').split()))
 
-                client.reset_timeout()
-                if PROGRAM_COMPLETED in res:
-                    return
+        return ProgramResult(program_name, completed=False, elapsed=time.monotonic() - start_time,
+                             message=' '.join(res.decode('utf-8').split()))
 
-                print("Unknown header:", res)
 
+async def await_program_end(client: TCPSockClient, program_name: str, timeout: float | None = None,
+                            check_held_error: bool = True) -> ProgramResult | None:
+    """ Waits for wait_program_end in a worker thread, so the event loop isn't blocked.
+    If the awaiting task is cancelled, the worker is stopped and the client is released only after it exits """
+    stop = threading.Event()
+    waiter = asyncio.get_running_loop().run_in_executor(
+        None, contextvars.copy_context().run, wait_program_end, client, program_name, timeout, check_held_error, stop)
+    try:
+        return await asyncio.shield(waiter)
+    except asyncio.CancelledError:
+        stop.set()
+        try:
+            await waiter
+        except Exception:
+            pass
+        raise
+
+
+@traced
+@invalidates_status
+async def rcp_execute(client: TCPSockClient, program_name: str, blocking=True,
+                      timeout: float | None = None) -> ProgramResult | None:
+    """ Executes RCP program of set name
+    Args:
+        client(TCPSockClient): Object representing open client socket
+        program_name (str): Name of a program to execute
+        blocking (bool, optional): Wait for program completion. Waiting is done in a worker thread,
+            so the event loop isn't blocked.
+        timeout (float | None, optional): Deadline for program completion in seconds. Defaults to None - no limit.
+    Returns:
+        ProgramResult | None: Result of the program run if blocking.
+    """
+    client.send_msg("EXECUTE " + program_name)
+    res = client.wait_recv(NEWLINE_MSG)
+
+    if PROG_NOT_EXIST in res:
+        raise KHIProgNotExistError(program_name)
+    check_start_response(res)
+
+    if blocking:
+        return await await_program_end(client, program_name, timeout, True)
 
+
+@traced
+@invalidates_status
 def rcp_prime(client: TCPSockClient, program_name: str, blocking=True):
     client.send_msg("PRIME " + program_name)
     res = client.wait_recv(NEWLINE_MSG)
@@ -401,68 +649,37 @@ def rcp_prime(client: TCPSockClient, program_name: str, blocking=True):
         raise KHIProgNotExistError(program_name)
 
 
+@traced
+@invalidates_status
 def rcp_abort(client: TCPSockClient) -> None:
     """ Aborts current RCP program """
     client.send_msg("ABORT")
     client.wait_recv(NEWLINE_MSG)
 
 
+@traced
+@invalidates_status
 def rcp_hold(client: TCPSockClient) -> None:
     """ Holds current RCP program """
     client.send_msg("HOLD")
     client.wait_recv(NEWLINE_MSG)
 
 
-# def rcp_continue(client: TCPSockClient) -> None:
-#     """ Continue current RCP program """
-#     client.send_msg("CONTINUE")
-#     client.wait_recv(NEWLINE_MSG)
-
-async def rcp_continue(client: TCPSockClient, blocking=True):
-    """ Continue current RCP program """
+@traced
+@invalidates_status
+async def rcp_continue(client: TCPSockClient, blocking=True,
+                       timeout: float | None = None) -> ProgramResult | None:
+    """ Continue current RCP program. See rcp_execute for arguments """
     client.send_msg("CONTINUE")
     res = client.wait_recv(NEWLINE_MSG)
-
-    if TEACH_MODE_ON in res:
-        raise KHITeachModeError
-    elif TEACH_LOCK_ON in res:
-        raise KHITeachLockError
-    elif MOTORS_DISABLED in res:
-        raise KHIMotorsOffError
-    elif VARIABLE_NOT_DEFINED in res:
-        raise KHIVarNotDefinedError
-    elif ERROR_NOW in res:
-        raise KHIEResetError
+    check_start_response(res)
 
     if blocking:
-        for i in range(1000):
-            await asyncio.sleep(0.5)
-
-            if client.is_data_available():
-                res = client.wait_recv(PROGRAM_STOPPED)
-                if VARIABLE_NOT_DEFINED in res:
-                    client.reset_timeout()
-                    raise KHIVarNotDefinedError
-                elif WELDER_ERROR_1 in res:
-                    client.reset_timeout()
-                    raise KHIWelder1Error
-                elif WELDER_ERROR_2 in res:
-                    client.reset_timeout()
-                    raise KHIWelder2Error
-                elif NO_WORK_DETECTED_ERROR in res:
-                    client.reset_timeout()
-                    raise KHINoWorkDetectedError
-                elif PROGRAM_HELD in res:
-                    client.reset_timeout()
-                    raise KHIProgramHeldError(' '.join(res.decode('utf-8').split()))
-
-                client.reset_timeout()
-                if PROGRAM_COMPLETED in res:
-                    return
-
-                print("Unknown header:", res)
+        return await await_program_end(client, "", timeout, False)
 
 
+@traced
+@invalidates_status
 def kill_rcp(client: TCPSockClient) -> None:
     """ Kills current RCP program """
     client.send_msg("KILL")
@@ -471,6 +688,7 @@ def kill_rcp(client: TCPSockClient) -> None:
     client.wait_recv(NEWLINE_MSG)
 
 
+@traced
 def read_variable_real(client: TCPSockClient, variable_name: str) -> float:
     handshake(client)
     client.send_msg(f"list /r {variable_name}")
@@ -479,6 +697,7 @@ def read_variable_real(client: TCPSockClient, variable_name: str) -> float:
     return real_variable
 
 
+@traced
 def read_variable_position(client: TCPSockClient, variable_name: str) -> list:
     handshake(client)
     client.send_msg(f"list /l {variable_name}")
@@ -490,6 +709,7 @@ def read_variable_position(client: TCPSockClient, variable_name: str) -> list:
     return result_list
 
 
+@traced
 def read_programs_list(client: TCPSockClient) -> [str]:
     # DEV check this function for long size pg lists
     handshake(client)
@@ -503,10 +723,50 @@ def read_programs_list(client: TCPSockClient) -> [str]:
         return []
 
 
+@traced
+def read_programs_directory(client: TCPSockClient) -> dict[str, int | None]:
+    """ Reads names of programs stored on the robot with their sizes if the controller lists them.
+    Returns:
+        dict[str, int | None]: Program sizes by names, None if size isn't listed.
+    """
+    handshake(client)
+    client.send_msg("DIRECTORY/P")
+    lines = client.wait_recv(NEWLINE_MSG).decode().split("\r\n")[1:-1]
+    programs = {}
+    name = None
+    for word in (word for line in lines if not line.rstrip().endswith(":") for word in line.split()):
+        if word.isdigit() and name is not None:
+            programs[name] = int(word)
+        else:
+            name = word
+            programs[name] = None
+    return programs
+
+
+def parse_program_listing(robot_msg: str) -> str:
+    """ Returns program body from the LIST /P response without .PROGRAM / .END lines """
+    lines = robot_msg.split("\r\n")[1:-1]
+    return "\n".join(line for line in lines if not line.lstrip().startswith((".PROGRAM", ".END")))
+
+
+@traced
+def read_program(client: TCPSockClient, program_name: str) -> str:
+    """ Reads text of the program stored on the robot """
+    handshake(client)
+    client.send_msg(f"LIST /P {program_name}")
+    res = client.wait_recv(NEWLINE_MSG)
+
+    if PROG_NOT_EXIST in res:
+        raise KHIProgNotExistError(program_name)
+    return parse_program_listing(res.decode())
+
+
+@traced
+@invalidates_status
 def pg_delete(client: TCPSockClient, program_name):
     client.send_msg(f"DELETE/D {program_name}")
     client.wait_recv(CONFIRMATION_REQUEST)
-    client.send_msg("1\n")
+    client.send_msg("1")
     res = client.wait_recv(NEWLINE_MSG)
 
     if RCP_IS_RUNNING in res:
@@ -515,8 +775,9 @@ def pg_delete(client: TCPSockClient, program_name):
         raise KHIProgLoadedError(program_name)
 
 
+@traced
 def reset_save_load(client: TCPSockClient):
-    client.send_bytes(b"\x02\x43\x20\x20\x20\x20\x30" + "END.".encode() + b"\x17")
+    client.send_bytes(START_UPLOAD_SEQ + "END.".encode() + END_UPLOAD_SEQ)
     client.send_bytes(CANCEL_LOADING)
     client.wait_recv(CONFIRM_TRANSMISSION)
 
@@ -525,10 +786,12 @@ def pack_threads(*threads):
     return sum(1 << (thread_num - 1) for thread_num in threads)
 
 
+@traced
 def signal_out(client: TCPSockClient, signal):
     client.send_msg(f"SOUT {signal}")
 
 
+@traced
 def get_where(client: TCPSockClient):
     client.flush_input_buffer()
     client.send_msg(f"WHERE")
@@ -541,8 +804,18 @@ def get_where(client: TCPSockClient):
     return result_list
 
 
-def check_connection(client: TCPSockClient):
-    return client.is_connected()
+def check_connection(client: TCPSockClient, timeout: float = PROBE_TIMEOUT) -> bool:
+    """ Checks that the robot answers an empty command with a prompt. Socket state alone doesn't show
+    a half-open connection, e.g. after a controller reboot """
+    if not client.is_connected():
+        return False
+    try:
+        client.send_msg("")
+        client.wait_recv(NEWLINE_MSG, timeout=timeout)
+        return True
+    except OSError:
+        client.connected = False
+        return False
 
 
 if __name__ == "__main__":
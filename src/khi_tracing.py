@@ -0,0 +1,208 @@
+"""
+A module with tracing hooks of khirolib. Every logical operation (upload_program, rcp_execute, get_pc_status...)
+is a span, every command sent to the robot during the operation is its child span with the number of bytes
+sent and received, time to first byte, time to terminator and time spent after the terminator (parsing).
+
+Tracing is disabled until a tracer is set with set_tracer(). Disabled hooks cost a single global check.
+"""
+
+import collections
+import contextvars
+import functools
+import inspect
+import time
+
+_tracer: "Tracer | None" = None
+_current_span: contextvars.ContextVar = contextvars.ContextVar("khi_current_span", default=None)
+
+COMMAND_NAME_LEN = 32                   # Max length of a command span name
+
+
+class Span:
+    """ Timing of an operation or a single wire command, times are perf_counter() values in seconds """
+    name: str = ""
+    parent: "Span | None" = None
+    children: list = None
+    start: float = 0.0
+    end: float | None = None
+    first_byte: float | None = None     # Arrival of the first response byte
+    terminator: float | None = None     # Arrival of the response terminator
+    bytes_sent: int = 0
+    bytes_received: int = 0
+    error: str | None = None            # Exception raised by the operation
+
+    def __init__(self, name: str, parent: "Span | None" = None):
+        self.name = name
+        self.parent = parent
+        self.children = []
+        self.start = time.perf_counter()
+        self._command: Span | None = None   # Wire command in progress
+
+        if parent is not None:
+            parent.children.append(self)
+
+    @property
+    def duration(self) -> float:
+        return (time.perf_counter() if self.end is None else self.end) - self.start
+
+    @property
+    def ttfb(self) -> float | None:
+        """ Time from the start to the first received byte """
+        return None if self.first_byte is None else self.first_byte - self.start
+
+    @property
+    def time_to_terminator(self) -> float | None:
+        """ Time from the start to the last received terminator """
+        return None if self.terminator is None else self.terminator - self.start
+
+    @property
+    def parse_time(self) -> float:
+        """ Time spent after the robot response was received - parsing for commands, sum of children for operations """
+        if self.children:
+            return sum(child.parse_time for child in self.children)
+        if self.terminator is None or self.end is None or self.parent is None:
+            return 0.0
+        return self.end - self.terminator
+
+    def __str__(self):
+        text = f"{self.name}: {self.duration * 1e3:.3f} ms, sent {self.bytes_sent} B, received {self.bytes_received} B"
+        if self.ttfb is not None:
+            text += f", ttfb {self.ttfb * 1e3:.3f} ms, terminator {self.time_to_terminator * 1e3:.3f} ms"
+        text += f", parse {self.parse_time * 1e3:.3f} ms"
+        if self.error is not None:
+            text += f", error {self.error}"
+        return text + "".join("\n  " + str(child).replace("\n", "\n  ") for child in self.children)
+
+
+class Tracer:
+    """ Base class of tracers, receives every started and finished span """
+    def on_start(self, span: Span) -> None:
+        pass
+
+    def on_end(self, span: Span) -> None:
+        pass
+
+
+class SpanRecorder(Tracer):
+    """ Tracer keeping the latest finished operations """
+    def __init__(self, max_spans: int = 1000):
+        self.spans: collections.deque[Span] = collections.deque(maxlen=max_spans)
+
+    def on_end(self, span: Span) -> None:
+        if span.parent is None:
+            self.spans.append(span)
+
+
+def set_tracer(tracer: Tracer | None) -> None:
+    """ Enables tracing with the tracer, None disables tracing """
+    global _tracer
+    _tracer = tracer
+
+
+def get_tracer() -> Tracer | None:
+    return _tracer
+
+
+def _start_span(name: str) -> Span:
+    parent = _current_span.get()
+    if parent is not None:
+        _finish_command(parent)             # Nested operation starts after the response of the previous command
+    span = Span(name, parent)
+    _tracer.on_start(span)
+    return span
+
+
+def _finish_command(operation: Span) -> None:
+    command = operation._command
+    if command is not None:
+        operation._command = None
+        command.end = time.perf_counter()
+        if _tracer is not None:
+            _tracer.on_end(command)
+
+
+def _finish_span(span: Span) -> None:
+    _finish_command(span)
+    span.end = time.perf_counter()
+    for child in span.children:
+        span.bytes_sent += child.bytes_sent
+        span.bytes_received += child.bytes_received
+        if child.first_byte is not None and (span.first_byte is None or child.first_byte < span.first_byte):
+            span.first_byte = child.first_byte
+        if child.terminator is not None and (span.terminator is None or child.terminator > span.terminator):
+            span.terminator = child.terminator
+    if _tracer is not None:
+        _tracer.on_end(span)
+
+
+def traced(func):
+    """ Decorator making a span of every call of a function or a coroutine function """
+    name = func.__name__
+
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            if _tracer is None:
+                return await func(*args, **kwargs)
+            span = _start_span(name)
+            token = _current_span.set(span)
+            try:
+                return await func(*args, **kwargs)
+            except BaseException as e:
+                span.error = repr(e)
+                raise
+            finally:
+                _current_span.reset(token)
+                _finish_span(span)
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if _tracer is None:
+            return func(*args, **kwargs)
+        span = _start_span(name)
+        token = _current_span.set(span)
+        try:
+            return func(*args, **kwargs)
+        except BaseException as e:
+            span.error = repr(e)
+            raise
+        finally:
+            _current_span.reset(token)
+            _finish_span(span)
+    return wrapper
+
+
+def on_send(data: bytes) -> None:
+    """ Starts a command span of the current operation, finishing the previous command """
+    if _tracer is None:
+        return
+    operation = _current_span.get()
+    if operation is None:
+        return
+    _finish_command(operation)
+    command = Span(data.split(b"\n", 1)[0][:COMMAND_NAME_LEN].decode("ascii", "backslashreplace"), operation)
+    command.bytes_sent = len(data)
+    operation._command = command
+    _tracer.on_start(command)
+
+
+def on_recv(num_bytes: int) -> None:
+    """ Accounts bytes received for the current command or for the operation if no command was sent """
+    if _tracer is None:
+        return
+    operation = _current_span.get()
+    if operation is not None:
+        span = operation._command or operation
+        if span.first_byte is None:
+            span.first_byte = time.perf_counter()
+        span.bytes_received += num_bytes
+
+
+def on_terminator() -> None:
+    """ Marks the response terminator of the current command or of the operation if no command was sent """
+    if _tracer is None:
+        return
+    operation = _current_span.get()
+    if operation is not None:
+        (operation._command or operation).terminator = time.perf_counter()
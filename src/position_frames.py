@@ -0,0 +1,148 @@
+"""
+Fixed-width frame format of posmon_fw position stream and its vectorized decoder.
+AS can't pack binary floats, so a frame is FRAME_LEN ASCII characters with integer fields at fixed offsets:
+"#", sequence number, timer in ms, JT1..JT7 in 1/AXIS_SCALE degree (or mm) and a line feed.
+Numbers are right aligned and padded with spaces. A whole received buffer is decoded into a NumPy array
+with array arithmetic only, lost frames are detected from sequence numbers.
+
+Constants:
+    FRAME_LEN (int): Length of one frame in bytes.
+    FRAME_COLUMNS (tuple[str, ...]): Columns of decoded rows and of FramePositionStream ring buffer.
+"""
+
+import time
+
+try:
+    import numpy as np
+except ImportError:         # Install khirolib[stream]
+    np = None
+
+from src.position_stream import PositionStream, PositionRingBuffer, POSMON_PORT, POSITION_BUFFER_CAPACITY, \
+                                RECV_CHUNK_SIZE
+
+FRAME_START = ord("#")
+FRAME_END = ord("\n")
+MINUS_DIGIT = (ord("-") - ord("0")) % 256        # "-" after subtracting "0" from uint8
+SEQ_WIDTH = 6
+TIME_WIDTH = 9
+AXIS_WIDTH = 10
+NUM_AXES = 7
+AXIS_SCALE = 10000
+SEQ_MODULO = 10 ** SEQ_WIDTH
+FRAME_LEN = 1 + SEQ_WIDTH + TIME_WIDTH + NUM_AXES * AXIS_WIDTH + 1
+
+FRAME_COLUMNS = ("host_time", "seq", "controller_time", "jt1", "jt2", "jt3", "jt4", "jt5", "jt6", "jt7")
+
+
+def encode_frame(seq: int, controller_time: float, joints: list[float]) -> bytes:
+    """ Returns frame in the format of get_position_fw.pc """
+    axes = (list(joints) + [0.0] * NUM_AXES)[:NUM_AXES]
+    return (f"#{seq % SEQ_MODULO:{SEQ_WIDTH}d}{int(controller_time * 1000) % 10 ** TIME_WIDTH:{TIME_WIDTH}d}"
+            + "".join(f"{int(value * AXIS_SCALE):{AXIS_WIDTH}d}" for value in axes) + "\n").encode()
+
+
+def _decode_fields(fields):
+    """ Converts (..., width) array of right aligned ASCII integers to int64, looping over columns only """
+    digits = np.subtract(np.moveaxis(fields, -1, 0), np.uint8(48), order="C")    # Each column is contiguous
+    values = np.zeros(fields.shape[:-1], dtype=np.int64)
+    negative = np.zeros(fields.shape[:-1], dtype=bool)
+    for column in digits:
+        negative |= column == MINUS_DIGIT
+        column[column > 9] = 0                              # Spaces and signs wrapped around
+        values *= 10
+        values += column
+    return np.where(negative, -values, values)
+
+
+def decode_frames(data: bytes | bytearray) -> tuple:
+    """ Decodes all complete frames of the buffer.
+    Args:
+        data (bytes | bytearray): Received stream data starting at a frame boundary.
+
+    Returns:
+        tuple[np.ndarray, int]: Array of rows (seq, controller time in s, JT1..JT7) and number of bytes consumed.
+            Frames with broken markers are dropped.
+    """
+    num_frames = len(data) // FRAME_LEN
+    frames = np.frombuffer(data, dtype=np.uint8, count=num_frames * FRAME_LEN).reshape(num_frames, FRAME_LEN)
+    frames = frames[(frames[:, 0] == FRAME_START) & (frames[:, -1] == FRAME_END)]
+
+    rows = np.empty((len(frames), 2 + NUM_AXES))
+    rows[:, 0] = _decode_fields(frames[:, 1:1 + SEQ_WIDTH])
+    rows[:, 1] = _decode_fields(frames[:, 1 + SEQ_WIDTH:1 + SEQ_WIDTH + TIME_WIDTH]) / 1000
+    axes = frames[:, 1 + SEQ_WIDTH + TIME_WIDTH:-1].reshape(len(frames), NUM_AXES, AXIS_WIDTH)
+    rows[:, 2:] = _decode_fields(axes) / AXIS_SCALE
+    return rows, num_frames * FRAME_LEN
+
+
+def sequence_gaps(seq, previous: int | None = None) -> tuple:
+    """ Finds repeated and lost frames by sequence numbers. A step back is a restart of posmon, not a loss.
+    Args:
+        seq (np.ndarray): Sequence numbers of received frames.
+        previous (int | None, optional): Sequence number of the last frame of previous batch. Defaults to None.
+
+    Returns:
+        tuple[np.ndarray, int]: Mask of new (not repeated) frames and number of lost frames.
+    """
+    seq = seq.astype(np.int64)
+    if previous is None:
+        steps = np.concatenate(([1], np.diff(seq) % SEQ_MODULO))
+    else:
+        steps = np.diff(seq, prepend=previous) % SEQ_MODULO
+    is_new = steps != 0
+    is_gap = is_new & (steps <= SEQ_MODULO // 2)
+    return is_new, int((steps[is_gap] - 1).sum())
+
+
+class FramePositionStream(PositionStream):
+    """ Client of posmon_fw. Iteration yields arrays of new rows (host time + FRAME_COLUMNS[1:]),
+    no Python object is created per sample. Lost frames are counted in dropped """
+    def __init__(self, ip: str, port: int = POSMON_PORT, buffer_capacity: int | None = POSITION_BUFFER_CAPACITY):
+        if np is None:
+            raise ImportError("FramePositionStream requires numpy, install khirolib[stream]")
+        super().__init__(ip, port, None)
+        self._buffer = PositionRingBuffer(buffer_capacity, len(FRAME_COLUMNS)) if buffer_capacity else None
+        self._frame_data = bytearray()
+        self._last_seq: int | None = None
+        self.dropped = 0                                        # Frames lost between controller and PC
+
+    async def read_samples(self):
+        """ Reads available data and returns array of new rows with FRAME_COLUMNS.
+        Raises:
+            ConnectionError: If stream is closed.
+        """
+        if self._reader is None:
+            raise ConnectionError("Position stream is not connected")
+        chunk = await self._reader.read(RECV_CHUNK_SIZE)
+        if not chunk:
+            raise ConnectionError("Position stream closed by robot")
+        host_time = time.time()
+        self._frame_data += chunk
+        if self._frame_data[:1] != b"#":                        # Resynchronize after broken data
+            start = self._frame_data.find(b"#")
+            del self._frame_data[:start if start >= 0 else len(self._frame_data)]
+
+        rows, consumed = decode_frames(self._frame_data)
+        del self._frame_data[:consumed]
+        is_new, lost = sequence_gaps(rows[:, 0], self._last_seq)
+        rows = rows[is_new]
+        self.duplicates += int((~is_new).sum())
+        self.dropped += lost
+        if len(rows):
+            self._last_seq = int(rows[-1, 0])
+
+        samples = np.empty((len(rows), len(FRAME_COLUMNS)))
+        samples[:, 0] = host_time
+        samples[:, 1:] = rows
+        if self._buffer is not None:
+            self._buffer.extend(samples)
+        return samples
+
+    async def __anext__(self):
+        while True:
+            try:
+                samples = await self.read_samples()
+            except ConnectionError:
+                raise StopAsyncIteration
+            if len(samples):
+                return samples
@@ -0,0 +1,239 @@
+"""
+A module for a PositionStream class - client of posmon, AS program streaming robot position over TCP.
+posmon (programs/posmon) listens on POSMON_PORT and sends $info strings filled by get_position.pc
+(programs/get_position.pc) in PC thread 2, so samples arrive at the controller send rate without
+a telnet round trip per sample. Samples are available as an async iterator and in a preallocated
+NumPy ring buffer.
+
+Usage:
+    deploy_posmon(client)
+    async with PositionStream(ip) as stream:
+        async for sample in stream:
+            print(sample)
+
+Constants:
+    POSMON_PORT (int): Port posmon listens on.
+    POSMON_THREAD (int): Default PC thread of posmon.
+    POSITION_THREAD (int): PC thread where posmon starts get_position.pc.
+    SAMPLE_COLUMNS (tuple[str, ...]): Columns of ring buffer rows.
+"""
+
+import asyncio
+import collections
+import os
+import threading
+import time
+
+try:
+    import numpy as np
+except ImportError:         # Only PositionRingBuffer needs numpy, install khirolib[stream]
+    np = None
+
+from utils.position_sample import PositionSample
+from src.tcp_sock_client import TCPSockClient
+from src.khi_telnet_lib import upload_program, pc_execute, pc_abort, pc_kill, get_pc_status, pack_threads
+
+PROGRAMS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "programs")
+POSMON_PROGRAM = "posmon"
+POSITION_PROGRAM = "get_position.pc"
+POSMON_FW_PROGRAM = "posmon_fw"                 # Variant sending fixed-width frames, see position_frames
+POSITION_FW_PROGRAM = "get_position_fw.pc"
+END_LISTEN_PROGRAM = "get_position"     # Releases posmon port
+POSMON_PORT = 22800
+POSMON_THREAD = 1
+POSITION_THREAD = 2
+POSITION_CONNECT_TIMEOUT = 5.0
+POSITION_BUFFER_CAPACITY = 10000
+RECV_CHUNK_SIZE = 65536
+
+SAMPLE_COLUMNS = ("host_time", "controller_time", "jt1", "jt2", "jt3", "jt4", "jt5", "jt6",
+                  "x", "y", "z", "o", "a", "t")
+
+
+def read_as_program(program_name: str) -> bytes:
+    """ Returns AS file with the program from PROGRAMS_DIR, ready for upload """
+    with open(os.path.join(PROGRAMS_DIR, program_name), "r", encoding="utf-8") as file:
+        program_text = file.read()
+    return f".PROGRAM {program_name}\n{program_text.rstrip()}\n.END\n".encode()
+
+
+def stop_posmon(client: TCPSockClient, thread_num: int = POSMON_THREAD) -> None:
+    """ Stops posmon and get_position.pc and releases posmon port """
+    threads = pack_threads(thread_num, POSITION_THREAD)
+    pc_abort(client, threads)
+    pc_kill(client, threads)
+    pc_execute(client, END_LISTEN_PROGRAM, thread_num)
+
+
+def deploy_posmon(client: TCPSockClient, thread_num: int = POSMON_THREAD, frames: bool = False) -> None:
+    """ Uploads posmon with its helpers in one transmission and starts it in PC thread, stopping previous instance.
+    PC thread POSITION_THREAD is taken by get_position.pc after a stream client connects.
+    frames=True deploys posmon_fw sending fixed-width frames for FramePositionStream """
+    posmon, helper = (POSMON_FW_PROGRAM, POSITION_FW_PROGRAM) if frames else (POSMON_PROGRAM, POSITION_PROGRAM)
+    states = get_pc_status(client, pack_threads(thread_num, POSITION_THREAD))
+    if any(state.is_exist and state.name in (POSMON_PROGRAM, POSITION_PROGRAM, POSMON_FW_PROGRAM,
+                                             POSITION_FW_PROGRAM, END_LISTEN_PROGRAM)
+           for state in states):
+        pc_abort(client, pack_threads(thread_num, POSITION_THREAD))
+        pc_kill(client, pack_threads(thread_num, POSITION_THREAD))
+    upload_program(client, b"".join(read_as_program(name) for name in (helper, END_LISTEN_PROGRAM, posmon)))
+    pc_execute(client, posmon, thread_num)
+
+
+def parse_position_line(line: bytes) -> tuple[float, list[float], list[float]] | None:
+    """ Parses $info line of get_position.pc. Returns controller time, joints and pose or None if line is broken """
+    values = line.split()
+    if len(values) != 13:
+        return None
+    try:
+        numbers = [float(value) for value in values]
+    except ValueError:
+        return None
+    return numbers[0], numbers[1:7], numbers[7:13]
+
+
+class PositionRingBuffer:
+    """ Preallocated NumPy buffer of the latest samples, one row of SAMPLE_COLUMNS per sample """
+    def __init__(self, capacity: int = POSITION_BUFFER_CAPACITY, width: int = len(SAMPLE_COLUMNS)):
+        if np is None:
+            raise ImportError("PositionRingBuffer requires numpy, install khirolib[stream]")
+        self._data = np.zeros((capacity, width))
+        self._capacity = capacity
+        self._count = 0                         # Samples appended since creation
+        self._lock = threading.Lock()
+
+    @property
+    def capacity(self) -> int:
+        return self._capacity
+
+    @property
+    def total(self) -> int:
+        """ Number of samples appended since creation, including overwritten ones """
+        return self._count
+
+    def __len__(self) -> int:
+        return min(self._count, self._capacity)
+
+    def append(self, row) -> None:
+        with self._lock:
+            self._data[self._count % self._capacity] = row
+            self._count += 1
+
+    def extend(self, rows) -> None:
+        """ Appends 2D array of rows with at most two slice copies """
+        rows = rows[-self._capacity:]
+        with self._lock:
+            start = self._count % self._capacity
+            first = min(len(rows), self._capacity - start)
+            self._data[start:start + first] = rows[:first]
+            self._data[:len(rows) - first] = rows[first:]
+            self._count += len(rows)
+
+    def latest(self, num_samples: int | None = None):
+        """ Returns copy of the latest samples ordered from the oldest to the newest """
+        with self._lock:
+            size = len(self) if num_samples is None else min(num_samples, len(self))
+            end = self._count % self._capacity
+            indexes = np.arange(end - size, end) % self._capacity
+            return self._data[indexes]
+
+
+class PositionStream:
+    def __init__(self, ip: str, port: int = POSMON_PORT, buffer_capacity: int | None = POSITION_BUFFER_CAPACITY):
+        """
+        Initialize PositionStream instance. Connection is opened by connect() or by entering the context.
+
+        Args:
+            ip (str): IP address of the robot.
+            port (int, optional): posmon port. Defaults to POSMON_PORT.
+            buffer_capacity (int | None, optional): Size of the ring buffer in samples. None disables the buffer,
+                so numpy isn't required. Defaults to POSITION_BUFFER_CAPACITY.
+        """
+        self._ip = ip
+        self._port = port
+        self._reader: asyncio.StreamReader | None = None
+        self._writer: asyncio.StreamWriter | None = None
+        self._data = b""                                        # Received, but not complete line
+        self._pending: collections.deque[PositionSample] = collections.deque()
+        self._last_controller_time: float | None = None
+        self._buffer = PositionRingBuffer(buffer_capacity) if buffer_capacity else None
+        self.duplicates = 0                                     # Samples sent again before pose was updated
+
+    @property
+    def buffer(self) -> PositionRingBuffer | None:
+        return self._buffer
+
+    async def connect(self, timeout: float = POSITION_CONNECT_TIMEOUT) -> None:
+        """ Connects to posmon, retrying until it starts listening or timeout expires """
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                self._reader, self._writer = await asyncio.open_connection(self._ip, self._port)
+                return
+            except OSError:
+                if time.monotonic() >= deadline:
+                    raise TimeoutError(f"posmon is not listening on {self._ip}:{self._port}")
+                await asyncio.sleep(0.1)
+
+    async def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            try:
+                await self._writer.wait_closed()
+            except OSError:
+                pass
+            self._writer = self._reader = None
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def read_samples(self) -> list[PositionSample]:
+        """ Reads available data and returns new samples, repeated samples are skipped.
+        Raises:
+            ConnectionError: If stream is closed.
+        """
+        if self._reader is None:
+            raise ConnectionError("Position stream is not connected")
+        chunk = await self._reader.read(RECV_CHUNK_SIZE)
+        if not chunk:
+            raise ConnectionError("Position stream closed by robot")
+        host_time = time.time()
+        *lines, self._data = (self._data + chunk).split(b"\n")
+
+        samples = []
+        for line in lines:
+            parsed = parse_position_line(line)
+            if parsed is None:
+                continue
+            controller_time, joints, pose = parsed
+            if controller_time == self._last_controller_time:     # posmon sends $info faster than it changes
+                self.duplicates += 1
+                continue
+            self._last_controller_time = controller_time
+            samples.append(PositionSample(host_time, controller_time, joints, pose))
+            if self._buffer is not None:
+                self._buffer.append([host_time, controller_time, *joints, *pose])
+        return samples
+
+    async def run(self) -> None:
+        """ Fills the ring buffer until the stream is closed, use as a background task """
+        try:
+            while True:
+                await self.read_samples()
+        except ConnectionError:
+            pass
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> PositionSample:
+        while not self._pending:
+            try:
+                self._pending.extend(await self.read_samples())
+            except ConnectionError:
+                raise StopAsyncIteration
+        return self._pending.popleft()
@@ -0,0 +1,233 @@
+"""
+Download of programs and variables from the robot and a ProgramMirror class - incremental local copy of
+robot programs. Listings are streamed from the socket to files line by line, so a dump is never held in memory.
+The mirror keeps one AS file per program and an index with sizes listed by DIRECTORY/P, so a sync fetches
+only programs which are new or changed their size. Controllers which don't list sizes are compared by names,
+sync(full=True) fetches all programs.
+
+Constants:
+    DEFAULT_MIRROR_PATH (str): Default root directory of mirrors, one subdirectory per robot IP.
+    PROGRAM_SUFFIX (str): Suffix of program files in a mirror.
+    DATA_FILE (str): Mirror file with .TRANS, .JOINTS and .REALS sections.
+    INDEX_FILE (str): Mirror file with listed sizes and hashes of mirrored programs.
+"""
+
+import hashlib
+import json
+import os
+import threading
+
+from utils.sync_result import SyncResult
+from src.tcp_sock_client import TCPSockClient
+from src.khi_telnet_lib import handshake, read_programs_directory, NEWLINE_MSG, PROG_NOT_EXIST
+from src.khi_tracing import traced
+from src.command_scheduler import checkpoint
+from src.khi_exception import KHIProgNotExistError
+
+DEFAULT_MIRROR_PATH = os.path.join(os.path.expanduser("~"), ".khirolib", "mirror")
+PROGRAM_SUFFIX = ".as"
+DATA_FILE = "variables.as"
+INDEX_FILE = "index.json"
+
+SECTIONS = (".TRANS", ".JOINTS", ".REALS", ".STRINGS")
+
+
+class _ListingWriter:
+    """ Writes terminal listing to AS file: skips echo of the command, converts line ends and
+    closes data sections with .END, as the robot lists every variable under its own section header """
+    def __init__(self, file):
+        self._file = file
+        self._line = b""
+        self._echo = True                      # First line is echo of the command
+        self._section: bytes | None = None
+        self.not_exist = False                 # Robot answered that program doesn't exist
+
+    def _write(self, data: bytes) -> None:
+        self._file.write(data)
+
+    def _write_line(self, line: bytes) -> None:
+        stripped = line.strip()
+        if self._echo:
+            self._echo = False
+            return
+        if PROG_NOT_EXIST in line:
+            self.not_exist = True
+            return
+        if stripped.upper() in (section.encode() for section in SECTIONS):
+            if stripped.upper() == self._section:
+                return                          # Next variable of the open section
+            self.close()
+            self._section = stripped.upper()
+        elif stripped.upper() == b".END":
+            if self._section is None:
+                self._write(line + b"\n")        # .END of a program
+            self._section = None
+            return
+        elif stripped.startswith(b".PROGRAM"):
+            self.close()
+        if stripped:
+            self._write(line + b"\n")
+
+    def write(self, data: bytes) -> None:
+        *lines, self._line = (self._line + data).split(b"\r\n")
+        for line in lines:
+            self._write_line(line)
+
+    def close(self) -> None:
+        """ Closes open data section """
+        if self._section is not None:
+            self._write(b".END\n")
+            self._section = None
+
+    def flush(self) -> None:
+        if self._line:
+            self._write_line(self._line)
+            self._line = b""
+        self.close()
+
+
+def _stream_listing(client: TCPSockClient, command: str, writer: _ListingWriter) -> int:
+    checkpoint()                    # Long download lets stop commands through between listings
+    handshake(client)
+    client.send_msg(command)
+    num_bytes = client.recv_stream(writer.write, NEWLINE_MSG)
+    writer.flush()
+    return num_bytes
+
+
+@traced
+def save_programs(client: TCPSockClient, program_names: list[str], file) -> int:
+    """ Streams programs from the robot to a binary file in AS format, ready for upload_program.
+    Returns:
+        int: Number of bytes received.
+
+    Raises:
+        KHIProgNotExistError: If a program doesn't exist.
+    """
+    num_bytes = 0
+    for program_name in program_names:
+        writer = _ListingWriter(file)
+        num_bytes += _stream_listing(client, f"LIST /P {program_name}", writer)
+        if writer.not_exist:
+            raise KHIProgNotExistError(program_name)
+    return num_bytes
+
+
+@traced
+def save_variables(client: TCPSockClient, file) -> int:
+    """ Streams all location, joint and real variables from the robot to a binary file as AS data sections.
+    Returns:
+        int: Number of bytes received.
+    """
+    writer = _ListingWriter(file)
+    num_bytes = _stream_listing(client, "LIST /L", writer)
+    writer = _ListingWriter(file)
+    return num_bytes + _stream_listing(client, "LIST /R", writer)
+
+
+class ProgramMirror:
+    def __init__(self, ip: str, root: str = DEFAULT_MIRROR_PATH):
+        """
+        Initialize ProgramMirror instance and load its index.
+
+        Args:
+            ip (str): IP address of the robot.
+            root (str, optional): Root directory of mirrors. Defaults to DEFAULT_MIRROR_PATH.
+        """
+        self.path = os.path.join(root, ip)
+        self._lock = threading.Lock()
+        self._index: dict[str, dict] = {}          # program name -> {"size": listed size, "sha256": file hash}
+        try:
+            with open(os.path.join(self.path, INDEX_FILE), "r", encoding="utf-8") as file:
+                self._index = json.load(file)
+        except (OSError, ValueError):
+            self._index = {}                       # Missing or broken index means nothing is mirrored
+
+    @property
+    def programs(self) -> list[str]:
+        """ Names of mirrored programs """
+        return list(self._index)
+
+    def program_path(self, program_name: str) -> str:
+        return os.path.join(self.path, program_name + PROGRAM_SUFFIX)
+
+    def _download(self, path: str, save) -> tuple[str, int]:
+        """ Streams download to a temporary file replacing the path when complete, so an interrupted
+        download keeps the previous file. Returns content hash and number of received bytes """
+        temp_path = path + ".part"
+        digest = hashlib.sha256()
+        try:
+            with open(temp_path, "wb") as file:
+                num_bytes = save(_HashingFile(file, digest))
+            os.replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        return digest.hexdigest(), num_bytes
+
+    def sync(self, client: TCPSockClient, program_names: list[str] | None = None, variables: bool = True,
+             full: bool = False) -> SyncResult:
+        """ Brings the mirror up to date with the robot.
+        Args:
+            client(TCPSockClient): Object representing open client socket
+            program_names (list[str] | None, optional): Programs to mirror. Defaults to None - all programs.
+            variables (bool, optional): Download all variables to DATA_FILE. Defaults to True.
+            full (bool, optional): Fetch programs even if their listed size didn't change. Defaults to False.
+
+        Returns:
+            SyncResult: Fetched, deleted and unchanged programs.
+        """
+        with self._lock:
+            os.makedirs(self.path, exist_ok=True)
+            result = SyncResult()
+            directory = read_programs_directory(client)
+            if program_names is not None:
+                wanted = {name.lower() for name in program_names}
+                directory = {name: size for name, size in directory.items() if name.lower() in wanted}
+
+            for program_name in [name for name in self._index if name not in directory]:
+                if program_names is None or program_name.lower() in wanted:
+                    del self._index[program_name]
+                    if os.path.exists(self.program_path(program_name)):
+                        os.remove(self.program_path(program_name))
+                    result.deleted.append(program_name)
+
+            for program_name, size in directory.items():
+                entry = self._index.get(program_name)
+                if not full and entry is not None and entry["size"] == size \
+                        and os.path.exists(self.program_path(program_name)):
+                    result.unchanged.append(program_name)
+                    continue
+                digest, num_bytes = self._download(self.program_path(program_name),
+                                                   lambda file: save_programs(client, [program_name], file))
+                result.num_bytes += num_bytes
+                if entry is not None and entry["sha256"] == digest:
+                    result.unchanged.append(program_name)
+                else:
+                    result.fetched.append(program_name)
+                self._index[program_name] = {"size": size, "sha256": digest}
+                self._save_index()
+
+            if variables:
+                _, num_bytes = self._download(os.path.join(self.path, DATA_FILE),
+                                              lambda file: save_variables(client, file))
+                result.num_bytes += num_bytes
+            self._save_index()
+            return result
+
+    def _save_index(self) -> None:
+        temp_path = os.path.join(self.path, INDEX_FILE + ".part")
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump(self._index, file, indent=1)
+        os.replace(temp_path, os.path.join(self.path, INDEX_FILE))
+
+
+class _HashingFile:
+    """ Binary file wrapper computing hash of written data """
+    def __init__(self, file, digest):
+        self._file = file
+        self._digest = digest
+
+    def write(self, data: bytes) -> int:
+        self._digest.update(data)
+        return self._file.write(data)
@@ -0,0 +1,164 @@
+"""
+A module for a ProgramRun class - handle of a running RCP or PC program with a stream of progress events.
+End of an RCP program (completion, hold or error) is taken from the control session response stream, like
+in a blocking run. Step and cycle changes are found by comparing states read by STATUS or PCSTATUS
+on the monitor session every poll interval, no polling is done if the monitor session isn't dedicated.
+A PC program doesn't report its end, so it's found by polling as well.
+
+Usage:
+    run = await robot.execute_rcp("weld", progress=True)
+    async for event in run:
+        print(event)
+    result = await run.done()
+
+Constants:
+    PROGRESS_POLL_INTERVAL (float): Default interval of status polling, seconds.
+    EVENT_STEP, EVENT_CYCLE, EVENT_HELD, EVENT_ERROR, EVENT_COMPLETED (str): Kinds of events.
+"""
+
+import asyncio
+import time
+
+from utils.program_event import ProgramEvent
+from utils.program_result import ProgramResult
+from src.khi_exception import KHIProgramHeldError
+
+PROGRESS_POLL_INTERVAL = 0.2
+
+EVENT_STEP = "step"
+EVENT_CYCLE = "cycle"
+EVENT_HELD = "held"
+EVENT_ERROR = "error"
+EVENT_COMPLETED = "completed"
+FINAL_EVENTS = (EVENT_HELD, EVENT_ERROR, EVENT_COMPLETED)
+
+
+class ProgramRun:
+    def __init__(self, program_name: str, read_state, wait_end=None, poll_interval: float = PROGRESS_POLL_INTERVAL):
+        """
+        Initialize ProgramRun instance. Watching starts with start() or the first await or iteration.
+
+        Args:
+            program_name (str): Name of the running program.
+            read_state (Callable[[], RCPState | ThreadState] | None): Blocking reader of program state,
+                called in a worker thread. None disables polling.
+            wait_end (Callable[[asyncio.Future], Awaitable[ProgramResult]] | None, optional): Coroutine function
+                starting the program, setting result of the future when the robot accepted the start and returning
+                when the robot reports program end. Defaults to None - program is running, end is found by polling.
+            poll_interval (float, optional): Seconds between state readings. Defaults to PROGRESS_POLL_INTERVAL.
+        """
+        self.program_name = program_name
+        self.events: list[ProgramEvent] = []           # All events so far
+        self._read_state = read_state
+        self._wait_end = wait_end
+        self._poll_interval = poll_interval
+        self._started = time.monotonic()
+        self._state = None
+        self._changed = asyncio.Event()
+        self._start_accepted: asyncio.Future | None = None
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._start_accepted = asyncio.get_running_loop().create_future()
+            self._task = asyncio.ensure_future(self._watch())
+            self._task.add_done_callback(lambda task: task.cancelled() or task.exception())  # Seen by done()
+
+    async def started(self) -> None:
+        """ Waits until the robot accepted program start, raises errors of the start """
+        self.start()
+        await asyncio.shield(self._start_accepted)
+
+    @property
+    def finished(self) -> bool:
+        return bool(self.events) and self.events[-1].kind in FINAL_EVENTS
+
+    def _emit(self, kind: str, **kwargs) -> None:
+        self.events.append(ProgramEvent(kind, self.program_name, time.monotonic() - self._started, **kwargs))
+        self._changed.set()
+
+    def _update(self, state) -> None:
+        """ Emits events for differences between the state and the previous one """
+        previous, self._state = self._state, state
+        if previous is None or state.step_num != previous.step_num:
+            self._emit(EVENT_STEP, state=state)
+        if previous is not None and (state.completed_cycles, state.remaining_cycles) != \
+                (previous.completed_cycles, previous.remaining_cycles):
+            self._emit(EVENT_CYCLE, state=state)
+
+    async def _poll(self) -> None:
+        """ Reads program state until cancelled, or until the program stops if there's no end waiter """
+        await self._start_accepted
+        while True:
+            state = await asyncio.to_thread(self._read_state)
+            if self.finished:                           # End arrived while the state was read
+                return
+            self._update(state)
+            if self._wait_end is None and not state.running:
+                self._emit(EVENT_COMPLETED, state=state, result=ProgramResult(
+                    self.program_name, completed=state.remaining_cycles == 0,
+                    elapsed=time.monotonic() - self._started, message=f"Program stopped at step {state.step_num}"))
+                return
+            await asyncio.sleep(self._poll_interval)
+
+    async def _watch(self) -> ProgramResult:
+        poller = None
+        if self._read_state is not None:
+            poller = asyncio.ensure_future(self._poll())
+            poller.add_done_callback(lambda task: task.cancelled() or task.exception())  # Progress is optional
+        try:
+            if self._wait_end is None:
+                self._start_accepted.set_result(None)
+                try:
+                    await poller
+                except Exception as e:
+                    self._emit(EVENT_ERROR, error=e)
+                    raise
+                return self.events[-1].result
+            try:
+                result = await self._wait_end(self._start_accepted)
+            except Exception as e:
+                if not self._start_accepted.done():     # Robot didn't start the program
+                    self._start_accepted.set_exception(e)
+                    self._start_accepted.exception()
+                    raise
+                if isinstance(e, KHIProgramHeldError):
+                    self._emit(EVENT_HELD, error=e)
+                else:
+                    self._emit(EVENT_ERROR, error=e)
+                raise
+            self._emit(EVENT_COMPLETED, result=result)
+            return result
+        finally:
+            if poller is not None and not poller.done():
+                poller.cancel()
+
+    async def done(self) -> ProgramResult:
+        """ Waits for program end.
+        Raises:
+            KHIProgramHeldError: If program was held, other errors of the robot as a blocking run.
+        """
+        self.start()
+        return await asyncio.shield(self._task)
+
+    def __aiter__(self):
+        return self._events()
+
+    async def _events(self):
+        """ Yields events from the first one up to program end """
+        self.start()
+        idx = 0
+        while True:
+            while idx < len(self.events):
+                event = self.events[idx]
+                idx += 1
+                yield event
+                if event.kind in FINAL_EVENTS:
+                    return
+            if self._task.done():                      # Watching failed before final event
+                self._task.result()
+                return
+            self._changed.clear()
+            waiter = asyncio.ensure_future(self._changed.wait())
+            await asyncio.wait({waiter, self._task}, return_when=asyncio.FIRST_COMPLETED)
+            waiter.cancel()
@@ -0,0 +1,126 @@
+"""
+A module for a ProgramTemplate class - AS program with parameters stored in controller variables.
+A template is uploaded once under a stable name, parameter values are written to their variables before
+every run, so a run costs a write of changed values instead of a kill-upload-prime cycle. The template is
+uploaded again only when its body changes. Deployed bodies and written values are remembered per robot IP
+for the process lifetime, like package sizes in khi_telnet_lib. The pendant or a program can change variables
+too, so remembered values are only skipped after they are read back from the robot, and are forgotten when
+a connection is restored.
+
+Usage:
+    template = ProgramTemplate("pick", "SPEED {speed} ALWAYS\\nLMOVE {target}",
+                               {"speed": "pick_speed", "target": "pick_target"})
+    await robot.execute_template(template, {"speed": 50, "target": [500, 0, 300, 0, 180, 0]})
+"""
+
+import hashlib
+import math
+import re
+import threading
+
+PLACEHOLDER_RE = re.compile(r"\{(\w+)\}")
+LISTED_POSITION_TOLERANCE = 0.0005      # Locations and joints are listed with 3 decimals
+LISTED_REAL_TOLERANCE = 1e-5            # Relative, reals are listed with 6 significant digits
+
+_deployed_templates: dict[tuple[str, str], str] = {}     # (ip, program name) -> hash of uploaded body
+_written_values: dict[tuple[str, str], object] = {}      # (ip, variable name) -> last written value
+_templates_lock = threading.Lock()
+
+
+class ProgramTemplate:
+    def __init__(self, name: str, text: str, parameters: dict[str, str]):
+        """
+        Initialize ProgramTemplate instance.
+
+        Args:
+            name (str): Program name on the robot.
+            text (str): Program text with {parameter} placeholders.
+            parameters (dict[str, str]): Controller variables by parameter names. Variables starting with "#" are
+                joints, others are locations if a value is a list and reals if it's a number.
+
+        Raises:
+            ValueError: If text has a placeholder which isn't a parameter or a parameter is a string variable.
+        """
+        unknown = set(PLACEHOLDER_RE.findall(text)) - set(parameters)
+        if unknown:
+            raise ValueError(f"Template {name} has no variables for parameters: {', '.join(sorted(unknown))}")
+        strings = [variable for variable in parameters.values() if variable.startswith("$")]
+        if strings:
+            raise ValueError(f"String variables aren't supported as template parameters: {', '.join(strings)}")
+        self.name = name
+        self.parameters = dict(parameters)
+        self.body = PLACEHOLDER_RE.sub(lambda match: self.parameters[match.group(1)], text)
+        self.digest = hashlib.sha256(self.body.encode()).hexdigest()
+
+    def variables(self, values: dict) -> tuple[dict, dict]:
+        """ Maps parameter values to variables.
+        Returns:
+            tuple[dict, dict]: Locations and joints (variable -> list of values) and reals (variable -> value),
+                see bulk_variables.format_variables.
+        """
+        unknown = set(values) - set(self.parameters)
+        if unknown:
+            raise ValueError(f"Template {self.name} has no parameters: {', '.join(sorted(unknown))}")
+        positions, reals = {}, {}
+        for parameter, value in values.items():
+            variable = self.parameters[parameter]
+            if variable.startswith("#") or isinstance(value, (list, tuple)):
+                positions[variable] = [float(component) for component in value]
+            else:
+                reals[variable] = float(value)
+        return positions, reals
+
+
+def _normalize(value):
+    return tuple(float(component) for component in value) if isinstance(value, (list, tuple)) else float(value)
+
+
+def is_template_deployed(ip: str, template: ProgramTemplate) -> bool:
+    """ Returns True if the same template body was uploaded to the robot by this process """
+    with _templates_lock:
+        return _deployed_templates.get((ip, template.name.lower())) == template.digest
+
+
+def set_template_deployed(ip: str, template: ProgramTemplate) -> None:
+    """ Remembers template uploaded to the robot """
+    with _templates_lock:
+        _deployed_templates[(ip, template.name.lower())] = template.digest
+
+
+def forget_template(ip: str, program_name: str) -> None:
+    """ Forgets uploaded template, so it will be uploaded again """
+    with _templates_lock:
+        _deployed_templates.pop((ip, program_name.lower()), None)
+
+
+def changed_values(ip: str, template: ProgramTemplate, values: dict) -> dict:
+    """ Returns parameter values which differ from the values last written to their variables """
+    with _templates_lock:
+        return {parameter: value for parameter, value in values.items()
+                if _written_values.get((ip, template.parameters[parameter].lower()), None) != _normalize(value)}
+
+
+def set_written_values(ip: str, template: ProgramTemplate, values: dict | None) -> None:
+    """ Remembers values written to template variables. None forgets all variables of the template """
+    with _templates_lock:
+        if values is None:
+            for variable in template.parameters.values():
+                _written_values.pop((ip, variable.lower()), None)
+        else:
+            for parameter, value in values.items():
+                _written_values[(ip, template.parameters[parameter].lower())] = _normalize(value)
+
+
+def forget_written_values(ip: str) -> None:
+    """ Forgets all values written to the robot, so they are written again """
+    with _templates_lock:
+        for key in [key for key in _written_values if key[0] == ip]:
+            del _written_values[key]
+
+
+def matches_listed(value, listed) -> bool:
+    """ Returns True if a parameter value equals the value listed by the robot within listing precision """
+    if isinstance(value, (list, tuple)):
+        return isinstance(listed, list) and len(listed) == len(value) and \
+            all(abs(float(component) - other) <= LISTED_POSITION_TOLERANCE for component, other in zip(value, listed))
+    return isinstance(listed, float) and math.isclose(float(value), listed, rel_tol=LISTED_REAL_TOLERANCE)
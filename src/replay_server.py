@@ -0,0 +1,158 @@
+"""
+A module for a ReplayServer class - plays a wire capture back to khirolib in place of the robot.
+Connections accepted by the server are served by the captured connections in the order they were opened.
+Data received by the library in the capture is sent after the same delay from the preceding library send,
+divided by speed, or immediately if speed is None. Data sent by the library is read by its captured length
+and compared with the capture, differences are kept in mismatches, so a replay shows if the library still
+talks the same way. The library has to repeat the captured commands, e.g. run the same benchmark or script.
+
+Usage:
+    with ReplayServer("session.khiw", speed=None) as server:
+        client = TCPSockClient(*server.address)
+        telnet_connect(client)
+
+Run as a script to serve on a fixed port:
+    python -m src.replay_server session.khiw --port 9105 --speed 1
+"""
+
+import argparse
+import socket
+import sys
+import threading
+import time
+
+from src.wire_capture import read_capture, KIND_OPEN, KIND_CONNECT, KIND_SEND, KIND_RECV, KIND_CLOSE
+
+RECV_CHUNK_SIZE = 4096
+
+
+class ReplayServer:
+    def __init__(self, path: str, host: str = "127.0.0.1", port: int = 0, speed: float | None = 1.0):
+        """
+        Initialize ReplayServer instance and load the capture.
+
+        Args:
+            path (str): Capture file written by WireCapture.
+            host (str, optional): Address to listen on. Defaults to "127.0.0.1".
+            port (int, optional): Port to listen on, 0 picks a free one. Defaults to 0.
+            speed (float | None, optional): Replay speed relative to the capture, None replays as fast
+                as possible. Defaults to 1.0.
+        """
+        self._host = host
+        self._port = port
+        self.speed = speed
+        self._server: socket.socket | None = None
+        self._lock = threading.Lock()
+        self._sockets: list[socket.socket] = []
+
+        self.connections: list[list] = []           # Records of captured connections in the order of opening
+        by_id = {}
+        for record in read_capture(path):
+            if record.kind == KIND_OPEN:             # Connection ids of the next capture start again
+                by_id = {}
+            elif record.kind == KIND_CONNECT:
+                by_id[record.connection] = [record]
+                self.connections.append(by_id[record.connection])
+            elif record.connection in by_id:
+                by_id[record.connection].append(record)
+        self.served = 0                              # Connections accepted so far
+        self.mismatches: list[tuple[int, bytes, bytes]] = []     # (connection number, captured, received) sends
+
+    @property
+    def address(self) -> tuple[str, int]:
+        return self._host, self._port
+
+    def start(self) -> "ReplayServer":
+        self._server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._server.bind((self._host, self._port))
+        self._port = self._server.getsockname()[1]
+        self._server.listen()
+        threading.Thread(target=self._accept, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            self._server = None
+        with self._lock:
+            for sock in self._sockets:
+                try:
+                    sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def _accept(self) -> None:
+        while self._server is not None:
+            try:
+                sock, _ = self._server.accept()
+            except OSError:
+                return
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            with self._lock:
+                number = self.served
+                self.served += 1
+                self._sockets.append(sock)
+            if number >= len(self.connections):     # More connections than captured
+                sock.close()
+                continue
+            threading.Thread(target=self._serve, args=(sock, number), daemon=True).start()
+
+    def _serve(self, sock: socket.socket, number: int) -> None:
+        records = self.connections[number]
+        captured_ref, real_ref = records[0].timestamp, time.monotonic()     # Last event both in capture and replay
+        received = bytearray()
+        try:
+            for record in records[1:]:
+                if record.kind == KIND_SEND:
+                    while len(received) < len(record.data):
+                        chunk = sock.recv(RECV_CHUNK_SIZE)
+                        if not chunk:
+                            return
+                        received += chunk
+                    data = bytes(received[:len(record.data)])
+                    del received[:len(record.data)]
+                    if data != record.data:
+                        self.mismatches.append((number, record.data, data))
+                    captured_ref, real_ref = record.timestamp, time.monotonic()
+                elif record.kind == KIND_RECV:
+                    if self.speed is not None:
+                        delay = real_ref + (record.timestamp - captured_ref) / self.speed - time.monotonic()
+                        if delay > 0:
+                            time.sleep(delay)
+                    sock.sendall(record.data)
+                elif record.kind == KIND_CLOSE:
+                    break
+            while sock.recv(RECV_CHUNK_SIZE):       # Wait until the library closes the connection
+                pass
+        except OSError:
+            pass
+        finally:
+            sock.close()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Replay khirolib capture in place of a robot")
+    parser.add_argument("path")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9105)
+    parser.add_argument("--speed", type=float, default=1.0, help="replay speed, 0 - as fast as possible")
+    args = parser.parse_args()
+    server = ReplayServer(args.path, args.host, args.port, args.speed or None).start()
+    print(f"Replaying {len(server.connections)} connections on {server.address[0]}:{server.address[1]}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,289 @@
+"""
+A module for a SessionPool class - several logged-in telnet sessions to the same robot, assigned to roles.
+Every session has its own CommandScheduler, so status polling and stop commands never wait behind a long upload
+or a blocking program run, and stop commands go ahead of other commands waiting for the same session.
+
+Constants:
+    ROLE_CONTROL (str): Program start, continue and other state changing commands.
+    ROLE_BULK (str): Program uploads and other long transfers.
+    ROLE_MONITOR (str): Status polling, position reading and emergency hold/abort commands.
+        Without a dedicated monitor session, hold/abort commands get a session of their own.
+    ROLES (tuple[str, ...]): All roles.
+    KEEPALIVE_PERIOD (float): Default interval of liveness probes of idle sessions, seconds.
+
+Sessions are probed in a background thread while idle. A session which doesn't answer, or failed with a
+connection error, is logged in again in the background, or before the next command if that didn't succeed yet.
+"""
+
+import asyncio
+import threading
+
+from src.tcp_sock_client import TCPSockClient
+from src.khi_telnet_lib import telnet_connect, check_connection, PROBE_TIMEOUT
+from src.khi_exception import KHIConnError, KHISessionBusyError
+from src.status_cache import invalidate_status
+from src.program_template import forget_written_values
+from src.command_scheduler import CommandScheduler, set_current_scheduler, reset_current_scheduler, \
+                                  PRIORITY_SAFETY, PRIORITY_CONTROL, PRIORITY_QUERY, PRIORITY_BULK
+
+ROLE_CONTROL = "control"
+ROLE_BULK = "bulk"
+ROLE_MONITOR = "monitor"
+ROLES = (ROLE_CONTROL, ROLE_BULK, ROLE_MONITOR)
+
+KEEPALIVE_PERIOD = 2.0
+
+
+def _running_loop() -> asyncio.AbstractEventLoop | None:
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+def login(ip: str, port: int) -> TCPSockClient:
+    """ Opens a logged-in telnet connection.
+    Raises:
+        KHIConnError: If the robot doesn't accept the connection or login.
+    """
+    client = TCPSockClient(ip, port)
+    if not client.connected:
+        client.disconnect()
+        raise KHIConnError()
+    try:
+        telnet_connect(client)
+    except (KHIConnError, OSError):
+        client.disconnect()
+        raise KHIConnError()
+    return client
+
+
+class TelnetSession:
+    """ Telnet client with its CommandScheduler. Session is taken by 'with session as client' or
+    'async with session as client' with PRIORITY_CONTROL, session.scheduled(priority) takes it with another
+    priority class. The async form waits without blocking the event loop.
+    A session marked dead or closed by the robot is logged in again when it's taken """
+    def __init__(self, client: TCPSockClient):
+        self.client: TCPSockClient = client
+        self.scheduler = CommandScheduler()
+        self.alive = True
+        self.reconnects = 0                     # Number of restored connections
+        self._tokens = []                       # Scheduler contexts of holders, more urgent ones take the session
+                                                # at checkpoints of others and leave first
+        self._loops = []                        # Event loops of holders, None for threads
+
+    def restore(self) -> None:
+        """ Replaces the connection with a new logged-in one. Must be called by the holder.
+        Raises:
+            KHIConnError: If the robot is still unreachable.
+        """
+        self.client.disconnect()
+        self.client = login(*self.client.address)
+        self.alive = True
+        self.reconnects += 1
+        invalidate_status(self.client.address)  # Programs could be stopped while the connection was down
+        forget_written_values(self.client.address[0])   # Controller could be restarted with other values
+
+    def scheduled(self, priority: int, blocking: bool = True) -> "ScheduledSession":
+        return ScheduledSession(self, priority, blocking)
+
+    def _check_alive(self) -> None:
+        """ Logs in again a dead session taken from scheduler, releases it if the robot is unreachable """
+        if not self.alive or not self.client.is_connected():
+            try:
+                self.restore()
+            except KHIConnError:
+                self.scheduler.release()
+                raise
+
+    def enter(self, priority: int, blocking: bool = True) -> TCPSockClient:
+        """ Takes the session, waiting for the holder if blocking.
+        Raises:
+            KHISessionBusyError: If the session is busy and not blocking, or it's held by a task of the event loop
+                running in this thread, waiting would block the loop and the holder with it.
+        """
+        if not self.scheduler.acquire(priority, blocking=False):
+            if not blocking:
+                raise KHISessionBusyError("Session is busy and there's no other session for this command")
+            loop = _running_loop()
+            if loop is not None and loop in self._loops:
+                raise KHISessionBusyError()
+            self.scheduler.acquire(priority)
+        self._check_alive()
+        self._tokens.append(set_current_scheduler(self.scheduler))
+        self._loops.append(None)
+        return self.client
+
+    def exit(self, exc_type) -> None:
+        if exc_type is not None and issubclass(exc_type, ConnectionError):
+            self.alive = False
+        reset_current_scheduler(self._tokens.pop())
+        self._loops.pop()
+        self.scheduler.release()
+
+    async def async_enter(self, priority: int, blocking: bool = True) -> TCPSockClient:
+        if not self.scheduler.acquire(priority, blocking=False):
+            if not blocking:
+                raise KHISessionBusyError("Session is busy and there's no other session for this command")
+            acquired = asyncio.get_running_loop().run_in_executor(None, self.scheduler.acquire, priority)
+            try:
+                await asyncio.shield(acquired)
+            except asyncio.CancelledError:
+                acquired.add_done_callback(lambda _: self.scheduler.release())   # Don't leave session taken
+                raise
+        if not self.alive or not self.client.is_connected():
+            await asyncio.get_running_loop().run_in_executor(None, self._check_alive)
+        self._tokens.append(set_current_scheduler(self.scheduler))
+        self._loops.append(asyncio.get_running_loop())
+        return self.client
+
+    def __enter__(self) -> TCPSockClient:
+        return self.enter(PRIORITY_CONTROL)
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.exit(exc_type)
+
+    async def __aenter__(self) -> TCPSockClient:
+        return await self.async_enter(PRIORITY_CONTROL)
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        self.exit(exc_type)
+
+
+class ScheduledSession:
+    """ TelnetSession taken with a priority class, raising KHISessionBusyError instead of waiting if not blocking """
+    def __init__(self, session: TelnetSession, priority: int, blocking: bool = True):
+        self.session = session
+        self.priority = priority
+        self.blocking = blocking
+
+    @property
+    def client(self) -> TCPSockClient:
+        return self.session.client
+
+    def __enter__(self) -> TCPSockClient:
+        return self.session.enter(self.priority, self.blocking)
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.session.exit(exc_type)
+
+    async def __aenter__(self) -> TCPSockClient:
+        return await self.session.async_enter(self.priority, self.blocking)
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        self.session.exit(exc_type)
+
+
+class SessionPool:
+    def __init__(self, ip: str, port: int, roles: tuple[str, ...] = ROLES):
+        """
+        Initialize SessionPool instance and log in a session for every role.
+        A role which session can't be opened (controller limits number of telnet connections) shares
+        the control session. Without a dedicated monitor session, stop commands get a session of their own,
+        so they don't wait for a blocking program run on the control session.
+
+        Args:
+            ip (str): IP address of the robot.
+            port (int): Telnet port of the robot.
+            roles (tuple[str, ...], optional): Roles with a dedicated session, others share the control session.
+                Defaults to ROLES.
+
+        Raises:
+            KHIConnError: If the control session can't be established.
+        """
+        self._sessions: dict[str, TelnetSession] = {}
+        self._keepalive: threading.Thread | None = None
+        self._keepalive_stop = threading.Event()
+
+        control = TelnetSession(login(ip, port))
+        for role in ROLES:
+            self._sessions[role] = control
+
+        for role in roles:
+            if role == ROLE_CONTROL:
+                continue
+            try:
+                self._sessions[role] = TelnetSession(login(ip, port))
+            except KHIConnError:
+                continue
+
+        self._safety = self._sessions[ROLE_MONITOR]
+        if self._safety is control:
+            try:
+                self._safety = TelnetSession(login(ip, port))
+            except KHIConnError:
+                pass                            # Stop commands share the control session, see safety
+
+    def session(self, role: str) -> TelnetSession:
+        return self._sessions[role]
+
+    @property
+    def control(self) -> ScheduledSession:
+        return self._sessions[ROLE_CONTROL].scheduled(PRIORITY_CONTROL)
+
+    @property
+    def bulk(self) -> ScheduledSession:
+        return self._sessions[ROLE_BULK].scheduled(PRIORITY_BULK)
+
+    @property
+    def monitor(self) -> ScheduledSession:
+        return self._sessions[ROLE_MONITOR].scheduled(PRIORITY_QUERY)
+
+    @property
+    def safety(self) -> ScheduledSession:
+        """ Session of HOLD and ABORT commands taken ahead of all other waiting commands: the monitor session or
+        a session of their own. If they share the control session, they raise KHISessionBusyError instead of
+        waiting for a blocking program run to end """
+        return self._safety.scheduled(PRIORITY_SAFETY, blocking=self._safety is not self._sessions[ROLE_CONTROL])
+
+    def is_dedicated(self, role: str) -> bool:
+        """ Checks if the role has its own session """
+        return role == ROLE_CONTROL or self._sessions[role] is not self._sessions[ROLE_CONTROL]
+
+    @property
+    def sessions(self) -> list[TelnetSession]:
+        """ Distinct sessions of the pool """
+        sessions = [*self._sessions.values(), self._safety]
+        return list({id(session): session for session in sessions}.values())
+
+    def probe(self, timeout: float = PROBE_TIMEOUT) -> None:
+        """ Probes idle sessions and logs in again those which don't answer.
+        Busy sessions are skipped, a command in progress detects a dead connection itself """
+        for session in self.sessions:
+            if not session.scheduler.acquire(PRIORITY_BULK, blocking=False, record=False):
+                continue
+            try:
+                if session.alive and not check_connection(session.client, timeout):
+                    session.alive = False
+                if not session.alive:
+                    session.restore()
+            except KHIConnError:
+                pass                            # Robot is still unreachable, next probe tries again
+            finally:
+                session.scheduler.release()
+
+    def start_keepalive(self, period: float = KEEPALIVE_PERIOD, timeout: float = PROBE_TIMEOUT) -> None:
+        """ Starts probing sessions in a background thread every period seconds """
+        if self._keepalive is not None:
+            return
+        self._keepalive_stop.clear()
+
+        def keepalive() -> None:
+            while not self._keepalive_stop.wait(period):
+                self.probe(timeout)
+
+        self._keepalive = threading.Thread(target=keepalive, name="khi-keepalive", daemon=True)
+        self._keepalive.start()
+
+    def stop_keepalive(self) -> None:
+        if self._keepalive is None:
+            return
+        self._keepalive_stop.set()
+        self._keepalive.join()
+        self._keepalive = None
+
+    def close(self) -> None:
+        """ Closes all sessions """
+        self.stop_keepalive()
+        for session in self.sessions:
+            session.client.disconnect()
@@ -0,0 +1,151 @@
+"""
+A module for a StatusCache class - short living cache of RCP and PC thread states of a robot.
+Caches are shared by all sessions to the same robot address. Every state changing command of the library
+is decorated with @invalidates_status, so cached states never survive a command sent by this process.
+States changed by the teach pendant or by a program itself are refreshed after TTL.
+
+Constants:
+    STATUS_CACHE_TTL (float): Default time in seconds a cached state is considered valid.
+"""
+
+import functools
+import inspect
+import threading
+import time
+
+from utils.thread_state import ThreadState
+from src.upload_cache import program_names
+
+STATUS_CACHE_TTL = 0.5
+
+
+class StatusCache:
+    def __init__(self, ttl: float = STATUS_CACHE_TTL):
+        """
+        Initialize StatusCache instance.
+
+        Args:
+            ttl (float, optional): Time in seconds a cached state is considered valid. Defaults to STATUS_CACHE_TTL.
+        """
+        self.ttl: float = ttl                   # Default TTL of readers which don't pass their own
+        self.generation: int = 0                # Incremented by every invalidation
+        self._lock = threading.Lock()
+        self._rcp: tuple | None = None          # (time, RCPState)
+        self._pc: dict[int, tuple] = {}         # thread number -> (time, ThreadState)
+
+    def get_rcp(self, ttl: float | None = None):
+        """ Returns cached RCP state or None if unknown or older than ttl seconds (the cache TTL if None) """
+        ttl = self.ttl if ttl is None else ttl
+        with self._lock:
+            if self._rcp is None or time.monotonic() - self._rcp[0] > ttl:
+                return None
+            return self._rcp[1]
+
+    def put_rcp(self, state, generation: int) -> None:
+        """ Stores RCP state read when cache had the generation. States read before an invalidation are dropped """
+        with self._lock:
+            if generation == self.generation:
+                self._rcp = (time.monotonic(), state)
+
+    def get_pc(self, thread_nums: list[int], ttl: float | None = None) -> list[ThreadState] | None:
+        """ Returns states of 5 PC threads like get_pc_status, None if any of requested threads is unknown or older
+        than ttl seconds (the cache TTL if None) """
+        ttl = self.ttl if ttl is None else ttl
+        now = time.monotonic()
+        states = [ThreadState() for _ in range(5)]
+        with self._lock:
+            for thread_num in thread_nums:
+                entry = self._pc.get(thread_num)
+                if entry is None or now - entry[0] > ttl:
+                    return None
+                states[thread_num - 1] = entry[1]
+        return states
+
+    def put_pc(self, states: list[ThreadState], generation: int) -> None:
+        """ Stores PC thread states read when cache had the generation """
+        now = time.monotonic()
+        with self._lock:
+            if generation == self.generation:
+                for state in states:
+                    if state.thread_num is not None:      # Not requested threads have no number
+                        self._pc[state.thread_num] = (now, state)
+
+    def invalidate(self, program_names: list[str] | None = None) -> None:
+        """ Drops cached states. If program names are given, states are dropped only if they refer to the programs """
+        with self._lock:
+            self.generation += 1
+            if program_names is not None:
+                names = {name.lower() for name in program_names}
+                states = [entry[1] for entry in self._pc.values()] + ([self._rcp[1]] if self._rcp else [])
+                if not any(state.name.lower() in names for state in states):
+                    return
+            self._rcp = None
+            self._pc.clear()
+
+
+_status_caches: dict[tuple[str, int], StatusCache] = {}
+_status_caches_lock = threading.Lock()
+
+
+def status_cache(address: tuple[str, int]) -> StatusCache:
+    """ Returns status cache of the robot with (ip, port) address """
+    with _status_caches_lock:
+        cache = _status_caches.get(address)
+        if cache is None:
+            cache = _status_caches[address] = StatusCache()
+        return cache
+
+
+def invalidate_status(address: tuple[str, int], program_names: list[str] | None = None) -> None:
+    """ Drops cached states of the robot with (ip, port) address, see StatusCache.invalidate """
+    cache = _status_caches.get(address)
+    if cache is not None:
+        cache.invalidate(program_names)
+
+
+def invalidates_status(func):
+    """ Decorator of a command changing robot state. Cached states of the client (first argument) robot are dropped
+    before the command is sent and after it finished, so states read meanwhile by other sessions aren't kept """
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(client, *args, **kwargs):
+            invalidate_status(client.address)
+            try:
+                return await func(client, *args, **kwargs)
+            finally:
+                invalidate_status(client.address)
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(client, *args, **kwargs):
+        invalidate_status(client.address)
+        try:
+            return func(client, *args, **kwargs)
+        finally:
+            invalidate_status(client.address)
+    return wrapper
+
+
+def invalidates_programs_status(func):
+    """ Decorator of a program upload. Cached states are dropped only if they refer to uploaded programs
+    (program bytes are the second argument), so uploads of new programs keep the cache """
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(client, program_bytes, *args, **kwargs):
+            names = program_names(program_bytes)
+            invalidate_status(client.address, names)
+            try:
+                return await func(client, program_bytes, *args, **kwargs)
+            finally:
+                invalidate_status(client.address, names)
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(client, program_bytes, *args, **kwargs):
+        names = program_names(program_bytes)
+        invalidate_status(client.address, names)
+        try:
+            return func(client, program_bytes, *args, **kwargs)
+        finally:
+            invalidate_status(client.address, names)
+    return wrapper
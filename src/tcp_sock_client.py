@@ -4,13 +4,46 @@ A module for a TCPSocketClient class that facilitates low-level interaction with
 Constants:
     RECV_TIMEOUT (int): Receive timeout value in seconds.
     SERVER_TIMEOUT (int): Time limit for connecting to robot
+    RECV_CHUNK_SIZE (int): Max number of bytes requested from the socket per recv() call
+    KEEPALIVE_IDLE (int): Seconds of silence before the first TCP keepalive probe
+    KEEPALIVE_INTERVAL (int): Seconds between unanswered TCP keepalive probes
+    KEEPALIVE_COUNT (int): Unanswered TCP keepalive probes before the connection is dropped
+    USER_TIMEOUT (int): Milliseconds sent data may stay unacknowledged before the connection is dropped
 """
 
+import math
 import socket
 import select
+import time
+
+from src import khi_tracing
+from src import wire_capture
 
 RECV_TIMEOUT = 1
 SERVER_TIMEOUT = 1
+RECV_CHUNK_SIZE = 4096
+KEEPALIVE_IDLE = 2
+KEEPALIVE_INTERVAL = 1
+KEEPALIVE_COUNT = 3
+USER_TIMEOUT = 5000
+
+
+def find_end(buffer: bytearray, ends: tuple[bytes, ...], start: int = 0) -> int:
+    """ Find the earliest position right after one of the end markers.
+    Args:
+        buffer (bytearray): Received data.
+        ends (tuple[bytes, ...]): End markers to look for.
+        start (int, optional): Index from which the markers are searched. Defaults to 0.
+
+    Returns:
+        int: Index right after the first complete end marker or -1 if no marker found.
+    """
+    first_end = -1
+    for eom in ends:
+        pos = buffer.find(eom, start)
+        if pos > -1 and (first_end == -1 or pos + len(eom) < first_end):
+            first_end = pos + len(eom)
+    return first_end
 
 
 class TCPSockClient:
@@ -31,13 +64,29 @@ class TCPSockClient:
         # self._client.connect((self._ip, self._port))
 
         self._client.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        self._client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)    # Don't delay packages in flight
+        # Drop half-open connection (rebooted controller, pulled cable) in seconds instead of OS default hours.
+        # Options are missing on some platforms
+        for option, value in (("TCP_KEEPIDLE", KEEPALIVE_IDLE), ("TCP_KEEPINTVL", KEEPALIVE_INTERVAL),
+                              ("TCP_KEEPCNT", KEEPALIVE_COUNT), ("TCP_USER_TIMEOUT", USER_TIMEOUT)):
+            if hasattr(socket, option):
+                self._client.setsockopt(socket.IPPROTO_TCP, getattr(socket, option), value)
+
+        self._buffer: bytearray = bytearray()                          # Received, but not yet consumed data
+        self._capture_id: int | None = None                             # Connection id in wire capture
 
         try:
             self._client.connect((self._ip, self._port))
             self.connected = True
+            self._capture_id = wire_capture.on_connect(self.address)
         except (socket.timeout, socket.error):
             self.connected = False
 
+    @property
+    def address(self) -> tuple[str, int]:
+        """ IP address and port of the robot """
+        return self._ip, self._port
+
     def set_timeout(self, timeout) -> None:
         self._client.settimeout(timeout)
 
@@ -50,73 +99,160 @@ class TCPSockClient:
             msg (str): Message to be sent.
             end (bytes, optional): End marker for the message. Defaults to b'\n'.
         """
-        # print("sent:", msg)
-        self._client.sendall(msg.encode() + end)
+        data = msg.encode() + end
+        khi_tracing.on_send(data)
+        wire_capture.on_send(self._capture_id, data)
+        self._client.sendall(data)
 
     def send_bytes(self, msg: bytes) -> None:
         """ Send bytes to the robot.
         Args:
             msg (bytes): Bytes to be sent.
         """
-        # print("sent:", msg)
+        khi_tracing.on_send(msg)
+        wire_capture.on_send(self._capture_id, msg)
         self._client.sendall(msg)
 
     def is_data_available(self) -> bool:
         """Check if data is available to read from the socket."""
+        if self._buffer:
+            return True
         ready_to_read, _, _ = select.select([self._client], [], [], 0.1)
         return bool(ready_to_read)
 
-    def wait_recv(self, *ends: bytes) -> bytes:
+    def wait_recv(self, *ends: bytes, timeout: float | None = None) -> bytes:
         """ Wait to receive data from the robot until one of the specified end markers is encountered.
+        Data after the end marker is kept in the internal buffer for the next call.
         Args:
-            *ends (bytes): End markers to wait for.
+            *ends (bytes): End markers to wait for. If none specified, returns all data of the first
+                non-empty read.
+            timeout (float | None, optional): Time limit for the whole call in seconds, math.inf waits forever.
+                Defaults to socket timeout applied to every single read.
 
         Returns:
-            bytes: Received data.
+            bytes: Received data up to and including the first end marker.
 
         Raises:
             TimeoutError: If receive operation times out.
+            ConnectionError: If connection was closed by the robot.
         """
-        incoming = b""
+        max_end_len = max((len(eom) for eom in ends), default=0)
+        scanned = 0                                 # Part of a buffer which doesn't contain end markers
+        socket_timeout = self._client.gettimeout()
+        deadline = None if timeout is None or math.isinf(timeout) else time.monotonic() + timeout
+        if timeout is not None and math.isinf(timeout):
+            self._client.settimeout(None)
         try:
             while True:
-                incoming += self._client.recv(1)  # Receive symbols one-by-one from socket
-                # print("INC", incoming)
-                for eom in ends:
-                    if incoming.find(eom) > -1:  # Wait eom message from robot
-                        # print("received:", incoming)
+                if ends:
+                    end_pos = find_end(self._buffer, ends, max(0, scanned - max_end_len + 1))
+                    if end_pos > -1:
+                        incoming = bytes(self._buffer[:end_pos])
+                        del self._buffer[:end_pos]
+                        khi_tracing.on_terminator()
                         return incoming
+                elif self._buffer:
+                    incoming = bytes(self._buffer)
+                    self._buffer.clear()
+                    khi_tracing.on_terminator()
+                    return incoming
+                scanned = len(self._buffer)
+
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise TimeoutError
+                    self._client.settimeout(remaining)
+                chunk = self._client.recv(RECV_CHUNK_SIZE)
+                if not chunk:
+                    self.connected = False
+                    raise ConnectionError("Connection closed by robot")
+                khi_tracing.on_recv(len(chunk))
+                wire_capture.on_recv(self._capture_id, chunk)
+                self._buffer += chunk
         except socket.timeout:  # Off timeout while waiting program complete message
             raise TimeoutError
+        finally:
+            if timeout is not None:
+                self._client.settimeout(socket_timeout)
+
+    def recv_stream(self, write, end: bytes) -> int:
+        """ Passes data received from the robot to write() until the end marker, so a long response
+        isn't kept in memory. Data after the end marker is kept in the internal buffer for the next call.
+        Args:
+            write (Callable[[bytes], Any]): Consumer of received data, the end marker isn't passed.
+            end (bytes): End marker to wait for.
+
+        Returns:
+            int: Number of bytes passed to write().
+
+        Raises:
+            TimeoutError: If a single read times out.
+            ConnectionError: If connection was closed by the robot.
+        """
+        total = 0
+        try:
+            while True:
+                end_pos = self._buffer.find(end)
+                if end_pos > -1:
+                    write(bytes(self._buffer[:end_pos]))
+                    del self._buffer[:end_pos + len(end)]
+                    khi_tracing.on_terminator()
+                    return total + end_pos
+                consumed = len(self._buffer) - len(end) + 1     # Tail may be a beginning of the end marker
+                if consumed > 0:
+                    write(bytes(self._buffer[:consumed]))
+                    del self._buffer[:consumed]
+                    total += consumed
+
+                chunk = self._client.recv(RECV_CHUNK_SIZE)
+                if not chunk:
+                    self.connected = False
+                    raise ConnectionError("Connection closed by robot")
+                khi_tracing.on_recv(len(chunk))
+                wire_capture.on_recv(self._capture_id, chunk)
+                self._buffer += chunk
+        except socket.timeout:
+            raise TimeoutError
 
     def flush_input_buffer(self) -> None:
         """ Clear any data currently in the input buffer without blocking. """
+        self._buffer.clear()
         self._client.setblocking(False)
         try:
             while True:
                 if not self.is_data_available():
                     break
                 try:
-                    self._client.recv(1024)
+                    chunk = self._client.recv(RECV_CHUNK_SIZE)
                 except BlockingIOError:
                     break
+                if not chunk:                   # Closed socket is always readable
+                    self.connected = False
+                    raise ConnectionError("Connection closed by robot")
+                wire_capture.on_recv(self._capture_id, chunk)
         finally:
             self._client.setblocking(True)
 
     def is_connected(self) -> bool:
-        """ Check connection """
+        """ Check connection without blocking. Detects connections closed by the robot, but not half-open ones """
         try:
             read, _, error = select.select([self._client], [], [self._client], 0)
             if error:
                 self.connected = False
                 return False
+            if read and not self._client.recv(1, socket.MSG_PEEK):     # Readable without data means EOF
+                self.connected = False
+                return False
 
             self._client.send(b"")
-            return True
+            return self.connected
         except (socket.error, BrokenPipeError, OSError):
             self.connected = False
             return False
 
     def disconnect(self) -> None:
         """ Closes connection """
+        wire_capture.on_close(self._capture_id)
+        self._capture_id = None
         self._client.close()
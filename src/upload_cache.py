@@ -0,0 +1,103 @@
+"""
+A module for an UploadCache class - persistent registry of programs uploaded to robots.
+It's used to skip uploading of programs which are already stored on the controller.
+
+Constants:
+    DEFAULT_CACHE_PATH (str): Default location of the registry file.
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".khirolib", "upload_cache.json")
+
+
+def program_hash(program_bytes: bytes) -> str:
+    """ Returns content hash of the program as it is sent to the robot """
+    return hashlib.sha256(program_bytes).hexdigest()
+
+
+def program_names(program_bytes: bytes) -> list[str]:
+    """ Returns names of programs defined by .PROGRAM lines of the uploaded file """
+    return [name.decode() for name in re.findall(rb"^[ \t]*\.PROGRAM[ \t]+([^\s(]+)", program_bytes, re.M | re.I)]
+
+
+def program_lines(program_bytes: bytes) -> list[tuple[str, list[str]]]:
+    """ Returns names and not empty lines of programs of the uploaded file, in the order of the file """
+    programs = []
+    lines = None
+    for line in program_bytes.decode(errors="replace").splitlines():
+        stripped = line.strip()
+        if stripped.upper().startswith(".PROGRAM"):
+            lines = []
+            programs.append((stripped[len(".PROGRAM"):].split("(")[0].strip(), lines))
+        elif stripped.startswith("."):
+            lines = None                        # .END of a program or a data section
+        elif lines is not None and stripped:
+            lines.append(stripped)
+    return programs
+
+
+def normalize_program(program_text: str) -> str:
+    """ Returns program text in a form independent of controller formatting (case and whitespaces) """
+    lines = (" ".join(line.split()).upper() for line in program_text.splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+class UploadCache:
+    def __init__(self, path: str | None = DEFAULT_CACHE_PATH):
+        """
+        Initialize UploadCache instance and load registry from disk.
+
+        Args:
+            path (str | None, optional): Registry file. None keeps registry in memory only.
+                Defaults to DEFAULT_CACHE_PATH.
+        """
+        self._path: str | None = path
+        self._lock = threading.Lock()
+        self._hashes: dict[str, dict[str, str]] = {}               # ip -> program name -> content hash
+
+        if path is not None and os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as file:
+                    self._hashes = json.load(file)
+            except (OSError, ValueError):
+                self._hashes = {}   # Broken registry means nothing is known about uploaded programs
+
+    def get(self, ip: str, program_name: str) -> str | None:
+        """ Returns hash of the program uploaded to the robot or None if unknown """
+        with self._lock:
+            return self._hashes.get(ip, {}).get(program_name.lower())
+
+    def put(self, ip: str, program_name: str, digest: str) -> None:
+        """ Stores hash of the program uploaded to the robot """
+        with self._lock:
+            self._hashes.setdefault(ip, {})[program_name.lower()] = digest
+            self._save()
+
+    def invalidate(self, ip: str | None = None, program_name: str | None = None) -> None:
+        """ Forgets uploaded programs, so they will be uploaded again.
+        Args:
+            ip (str | None, optional): Robot to forget programs for. Defaults to None - all robots.
+            program_name (str | None, optional): Program to forget. Defaults to None - all programs.
+        """
+        with self._lock:
+            if ip is None:
+                self._hashes.clear()
+            elif program_name is None:
+                self._hashes.pop(ip, None)
+            else:
+                self._hashes.get(ip, {}).pop(program_name.lower(), None)
+            self._save()
+
+    def _save(self) -> None:
+        if self._path is None:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self._path)), exist_ok=True)
+        tmp_path = self._path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump(self._hashes, file, indent=1, sort_keys=True)
+        os.replace(tmp_path, self._path)       # Registry file is never left half-written
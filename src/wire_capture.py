@@ -0,0 +1,172 @@
+"""
+A module with wire capture of khirolib: every connection, send, receive and close of TCPSockClient is appended
+to a binary log with monotonic timestamps, so a session with a robot can be replayed by ReplayServer.
+
+Capture is disabled until set with set_capture(). Disabled hooks cost a single global check, enabled ones pack
+a record header and append it to a buffered file, so capture can stay on in production.
+
+Log format: FILE_MAGIC, then records of RECORD_HEADER (kind, connection id, monotonic time in ns, data length)
+followed by data. A record cut by a crash at the end of the log is ignored by read_capture().
+Every WireCapture appending to a log starts with an open record and numbers its connections from 1,
+so connection ids are unique between two open records and opening a log doesn't read it.
+
+Usage:
+    set_capture(WireCapture("session.khiw"))
+    ...
+    get_capture().close()
+
+Run as a script to print a log:
+    python -m src.wire_capture session.khiw
+
+Constants:
+    FILE_MAGIC (bytes): Beginning of a capture file with format version.
+    RECORD_HEADER (struct.Struct): Record header.
+    KIND_OPEN, KIND_CONNECT, KIND_SEND, KIND_RECV, KIND_CLOSE (bytes): Record kinds, connect data is "ip:port".
+"""
+
+import argparse
+import itertools
+import struct
+import sys
+import threading
+import time
+
+FILE_MAGIC = b"KHIW\x02"
+RECORD_HEADER = struct.Struct("<cQQI")
+
+KIND_OPEN = b"O"
+KIND_CONNECT = b"C"
+KIND_SEND = b"S"
+KIND_RECV = b"R"
+KIND_CLOSE = b"X"
+
+_capture: "WireCapture | None" = None
+
+
+class CaptureRecord:
+    """ Record of a capture log """
+    kind: bytes = KIND_SEND
+    connection: int = 0
+    timestamp: float = 0.0     # Monotonic time, seconds
+    data: bytes = b""
+
+    def __init__(self, kind: bytes, connection: int, timestamp: float, data: bytes):
+        self.kind = kind
+        self.connection = connection
+        self.timestamp = timestamp
+        self.data = data
+
+    def __str__(self):
+        return f"{self.timestamp:.6f} #{self.connection} {self.kind.decode()} {self.data!r}"
+
+
+class WireCapture:
+    def __init__(self, path: str):
+        """
+        Initialize WireCapture instance, appending to the file at path.
+
+        Args:
+            path (str): Capture file, created with FILE_MAGIC if it doesn't exist or is empty.
+
+        Raises:
+            ValueError: If the file isn't a capture log of this format version.
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, "ab")
+        if self._file.tell() == 0:
+            self._file.write(FILE_MAGIC)
+        else:
+            with open(path, "rb") as file:
+                if file.read(len(FILE_MAGIC)) != FILE_MAGIC:
+                    self._file.close()
+                    raise ValueError(f"{path} is not a khirolib capture file")
+        self._connection_ids = itertools.count(1)
+        self.record(KIND_OPEN, 0)                   # Starts new id space of appended connections
+
+    def record(self, kind: bytes, connection: int, data: bytes = b"") -> None:
+        header = RECORD_HEADER.pack(kind, connection, time.monotonic_ns(), len(data))
+        with self._lock:
+            self._file.write(header + data)
+
+    def connect(self, address: tuple[str, int]) -> int:
+        """ Records a new connection. Returns its id """
+        connection = next(self._connection_ids)
+        self.record(KIND_CONNECT, connection, f"{address[0]}:{address[1]}".encode())
+        return connection
+
+    def flush(self) -> None:
+        with self._lock:
+            self._file.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+
+def set_capture(capture: WireCapture | None) -> None:
+    """ Enables capture of connections opened from now on, None disables capture """
+    global _capture
+    _capture = capture
+
+
+def get_capture() -> WireCapture | None:
+    return _capture
+
+
+def on_connect(address: tuple[str, int]) -> int | None:
+    """ Returns id of a captured connection, None if capture is disabled """
+    if _capture is None:
+        return None
+    return _capture.connect(address)
+
+
+def on_send(connection: int | None, data: bytes) -> None:
+    if connection is not None and _capture is not None:
+        _capture.record(KIND_SEND, connection, data)
+
+
+def on_recv(connection: int | None, data: bytes) -> None:
+    if connection is not None and _capture is not None:
+        _capture.record(KIND_RECV, connection, data)
+
+
+def on_close(connection: int | None) -> None:
+    if connection is not None and _capture is not None:
+        _capture.record(KIND_CLOSE, connection)
+        _capture.flush()
+
+
+def read_capture(path: str):
+    """ Yields CaptureRecord of a capture file in the order they were written.
+    Raises:
+        ValueError: If the file isn't a capture log.
+    """
+    with open(path, "rb") as file:
+        if file.read(len(FILE_MAGIC)) != FILE_MAGIC:
+            raise ValueError(f"{path} is not a khirolib capture file")
+        while True:
+            header = file.read(RECORD_HEADER.size)
+            if len(header) < RECORD_HEADER.size:
+                return
+            kind, connection, timestamp_ns, length = RECORD_HEADER.unpack(header)
+            data = file.read(length)
+            if len(data) < length:
+                return
+            yield CaptureRecord(kind, connection, timestamp_ns / 1e9, data)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Print khirolib capture log")
+    parser.add_argument("path")
+    args = parser.parse_args()
+    start = None
+    for record in read_capture(args.path):
+        start = record.timestamp if start is None else start
+        record.timestamp -= start
+        print(record)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,23 @@
+import unittest
+
+from src.as_validator import validate_program
+from src.khi_exception import KHIProgValidationError, KHIProgSyntaxError
+
+
+class ValidatorTest(unittest.TestCase):
+    def test_joint_literal(self):
+        self.assertEqual(validate_program("JMOVE #[0,0,0,0,0,0]\nPOINT #a = #[1,2,3,4,5,6]"), [])
+
+    def test_unbalanced_block(self):
+        errors = validate_program("IF a THEN\nJMOVE #[0,0", "prog")
+        self.assertEqual([error.line for error in errors], [1, 2])
+
+    def test_local_rejection_message(self):
+        exception = KHIProgValidationError.from_errors(validate_program("WHILE a DO", "prog"))
+        self.assertIsInstance(exception, KHIProgSyntaxError)
+        self.assertIn("rejected locally", str(exception))
+        self.assertNotIn("transmission", str(exception))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+import asyncio
+import unittest
+
+from khirolib import AsyncKHIRoLib
+from src.khi_emulator import KHIEmulator
+from src.khi_exception import KHIConnError, KHIProgSyntaxError, KHIProgramHeldError
+
+
+class AsyncRobotTest(unittest.TestCase):
+    def setUp(self):
+        self.emulator = KHIEmulator(latency=0.002, program_duration=1.0).start()
+        self.emulator.syntax_errors.add("BADCMD")
+
+    def tearDown(self):
+        self.emulator.stop()
+
+    def run_robot(self, operation):
+        async def run():
+            async with AsyncKHIRoLib("127.0.0.1", port=self.emulator.address[1]) as robot:
+                return await operation(robot)
+
+        return asyncio.run(run())
+
+    def test_connect_refused(self):
+        port = self.emulator.address[1]
+        self.emulator.stop()
+        with self.assertRaises(KHIConnError):
+            asyncio.run(AsyncKHIRoLib("127.0.0.1", port=port).connect())
+
+    def test_connect_opens_control_and_stop_connections(self):
+        async def operation(robot):
+            return len(self.emulator._sessions)
+
+        self.assertEqual(self.run_robot(operation), 2)
+
+    def test_upload_and_status(self):
+        async def operation(robot):
+            stats = await robot.upload_program("prog", "HOME\nHOME", open_program=True)
+            return stats, await robot.status(), await robot.read_all_programs()
+
+        stats, status, programs = self.run_robot(operation)
+        self.assertEqual(self.emulator.programs["prog"], ["HOME", "HOME"])
+        self.assertEqual(stats.num_packages, 1)
+        self.assertEqual(status.name, "prog")
+        self.assertFalse(status.running)
+        self.assertEqual(programs, ["prog"])
+
+    def test_upload_syntax_error(self):
+        async def operation(robot):
+            with self.assertRaises(KHIProgSyntaxError) as raised:
+                await robot.upload_program("prog", "HOME\nBADCMD 1\nHOME")
+            await robot.upload_program("other", "HOME")  # Terminal is back at the prompt
+            return raised.exception
+
+        error = self.run_robot(operation)
+        self.assertEqual([error.line for error in error.errors], [2])
+        self.assertEqual(self.emulator.programs["other"], ["HOME"])
+
+    def test_execute_completes(self):
+        self.emulator.programs["prog"] = ["HOME"]
+        self.emulator.program_duration = 0.2
+
+        async def operation(robot):
+            return await robot.execute_rcp("prog")
+
+        self.assertTrue(self.run_robot(operation).completed)
+
+    def test_hold_goes_over_stop_connection(self):
+        self.emulator.programs["prog"] = ["HOME"]
+
+        async def operation(robot):
+            execute = asyncio.create_task(robot.execute_rcp("prog"))
+            await asyncio.sleep(0.2)
+            await asyncio.wait_for(robot.hold_rcp(), 0.5)   # Control connection waits for the program end
+            with self.assertRaises(KHIProgramHeldError):
+                await execute
+            return await robot.status()
+
+        status = self.run_robot(operation)
+        self.assertFalse(status.running)
+        self.assertGreater(self.emulator.rcp.remaining, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+import asyncio
+import unittest
+
+from src.khi_emulator import KHIEmulator
+from src.AsyncTCPSockClient import AsyncTCPSockClient
+from src.khi_async_telnet_lib import telnet_connect, upload_program, get_rcp_status, disconnect
+from src.khi_telnet_lib import format_programs, get_upload_batch_size
+from src.khi_exception import KHIProgSyntaxError
+from tests.test_upload import PROGRAM
+
+
+class AsyncUploadTest(unittest.TestCase):
+    def setUp(self):
+        self.emulator = KHIEmulator(latency=0.002).start()
+        self.emulator.syntax_errors.add("BADCMD")
+
+    def tearDown(self):
+        self.emulator.stop()
+
+    def run_client(self, operation):
+        async def run():
+            client = AsyncTCPSockClient(*self.emulator.address)
+            await telnet_connect(client)
+            try:
+                return await operation(client)
+            finally:
+                await disconnect(client)
+
+        return asyncio.run(run())
+
+    def _upload_with_error(self, window: int) -> None:
+        async def operation(client):
+            with self.assertRaises(KHIProgSyntaxError) as raised:
+                await upload_program(client, format_programs({"prog": PROGRAM}), batch_size=512, window=window)
+            self.assertEqual(len(raised.exception.errors), 1)
+            self.assertEqual(raised.exception.errors[0].line, 201)
+
+            await get_rcp_status(client)                 # Terminal is back at the prompt
+            await upload_program(client, format_programs({"other": "HOME"}), batch_size=512, window=window)
+
+        self.run_client(operation)
+        self.assertEqual(len(self.emulator.programs["prog"]), 401)
+        self.assertTrue(self.emulator.programs["prog"][200].startswith(";"))
+        self.assertEqual(self.emulator.programs["other"], ["HOME"])
+
+    def test_syntax_error_window_1(self):
+        self._upload_with_error(1)
+
+    def test_syntax_error_packages_in_flight(self):
+        self._upload_with_error(4)
+
+    def test_batch_size_is_probed(self):
+        self.emulator.max_batch_size = 2100
+        program = format_programs({"prog": PROGRAM.replace("BADCMD", "HOME")})
+
+        async def operation(client):
+            stats = await upload_program(client, program, window=2)
+            return stats, get_upload_batch_size(client)
+
+        stats, remembered = self.run_client(operation)
+        self.assertEqual(stats.batch_size, 2048)
+        self.assertEqual(remembered, 2048)
+        self.assertEqual(len(self.emulator.programs["prog"]), 401)
+
+
+if __name__ == "__main__":
+    unittest.main()
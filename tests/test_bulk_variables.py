@@ -0,0 +1,27 @@
+import unittest
+
+from src.khi_emulator import KHIEmulator
+from src.tcp_sock_client import TCPSockClient
+from src.khi_telnet_lib import telnet_connect
+from src.bulk_variables import read_variables
+from src.khi_exception import KHIVarNotDefinedError
+
+
+class ReadVariablesTest(unittest.TestCase):
+    def test_missing_variable_is_named(self):
+        with KHIEmulator() as emulator:
+            emulator.reals["speed"] = 50.0
+            client = TCPSockClient(*emulator.address)
+            telnet_connect(client)
+            try:
+                self.assertEqual(read_variables(client, reals=["speed"]), {"speed": 50.0})
+                with self.assertRaises(KHIVarNotDefinedError) as raised:
+                    read_variables(client, positions=["#missing"], reals=["speed"])
+                self.assertEqual(raised.exception.variable_name, "#missing")
+                self.assertIn("#missing", str(raised.exception))
+            finally:
+                client.disconnect()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,46 @@
+import threading
+import time
+import unittest
+
+from src.command_scheduler import CommandScheduler, PRIORITY_SAFETY, PRIORITY_QUERY, PRIORITY_BULK
+from src.khi_emulator import KHIEmulator
+from src.session_pool import SessionPool
+
+
+class CommandSchedulerTest(unittest.TestCase):
+    def test_urgent_request_preempts_at_checkpoint(self):
+        scheduler = CommandScheduler()
+        order = []
+        scheduler.acquire(PRIORITY_BULK)
+
+        def request(priority: int, name: str) -> None:
+            scheduler.acquire(priority)
+            order.append(name)
+            scheduler.release()
+
+        threads = [threading.Thread(target=request, args=(PRIORITY_QUERY, "query")),
+                   threading.Thread(target=request, args=(PRIORITY_SAFETY, "safety"))]
+        for thread in threads:
+            thread.start()
+            time.sleep(0.05)
+        scheduler.checkpoint()                          # Bulk holder lets both waiters go first
+        order.append("bulk")
+        scheduler.release()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(order, ["safety", "query", "bulk"])
+        self.assertEqual(scheduler.latency[PRIORITY_SAFETY].count, 1)
+
+    def test_probe_isnt_recorded(self):
+        with KHIEmulator() as emulator:
+            pool = SessionPool(*emulator.address)
+            try:
+                pool.probe()
+                for session in pool.sessions:
+                    self.assertEqual(session.scheduler.latency[PRIORITY_BULK].count, 0)
+            finally:
+                pool.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,48 @@
+import asyncio
+import unittest
+
+from src.khi_emulator import KHIEmulator
+from src.tcp_sock_client import TCPSockClient
+from src.khi_telnet_lib import telnet_connect, rcp_execute, rcp_abort, get_rcp_status
+
+
+class ExecuteTest(unittest.TestCase):
+    def setUp(self):
+        self.emulator = KHIEmulator(program_duration=1.0).start()
+        self.emulator.programs["prog"] = ["HOME"]
+        self.client = TCPSockClient(*self.emulator.address)
+        telnet_connect(self.client)
+
+    def tearDown(self):
+        self.client.disconnect()
+        self.emulator.stop()
+
+    def test_cancelled_wait_releases_client(self):
+        async def run():
+            task = asyncio.create_task(rcp_execute(self.client, "prog"))
+            await asyncio.sleep(0.2)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            rcp_abort(self.client)                      # Worker thread doesn't read the client anymore
+            self.assertFalse(get_rcp_status(self.client).running)
+
+        asyncio.run(run())
+
+    def test_aborted_program_is_not_completed(self):
+        async def run():
+            task = asyncio.create_task(rcp_execute(self.client, "prog"))
+            await asyncio.sleep(0.2)
+            other = TCPSockClient(*self.emulator.address)
+            telnet_connect(other)
+            rcp_abort(other)
+            other.disconnect()
+            return await asyncio.wait_for(task, 2.0)
+
+        result = asyncio.run(run())
+        self.assertFalse(result.completed)
+        self.assertIn("aborted", result.message)
+
+
+if __name__ == "__main__":
+    unittest.main()
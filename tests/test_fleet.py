@@ -0,0 +1,65 @@
+import threading
+import time
+import unittest
+
+from khirolib.fleet import KHIFleet
+from src.khi_emulator import KHIEmulator
+from src.khi_exception import KHIConnError, KHIProgNotExistError, KHIProgramHeldError
+
+
+class FleetTest(unittest.TestCase):
+    def setUp(self):
+        self.emulators = [KHIEmulator(latency=0.01, program_duration=1.0).start() for _ in range(2)]
+        for emulator in self.emulators:
+            emulator.programs["prog"] = ["HOME"]
+        self.addresses = [emulator.address for emulator in self.emulators]
+
+    def tearDown(self):
+        for emulator in self.emulators:
+            emulator.stop()
+
+    def test_robots_on_one_ip_are_told_apart_by_port(self):
+        for speed, emulator in zip((10.0, 20.0), self.emulators):
+            emulator.monitor_speed = speed
+        with KHIFleet(self.addresses) as fleet:
+            self.assertEqual(set(fleet.robots), set(self.addresses))
+            result = fleet.status()
+        self.assertEqual([result[address].value.monitor_speed for address in self.addresses], [10.0, 20.0])
+
+    def test_ports_by_ip(self):
+        ip, port = self.addresses[0]
+        with KHIFleet([ip], ports={ip: port}) as fleet:
+            self.assertEqual(list(fleet.robots), [(ip, port)])
+            self.assertTrue(fleet.status()[ip].ok)
+
+    def test_errors_are_kept_per_robot(self):
+        stopped = KHIEmulator().start()
+        stopped.stop()                                  # Port nobody listens on
+        with KHIFleet(self.addresses + [stopped.address]) as fleet:
+            connect = fleet.connect()                   # Retries only the failed robot
+            self.assertEqual(connect.failed, [stopped.address])
+            self.assertIsInstance(connect[stopped.address].error, KHIConnError)
+
+            del self.emulators[1].programs["prog"]
+            result = fleet.execute_rcp("prog")
+        self.assertEqual(result.succeeded, [self.addresses[0]])
+        self.assertIsInstance(result[self.addresses[1]].error, KHIProgNotExistError)
+        self.assertNotIn(stopped.address, result.results)   # Operations run on connected robots only
+        self.assertTrue(result[self.addresses[0]].value.completed)
+
+    def test_hold_runs_beside_blocking_execute(self):
+        with KHIFleet(self.addresses, max_workers=2) as fleet:   # Execute takes all regular workers
+            results = {}
+            execute = threading.Thread(target=lambda: results.update(execute=fleet.execute_rcp("prog")))
+            execute.start()
+            time.sleep(0.3)
+            results["hold"] = fleet.hold_rcp()
+            execute.join(5.0)
+        self.assertTrue(results["hold"].ok)
+        self.assertLess(results["hold"].elapsed, 0.5)
+        for address in self.addresses:
+            self.assertIsInstance(results["execute"][address].error, KHIProgramHeldError)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+import asyncio
+import unittest
+
+from khirolib import KHIRoLibLite
+from src.khi_emulator import KHIEmulator
+from src.khi_exception import KHISessionBusyError, KHIProgramHeldError
+from src.session_pool import ROLE_CONTROL
+
+
+class BlockingFacadeTest(unittest.TestCase):
+    def setUp(self):
+        self.emulator = KHIEmulator(program_duration=0.5).start()
+        self.emulator.programs["prog"] = ["HOME"]
+        self.robot = KHIRoLibLite("127.0.0.1", port=self.emulator.address[1], keepalive=None)
+
+    def tearDown(self):
+        self.robot.close()
+        self.emulator.stop()
+
+    def test_blocking_call_during_execute_raises(self):
+        async def run():
+            task = asyncio.create_task(self.robot.execute_rcp("prog"))
+            await asyncio.sleep(0.1)
+            with self.assertRaises(KHISessionBusyError):
+                self.robot.signal_on(1)                 # Waiting here would block the task holding the session
+            result = await asyncio.wait_for(task, 2.0)
+            self.robot.signal_on(1)                     # Session is free again
+            return result
+
+        self.assertTrue(asyncio.run(run()).completed)
+        self.assertIn(1, self.emulator.signals)
+
+    def test_blocking_call_from_other_thread_waits(self):
+        async def run():
+            task = asyncio.create_task(self.robot.execute_rcp("prog"))
+            await asyncio.sleep(0.1)
+            await asyncio.to_thread(self.robot.signal_on, 2)
+            self.assertTrue(task.done())
+            return await task
+
+        self.assertTrue(asyncio.run(run()).completed)
+        self.assertIn(2, self.emulator.signals)
+
+
+class StopSessionTest(unittest.TestCase):
+    def setUp(self):
+        self.emulator = KHIEmulator(program_duration=1.0).start()
+        self.emulator.programs["prog"] = ["HOME"]
+
+    def tearDown(self):
+        self.robot.close()
+        self.emulator.stop()
+
+    def hold_during_execute(self):
+        async def run():
+            task = asyncio.create_task(self.robot.execute_rcp("prog"))
+            await asyncio.sleep(0.2)
+            try:
+                await asyncio.to_thread(self.robot.hold_rcp)
+            finally:
+                await asyncio.wait_for(asyncio.wait([task]), 2.0)
+            return task.result()
+
+        return asyncio.run(run())
+
+    def test_stop_commands_have_own_session_without_monitor(self):
+        self.robot = KHIRoLibLite("127.0.0.1", port=self.emulator.address[1], roles=(ROLE_CONTROL,),
+                                  keepalive=None)
+        with self.assertRaises(KHIProgramHeldError):
+            self.hold_during_execute()
+        self.assertFalse(self.emulator.rcp.running)
+        self.assertGreater(self.emulator.rcp.remaining, 0)
+
+    def test_stop_commands_fail_without_own_session(self):
+        self.emulator.max_sessions = 1                  # Robot refuses any session but control
+        self.robot = KHIRoLibLite("127.0.0.1", port=self.emulator.address[1], keepalive=None)
+        with self.assertRaises(KHISessionBusyError):
+            self.hold_during_execute()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+import unittest
+
+from src.position_frames import encode_frame, decode_frames, sequence_gaps, np, FRAME_LEN, SEQ_MODULO, AXIS_SCALE
+
+JOINTS = [[0.0, 30.0, -60.0, 0.0, -30.0, 0.0],
+          [12.3456, -0.5, 90.25, -179.9999, 45.0, 1.0, 250.5],
+          [-0.0001, 0.0001, 0.0, 0.0, 0.0, 0.0]]
+
+
+@unittest.skipIf(np is None, "numpy is not installed")
+class DecodeFramesTest(unittest.TestCase):
+    def test_round_trip(self):
+        data = b"".join(encode_frame(seq, 12.5 + seq * 0.004, joints) for seq, joints in enumerate(JOINTS, 1))
+        rows, consumed = decode_frames(data)
+        self.assertEqual(consumed, len(data))
+        self.assertEqual(rows[:, 0].tolist(), [1, 2, 3])
+        np.testing.assert_allclose(rows[:, 1], [12.504, 12.508, 12.512])
+        for row, joints in zip(rows, JOINTS):
+            expected = (joints + [0.0])[:7]                 # 7th axis is padded
+            np.testing.assert_allclose(row[2:], expected, atol=1 / AXIS_SCALE)
+
+    def test_partial_trailing_frame_is_left(self):
+        data = encode_frame(1, 0.0, JOINTS[0]) + encode_frame(2, 0.004, JOINTS[1])[:FRAME_LEN // 2]
+        rows, consumed = decode_frames(data)
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(consumed, FRAME_LEN)
+
+        rest = data[consumed:] + encode_frame(2, 0.004, JOINTS[1])[FRAME_LEN // 2:]
+        rows, consumed = decode_frames(rest)
+        self.assertEqual(rows[:, 0].tolist(), [2])
+        self.assertEqual(consumed, FRAME_LEN)
+
+    def test_broken_frame_is_dropped(self):
+        broken = bytearray(encode_frame(2, 0.004, JOINTS[1]))
+        broken[-1] = ord("x")
+        rows, consumed = decode_frames(encode_frame(1, 0.0, JOINTS[0]) + broken + encode_frame(3, 0.008, JOINTS[2]))
+        self.assertEqual(rows[:, 0].tolist(), [1, 3])
+        self.assertEqual(consumed, 3 * FRAME_LEN)
+
+    def test_empty_buffer(self):
+        rows, consumed = decode_frames(b"")
+        self.assertEqual(rows.shape[0], 0)
+        self.assertEqual(consumed, 0)
+
+
+@unittest.skipIf(np is None, "numpy is not installed")
+class SequenceGapsTest(unittest.TestCase):
+    def decoded_seq(self, seqs):
+        rows, _ = decode_frames(b"".join(encode_frame(seq, 0.0, JOINTS[0]) for seq in seqs))
+        return rows[:, 0]
+
+    def test_dropped_frames(self):
+        is_new, lost = sequence_gaps(self.decoded_seq([1, 2, 5, 6, 9]))
+        self.assertTrue(is_new.all())
+        self.assertEqual(lost, 4)
+
+    def test_gap_to_previous_batch(self):
+        _, lost = sequence_gaps(self.decoded_seq([13, 14]), previous=10)
+        self.assertEqual(lost, 2)
+
+    def test_wraparound(self):
+        seqs = [SEQ_MODULO - 2, SEQ_MODULO - 1, SEQ_MODULO, SEQ_MODULO + 1, SEQ_MODULO + 3]
+        self.assertEqual(self.decoded_seq(seqs).tolist(), [SEQ_MODULO - 2, SEQ_MODULO - 1, 0, 1, 3])
+        is_new, lost = sequence_gaps(self.decoded_seq(seqs))
+        self.assertTrue(is_new.all())
+        self.assertEqual(lost, 1)
+
+        _, lost = sequence_gaps(self.decoded_seq([1]), previous=SEQ_MODULO - 1)
+        self.assertEqual(lost, 1)
+
+    def test_repeated_frames_are_not_new(self):
+        is_new, lost = sequence_gaps(self.decoded_seq([7, 8, 8]), previous=7)
+        self.assertEqual(is_new.tolist(), [False, True, False])
+        self.assertEqual(lost, 0)
+
+    def test_restart_is_not_a_loss(self):
+        is_new, lost = sequence_gaps(self.decoded_seq([1, 2]), previous=5000)
+        self.assertTrue(is_new.all())
+        self.assertEqual(lost, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
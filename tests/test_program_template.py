@@ -0,0 +1,39 @@
+import asyncio
+import unittest
+
+from khirolib import KHIRoLibLite
+from src.khi_emulator import KHIEmulator
+from src.program_template import ProgramTemplate
+
+TEMPLATE = ProgramTemplate("pick", "SPEED {speed} ALWAYS\nLMOVE {target}", {"speed": "pick_speed",
+                                                                           "target": "pick_target"})
+VALUES = {"speed": 50, "target": [500, 0, 300, 0, 180, 0]}
+
+
+class TemplateValuesTest(unittest.TestCase):
+    def setUp(self):
+        self.emulator = KHIEmulator(program_duration=0.01).start()
+        self.robot = KHIRoLibLite("127.0.0.1", port=self.emulator.address[1], keepalive=None)
+
+    def tearDown(self):
+        self.robot.close()
+        self.emulator.stop()
+
+    def test_unchanged_values_are_skipped(self):
+        self.assertIsNotNone(self.robot.write_template_values(TEMPLATE, VALUES))
+        self.assertIsNone(self.robot.write_template_values(TEMPLATE, VALUES))
+
+    def test_values_changed_on_robot_are_written(self):
+        self.robot.write_template_values(TEMPLATE, VALUES)
+        self.emulator.reals["pick_speed"] = 10.0                # Changed from the pendant
+        self.assertIsNotNone(self.robot.write_template_values(TEMPLATE, VALUES))
+        self.assertEqual(self.emulator.reals["pick_speed"], 50.0)
+
+    def test_execute_template(self):
+        result = asyncio.run(self.robot.execute_template(TEMPLATE, VALUES))
+        self.assertTrue(result.completed)
+        self.assertEqual(self.emulator.locations["pick_target"], [500.0, 0.0, 300.0, 0.0, 180.0, 0.0])
+
+
+if __name__ == "__main__":
+    unittest.main()
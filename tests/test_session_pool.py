@@ -0,0 +1,45 @@
+import time
+import unittest
+
+from src.khi_emulator import KHIEmulator
+from src.khi_telnet_lib import get_rcp_status
+from src.session_pool import SessionPool, ROLE_CONTROL
+
+
+def restart(emulator: KHIEmulator) -> None:
+    """ Restarts the emulator on the same port, which can stay taken for a moment after stop """
+    emulator.stop()
+    for _ in range(50):
+        try:
+            emulator.start()
+            return
+        except OSError:
+            time.sleep(0.1)
+    emulator.start()
+
+
+class SessionRestoreTest(unittest.TestCase):
+    def setUp(self):
+        self.emulator = KHIEmulator().start()
+        self.pool = SessionPool(*self.emulator.address)
+
+    def tearDown(self):
+        self.pool.close()
+        self.emulator.stop()
+
+    def test_dropped_session_is_restored_on_use(self):
+        restart(self.emulator)                          # Controller reboot drops all connections
+        with self.pool.control as client:
+            get_rcp_status(client)
+        self.assertEqual(self.pool.session(ROLE_CONTROL).reconnects, 1)
+
+    def test_probe_restores_idle_sessions(self):
+        restart(self.emulator)
+        self.pool.probe()
+        for session in self.pool.sessions:
+            self.assertTrue(session.alive)
+            self.assertEqual(session.reconnects, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
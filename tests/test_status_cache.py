@@ -0,0 +1,20 @@
+import time
+import unittest
+
+from utils.rcp_state import RCPState
+from src.status_cache import StatusCache
+
+
+class StatusCacheTest(unittest.TestCase):
+    def test_ttl_per_reader(self):
+        cache = StatusCache(ttl=10.0)
+        cache.put_rcp(RCPState(0, "prog"), cache.generation)
+        time.sleep(0.02)
+        self.assertIsNotNone(cache.get_rcp())
+        self.assertIsNone(cache.get_rcp(0.01))              # Reader with a shorter TTL doesn't change the cache
+        self.assertIsNotNone(cache.get_rcp(10.0))
+        self.assertEqual(cache.ttl, 10.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+import unittest
+
+from src.khi_emulator import KHIEmulator
+from src.tcp_sock_client import TCPSockClient
+from src.khi_telnet_lib import telnet_connect, upload_program, format_programs, get_rcp_status
+from src.khi_exception import KHIProgSyntaxError
+from src.upload_cache import UploadCache
+from khirolib import KHIRoLibLite
+
+PROGRAM = "\n".join([f"TWAIT 0 ; head {idx}" for idx in range(200)] + ["BADCMD 1"] +
+                    [f"TWAIT 0 ; tail {idx}" for idx in range(200)])
+
+
+class UploadSyntaxErrorTest(unittest.TestCase):
+    def setUp(self):
+        self.emulator = KHIEmulator(latency=0.002).start()
+        self.emulator.syntax_errors.add("BADCMD")
+        self.client = TCPSockClient(*self.emulator.address)
+        telnet_connect(self.client)
+
+    def tearDown(self):
+        self.client.disconnect()
+        self.emulator.stop()
+
+    def _upload_with_error(self, window: int) -> None:
+        with self.assertRaises(KHIProgSyntaxError) as raised:
+            upload_program(self.client, format_programs({"prog": PROGRAM}), batch_size=512, window=window)
+        self.assertEqual(len(raised.exception.errors), 1)
+        self.assertEqual(raised.exception.errors[0].line, 201)
+        self.assertEqual(len(self.emulator.programs["prog"]), 401)
+        self.assertTrue(self.emulator.programs["prog"][200].startswith(";"))
+
+        get_rcp_status(self.client)                      # Terminal is back at the prompt
+        upload_program(self.client, format_programs({"other": "HOME"}), batch_size=512, window=window)
+        self.assertEqual(self.emulator.programs["other"], ["HOME"])
+
+    def test_syntax_error_window_1(self):
+        self._upload_with_error(1)
+
+    def test_syntax_error_packages_in_flight(self):
+        self._upload_with_error(4)
+
+
+class RobotUploadTest(unittest.TestCase):
+    def setUp(self):
+        self.emulator = KHIEmulator().start()
+        self.emulator.syntax_errors.add("BADCMD")
+        self.robot = KHIRoLibLite("127.0.0.1", port=self.emulator.address[1], keepalive=None)
+
+    def tearDown(self):
+        self.robot.close()
+        self.emulator.stop()
+
+    def test_errors_attributed_to_programs(self):
+        programs = {"first": "HOME\nBADCMD 1\nHOME", "second": "HOME\nHOME\nBADCMD 2"}
+        with self.assertRaises(KHIProgSyntaxError) as raised:
+            self.robot.upload_programs(programs, batch_size=512)
+        self.assertEqual([(error.program, error.line) for error in raised.exception.errors],
+                         [("first", 2), ("second", 3)])
+
+    def test_minified_error_lines_refer_to_source(self):
+        program = "; pick cycle\n\nHOME   ; start\n\n  BADCMD 1  ; broken\nHOME"
+        with self.assertRaises(KHIProgSyntaxError) as raised:
+            self.robot.upload_program("prog", program, batch_size=512, minify=True)
+        self.assertEqual(raised.exception.errors[0].line, 5)
+        self.assertEqual(self.emulator.programs["prog"][0], "HOME")
+
+    def test_cached_programs_read_directory_once(self):
+        self.robot.close()
+        self.robot = KHIRoLibLite("127.0.0.1", UploadCache(None), port=self.emulator.address[1], keepalive=None)
+        programs = {f"prog{idx}": "HOME" for idx in range(5)}
+        self.robot.upload_programs(programs)
+        self.assertEqual(self.emulator.command_counts["DIRECTORY/P"], 0)    # Nothing cached yet
+
+        del self.emulator.programs["prog3"]                     # Deleted behind the cache
+        self.emulator.command_counts.clear()
+        stats = self.robot.upload_programs(programs)
+        self.assertEqual(self.emulator.command_counts["DIRECTORY/P"], 1)
+        self.assertEqual(stats.num_bytes, len(format_programs({"prog3": "HOME"})))   # Only the deleted one
+        self.assertEqual(self.emulator.programs["prog3"], ["HOME"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+import os
+import tempfile
+import unittest
+
+from src import wire_capture
+from src.wire_capture import WireCapture, read_capture, KIND_OPEN, KIND_CONNECT
+from src.replay_server import ReplayServer
+from src.khi_emulator import KHIEmulator
+from src.tcp_sock_client import TCPSockClient
+from src.khi_telnet_lib import telnet_connect, get_rcp_status, upload_program, format_programs
+
+
+def run_session(address: tuple[str, int]) -> str:
+    client = TCPSockClient(*address)
+    telnet_connect(client)
+    upload_program(client, format_programs({"prog": "HOME"}), batch_size=512)
+    status = get_rcp_status(client).name
+    client.disconnect()
+    return status
+
+
+class WireCaptureTest(unittest.TestCase):
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix=".khiw")
+        os.close(handle)
+
+    def tearDown(self):
+        wire_capture.set_capture(None)
+        os.remove(self.path)
+
+    def _capture(self, address: tuple[str, int]) -> None:
+        capture = WireCapture(self.path)
+        wire_capture.set_capture(capture)
+        run_session(address)
+        wire_capture.set_capture(None)
+        capture.close()
+
+    def test_replay_round_trip(self):
+        with KHIEmulator() as emulator:
+            self._capture(emulator.address)
+            self._capture(emulator.address)             # Appended capture numbers connections again
+        records = list(read_capture(self.path))
+        self.assertEqual([record.kind for record in records].count(KIND_OPEN), 2)
+        self.assertEqual([record.connection for record in records if record.kind == KIND_CONNECT], [1, 1])
+
+        with ReplayServer(self.path, speed=None) as server:
+            self.assertEqual(len(server.connections), 2)
+            run_session(server.address)
+            run_session(server.address)
+            self.assertEqual(server.mismatches, [])
+
+    def test_large_connection_ids(self):
+        capture = WireCapture(self.path)
+        for _ in range(70000):
+            connection = capture.connect(("127.0.0.1", 23))
+        capture.close()
+        self.assertEqual(max(record.connection for record in read_capture(self.path)), connection)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+from typing import Any
+
+
+class RobotResult:
+    """ Stores result of an operation on one robot of a fleet """
+    address: tuple[str, int] = ("", 0)  # (ip, port) of the robot
+    value: Any = None
+    error: Exception | None = None     # Exception raised by the operation, None if succeeded
+    elapsed: float = 0.0               # Operation time on this robot, seconds
+
+    def __init__(self, address: tuple[str, int], value: Any, error: Exception | None, elapsed: float):
+        self.address = address
+        self.value = value
+        self.error = error
+        self.elapsed = elapsed
+
+    @property
+    def ip(self) -> str:
+        return self.address[0]
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    def __str__(self):
+        outcome = f"{self.value}" if self.ok else f"{type(self.error).__name__}: {self.error}"
+        return f"{self.ip}:{self.address[1]}: {'OK' if self.ok else 'FAILED'} in {self.elapsed:.3f} s ({outcome})"
+
+
+class FleetResult:
+    """ Stores results of an operation run concurrently on a fleet of robots """
+    operation: str = ""
+    results: dict = None               # (ip, port) -> RobotResult
+    elapsed: float = 0.0               # Wall time of the whole fleet operation, seconds
+
+    def __init__(self, operation: str, results: dict[tuple[str, int], RobotResult], elapsed: float):
+        self.operation = operation
+        self.results = results
+        self.elapsed = elapsed
+
+    @property
+    def succeeded(self) -> list[tuple[str, int]]:
+        return [address for address, result in self.results.items() if result.ok]
+
+    @property
+    def failed(self) -> list[tuple[str, int]]:
+        return [address for address, result in self.results.items() if not result.ok]
+
+    @property
+    def ok(self) -> bool:
+        return not self.failed
+
+    @property
+    def slowest(self) -> RobotResult | None:
+        return max(self.results.values(), key=lambda result: result.elapsed, default=None)
+
+    def __getitem__(self, robot: str | tuple[str, int]) -> RobotResult:
+        """ Result of a robot by (ip, port) address, or by IP if only one robot of the fleet has it """
+        if isinstance(robot, str):
+            matches = [result for address, result in self.results.items() if address[0] == robot]
+            if len(matches) != 1:
+                raise KeyError(robot)
+            return matches[0]
+        return self.results[tuple(robot)]
+
+    def __str__(self):
+        header = (f"{self.operation}: {len(self.succeeded)}/{len(self.results)} robots succeeded "
+                  f"in {self.elapsed:.3f} s")
+        return header + "".join(f"\n  {result}" for result in self.results.values())
@@ -0,0 +1,22 @@
+class LatencyStats:
+    """ Stores waiting times of commands of one priority class for a telnet session """
+    count: int = 0
+    total: float = 0.0         # Sum of waiting times, seconds
+    worst: float = 0.0         # Longest wait from request to the session being granted, seconds
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.worst = 0.0
+
+    def add(self, latency: float) -> None:
+        self.count += 1
+        self.total += latency
+        self.worst = max(self.worst, latency)
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def __str__(self):
+        return f"{self.count} commands, mean wait {self.mean * 1000:.3f} ms, worst {self.worst * 1000:.3f} ms"
@@ -0,0 +1,16 @@
+class PositionSample:
+    """ Stores one sample of robot position stream """
+    host_time: float = 0.0           # time.time() when sample was received
+    controller_time: float = 0.0     # Controller timer when sample was taken, seconds
+    joints: list = None              # JT1..JT6, degrees
+    pose: list = None                # X, Y, Z (mm), O, A, T (degrees)
+
+    def __init__(self, host_time: float, controller_time: float, joints: list[float], pose: list[float]):
+        self.host_time = host_time
+        self.controller_time = controller_time
+        self.joints = joints
+        self.pose = pose
+
+    def __str__(self):
+        return (f"{self.controller_time:.4f} s: joints {' '.join(f'{value:.3f}' for value in self.joints)}, "
+                f"pose {' '.join(f'{value:.3f}' for value in self.pose)}")
@@ -0,0 +1,29 @@
+class ProgramEvent:
+    """ Stores a progress event of a running RCP or PC program """
+    kind: str = ""             # One of program_progress EVENT_* kinds
+    program: str = ""
+    state = None               # RCPState or ThreadState the event was found in, None for events of the response stream
+    result = None              # ProgramResult of "completed" event
+    error: Exception | None = None     # Exception of "held" and "error" events
+    elapsed: float = 0.0       # Time since program start, seconds
+
+    def __init__(self, kind: str, program: str, elapsed: float, state=None, result=None,
+                 error: Exception | None = None):
+        self.kind = kind
+        self.program = program
+        self.elapsed = elapsed
+        self.state = state
+        self.result = result
+        self.error = error
+
+    def __str__(self):
+        if self.error is not None:
+            details = f"{type(self.error).__name__}: {self.error}"
+        elif self.result is not None:
+            details = str(self.result)
+        elif self.state is not None:
+            details = (f"step {self.state.step_num}, cycles completed {self.state.completed_cycles}, "
+                       f"remaining {self.state.remaining_cycles}")
+        else:
+            details = ""
+        return f"{self.elapsed:.3f} s '{self.program}' {self.kind}: {details}"
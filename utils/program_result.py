@@ -0,0 +1,15 @@
+class ProgramResult:
+    """ Stores result of a blocking run of rcp program on Kawasaki robot """
+    name: str = ""
+    completed: bool = False
+    elapsed: float = 0.0       # Time from start acknowledge to completion message, seconds
+    message: str = ""          # Message of the robot about program completion
+
+    def __init__(self, name: str, completed: bool, elapsed: float, message: str):
+        self.name = name
+        self.completed = completed
+        self.elapsed = elapsed
+        self.message = message
+
+    def __str__(self):
+        return f"Program '{self.name}' completed: {self.completed}, elapsed: {self.elapsed:.3f} s ({self.message})"
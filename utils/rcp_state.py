@@ -1,22 +1,39 @@
 class RCPState:
     """ Stores state of running pc or rcp thread on Kawasaki robot """
-    name: str = ""
-    motor_on: bool = True  # because if motor is ON - STATUS message isn't consist this state
-    repeat_mode: bool = None
-    monitor_speed: float = None
-    program_speed: float = None
-    accuracy: float = None
-    running: bool = False
-    step_num: int = -1
-    completed_cycles: int = 0
-    remaining_cycles: int = 0
+    __slots__ = ("thread_num", "name", "motor_on", "repeat_mode", "monitor_speed", "program_speed", "accuracy",
+                 "running", "step_num", "completed_cycles", "remaining_cycles")
+
+    thread_num: int
+    name: str
+    motor_on: bool
+    repeat_mode: bool | None
+    monitor_speed: float | None
+    program_speed: float | None
+    accuracy: float | None
+    running: bool
+    step_num: int                   # -1 if no program
+    completed_cycles: int
+    remaining_cycles: int           # -1 if infinite
+
+    def __init__(self, thread_num: int = 0, name: str = "", motor_on: bool = True, repeat_mode: bool | None = None,
+                 monitor_speed: float | None = None, program_speed: float | None = None,
+                 accuracy: float | None = None, running: bool = False, step_num: int = -1,
+                 completed_cycles: int = 0, remaining_cycles: int = 0):
+        self.thread_num = thread_num
+        self.name = name
+        self.motor_on = motor_on            # because if motor is ON - STATUS message isn't consist this state
+        self.repeat_mode = repeat_mode
+        self.monitor_speed = monitor_speed
+        self.program_speed = program_speed
+        self.accuracy = accuracy
+        self.running = running
+        self.step_num = step_num
+        self.completed_cycles = completed_cycles
+        self.remaining_cycles = remaining_cycles
 
     @property
     def is_exist(self):
-        if self.name != "":
-            return True
-        else:
-            return False
+        return self.name != ""
 
     @property
     def is_running(self):
@@ -24,23 +41,20 @@ class RCPState:
 
     @property
     def current_step_num(self):
-        return int(self.step_num)
+        return self.step_num
 
     @property
     def info(self):
-        ans = "rcp: " + self.name + ", "
-        ans += "run: " + str(self.running)
-        return ans
+        return f"rcp: {self.name}, run: {self.running}"
 
     def __str__(self):
-        ans = "RCP name: " + self.name + "\n" + \
-              "Motor ON: " + str(self.motor_on) + "\n" + \
-              "Repeat mode: " + str(self.repeat_mode) + "\n" + \
-              "Monitor speed: " + str(self.monitor_speed) + "\n" + \
-              "Program speed: " + str(self.program_speed) + "\n" + \
-              "Accuracy: " + str(self.accuracy) + "\n" + \
-              "Running: " + str(self.running) + "\n" + \
-              "Step num: " + str(self.step_num) + "\n" + \
-              "Completed cycles: " + str(self.completed_cycles) + "\n" + \
-              "Remaining cycles: " + str(self.remaining_cycles) + "\n"
-        return ans
+        return (f"RCP name: {self.name}\n"
+                f"Motor ON: {self.motor_on}\n"
+                f"Repeat mode: {self.repeat_mode}\n"
+                f"Monitor speed: {self.monitor_speed}\n"
+                f"Program speed: {self.program_speed}\n"
+                f"Accuracy: {self.accuracy}\n"
+                f"Running: {self.running}\n"
+                f"Step num: {self.step_num}\n"
+                f"Completed cycles: {self.completed_cycles}\n"
+                f"Remaining cycles: {self.remaining_cycles}\n")
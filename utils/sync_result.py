@@ -0,0 +1,15 @@
+class SyncResult:
+    """ Stores result of a program mirror sync with Kawasaki robot """
+    fetched: list = None       # Programs downloaded because they are new or changed
+    deleted: list = None       # Programs removed from the mirror because the robot doesn't have them
+    unchanged: list = None     # Programs skipped or downloaded with the same content
+    num_bytes: int = 0         # Bytes received from the robot
+
+    def __init__(self):
+        self.fetched = []
+        self.deleted = []
+        self.unchanged = []
+
+    def __str__(self):
+        return (f"Fetched {len(self.fetched)}, deleted {len(self.deleted)}, unchanged {len(self.unchanged)} "
+                f"programs, received {self.num_bytes} bytes")
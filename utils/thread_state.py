@@ -1,28 +1,35 @@
 class ThreadState:
     """ Stores state of running pc or rcp thread on Kawasaki robot """
-    thread_num: int = None
-    name: str = ""
-    running: bool = False
-    step_num: int = -1
-    completed_cycles: int = 0
-    remaining_cycles: int = 0
+    __slots__ = ("thread_num", "name", "running", "step_num", "completed_cycles", "remaining_cycles")
+
+    thread_num: int | None
+    name: str
+    running: bool
+    step_num: int                   # -1 if no program
+    completed_cycles: int
+    remaining_cycles: int           # -1 if infinite
+
+    def __init__(self, thread_num: int | None = None, name: str = "", running: bool = False, step_num: int = -1,
+                 completed_cycles: int = 0, remaining_cycles: int = 0):
+        self.thread_num = thread_num
+        self.name = name
+        self.running = running
+        self.step_num = step_num
+        self.completed_cycles = completed_cycles
+        self.remaining_cycles = remaining_cycles
 
     @property
     def is_exist(self):
-        if self.name != "":
-            return True
-        else:
-            return False
+        return self.name != ""
 
     @property
     def is_running(self):
         return self.running
 
     def __str__(self):
-        ans = "Thread number: " + str(self.thread_num) + "\n" + \
-              "Name: " + self.name + "\n" + \
-              "Running: " + str(self.running) + "\n" + \
-              "Step num: " + str(self.step_num) + "\n" + \
-              "Completed cycles: " + str(self.completed_cycles) + "\n" + \
-              "Remaining cycles: " + str(self.remaining_cycles) + "\n"
-        return ans
+        return (f"Thread number: {self.thread_num}\n"
+                f"Name: {self.name}\n"
+                f"Running: {self.running}\n"
+                f"Step num: {self.step_num}\n"
+                f"Completed cycles: {self.completed_cycles}\n"
+                f"Remaining cycles: {self.remaining_cycles}\n")
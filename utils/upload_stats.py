@@ -0,0 +1,30 @@
+class UploadStats:
+    """ Stores sizes and timing of a program upload to Kawasaki robot """
+    num_bytes: int = 0
+    num_packages: int = 0
+    batch_size: int = 0
+    window: int = 1
+    elapsed: float = 0.0       # Time from LOAD command to transmission confirmation, seconds
+    saved_bytes: int = 0       # Bytes removed by minifying programs before upload
+
+    def __init__(self, num_bytes: int, num_packages: int, batch_size: int, window: int, elapsed: float):
+        self.num_bytes = num_bytes
+        self.num_packages = num_packages
+        self.batch_size = batch_size
+        self.window = window
+        self.elapsed = elapsed
+
+    @property
+    def throughput(self) -> float:
+        """ Upload speed in bytes per second """
+        return self.num_bytes / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def saved_time(self) -> float:
+        """ Upload time saved by minifying at the achieved throughput, seconds """
+        return self.saved_bytes / self.throughput if self.throughput > 0 else 0.0
+
+    def __str__(self):
+        saved = f", minified by {self.saved_bytes} bytes (~{self.saved_time:.3f} s)" if self.saved_bytes else ""
+        return (f"Uploaded {self.num_bytes} bytes in {self.num_packages} packages of {self.batch_size} bytes "
+                f"(window {self.window}) in {self.elapsed:.3f} s - {self.throughput / 1024:.1f} KiB/s{saved}")